@@ -4,6 +4,7 @@ import time
 import tempfile
 import requests
 from duckduckgo_search import DDGS
+from callback_codec import encode as encode_callback, new_id
 
 PLATFORM_PATTERNS = {
     'facebook': [r'facebook\s+video', r'fb\s+video', r'facebook', r'fb\s+'],
@@ -305,10 +306,10 @@ def format_news_results(results):
 
 class AIBot:
     
-    def __init__(self, handlers, video_cache=None):
+    def __init__(self, handlers, video_cache=None, paginated_cache=None):
         self.handlers = handlers
         self.video_cache = video_cache if video_cache is not None else {}
-        self.paginated_cache = {}
+        self.paginated_cache = paginated_cache if paginated_cache is not None else {}
     
     def process_message(self, text, chat_id, message_id, is_owner):
         intent_result = detect_intent(text)
@@ -360,7 +361,7 @@ class AIBot:
         
         videos = results['videos'][:10]
         
-        cache_id = f"pv_{chat_id}_{int(time.time() * 1000)}"
+        cache_id = new_id()
         self.paginated_cache[cache_id] = {
             'videos': videos,
             'platform': platform,
@@ -412,16 +413,16 @@ class AIBot:
         keyboard = []
         
         quality_row = [
-            {"text": "🎬 Video (Best)", "callback_data": f"aipv_video_best_{index}_{cache_id}"},
-            {"text": "🎵 Audio", "callback_data": f"aipv_audio_best_{index}_{cache_id}"}
+            {"text": "🎬 Video (Best)", "callback_data": encode_callback('aipv', 'video', 'best', index, cache_id)},
+            {"text": "🎵 Audio", "callback_data": encode_callback('aipv', 'audio', 'best', index, cache_id)}
         ]
         keyboard.append(quality_row)
         
         nav_row = []
         if index > 0:
-            nav_row.append({"text": "⬅️ Previous", "callback_data": f"aipv_prev_{index}_{cache_id}"})
+            nav_row.append({"text": "⬅️ Previous", "callback_data": encode_callback('aipv', 'prev', index, cache_id)})
         if index < total - 1:
-            nav_row.append({"text": "Next ➡️", "callback_data": f"aipv_next_{index}_{cache_id}"})
+            nav_row.append({"text": "Next ➡️", "callback_data": encode_callback('aipv', 'next', index, cache_id)})
         if nav_row:
             keyboard.append(nav_row)
         
@@ -432,26 +433,21 @@ class AIBot:
         else:
             self.handlers.send_message(chat_id, caption, reply_to, keyboard)
     
-    def handle_pagination_callback(self, data, chat_id, callback_message_id, callback_query_id):
-        parts = data.split('_')
-        action = parts[1]
+    def handle_pagination_callback(self, args, chat_id, callback_message_id, callback_query_id):
+        """args are the decoded 'aipv' callback arguments"""
+        action = args[0]
         
         if action in ['video', 'audio']:
             format_type = action
-            quality = parts[2]
-            video_index = int(parts[3])
-            cache_id = '_'.join(parts[4:])
+            quality = args[1]
+            video_index = int(args[2])
+            cache_id = args[3]
             
             cached = self.paginated_cache.get(cache_id)
             if not cached:
                 self.handlers.answer_callback_query(callback_query_id, '❌ Request expired')
                 return None
             
-            if time.time() - cached.get('timestamp', 0) > 600:
-                del self.paginated_cache[cache_id]
-                self.handlers.answer_callback_query(callback_query_id, '❌ Request expired')
-                return None
-            
             if video_index >= len(cached['videos']):
                 self.handlers.answer_callback_query(callback_query_id, '❌ Request expired')
                 return None
@@ -472,19 +468,14 @@ class AIBot:
                 'video_index': video_index
             }
         
-        current_index = int(parts[2])
-        cache_id = '_'.join(parts[3:])
+        current_index = int(args[1])
+        cache_id = args[2]
         
         cached = self.paginated_cache.get(cache_id)
         if not cached:
             self.handlers.answer_callback_query(callback_query_id, '❌ Request expired')
             return None
         
-        if time.time() - cached.get('timestamp', 0) > 600:
-            del self.paginated_cache[cache_id]
-            self.handlers.answer_callback_query(callback_query_id, '❌ Request expired')
-            return None
-        
         if action == 'prev':
             new_index = max(0, current_index - 1)
             self.handlers.answer_callback_query(callback_query_id, f'Video {new_index + 1}/{len(cached["videos"])}')
@@ -513,7 +504,7 @@ class AIBot:
         
         videos = results['videos'][:10]
         
-        cache_id = f"pv_{chat_id}_{int(time.time() * 1000)}"
+        cache_id = new_id()
         self.paginated_cache[cache_id] = {
             'videos': videos,
             'platform': 'general',
@@ -539,7 +530,7 @@ class AIBot:
         
         videos = results['videos'][:10]
         
-        cache_id = f"pa_{chat_id}_{int(time.time() * 1000)}"
+        cache_id = new_id()
         self.paginated_cache[cache_id] = {
             'videos': videos,
             'platform': 'music',
@@ -565,7 +556,7 @@ class AIBot:
         
         images = results['images'][:10]
         
-        cache_id = f"pi_{chat_id}_{int(time.time() * 1000)}"
+        cache_id = new_id()
         self.paginated_cache[cache_id] = {
             'images': images,
             'query': query,
@@ -603,13 +594,13 @@ class AIBot:
         
         keyboard = []
         
-        keyboard.append([{"text": "📥 Download Full Image", "callback_data": f"aipi_dl_{index}_{cache_id}"}])
+        keyboard.append([{"text": "📥 Download Full Image", "callback_data": encode_callback('aipi', 'dl', index, cache_id)}])
         
         nav_row = []
         if index > 0:
-            nav_row.append({"text": "⬅️ Previous", "callback_data": f"aipi_prev_{index}_{cache_id}"})
+            nav_row.append({"text": "⬅️ Previous", "callback_data": encode_callback('aipi', 'prev', index, cache_id)})
         if index < total - 1:
-            nav_row.append({"text": "Next ➡️", "callback_data": f"aipi_next_{index}_{cache_id}"})
+            nav_row.append({"text": "Next ➡️", "callback_data": encode_callback('aipi', 'next', index, cache_id)})
         if nav_row:
             keyboard.append(nav_row)
         
@@ -620,13 +611,13 @@ class AIBot:
         else:
             self.handlers.send_message(chat_id, caption, reply_to, keyboard)
     
-    def handle_image_pagination_callback(self, data, chat_id, callback_message_id, callback_query_id):
-        parts = data.split('_')
-        action = parts[1]
+    def handle_image_pagination_callback(self, args, chat_id, callback_message_id, callback_query_id):
+        """args are the decoded 'aipi' callback arguments"""
+        action = args[0]
         
         if action == 'dl':
-            image_index = int(parts[2])
-            cache_id = '_'.join(parts[3:])
+            image_index = int(args[1])
+            cache_id = args[2]
             
             cached = self.paginated_cache.get(cache_id)
             if not cached:
@@ -649,8 +640,8 @@ class AIBot:
                 'title': title
             }
         
-        current_index = int(parts[2])
-        cache_id = '_'.join(parts[3:])
+        current_index = int(args[1])
+        cache_id = args[2]
         
         cached = self.paginated_cache.get(cache_id)
         if not cached:
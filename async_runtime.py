@@ -0,0 +1,250 @@
+import os
+import json
+import sqlite3
+import asyncio
+import threading
+import time
+import aiohttp
+from config import BOT_TOKEN, TELEGRAM_API_URL, ASYNC_MAX_JOBS, ASYNC_HTTP_CONNECTIONS, RATE_LIMIT_MAX_RETRIES
+from rate_limiter import rate_limiter
+from universal_downloader import build_ytdlp_command, find_downloaded_file, download_fallbacks, new_output_template, write_probe, remove_probe
+
+
+async def run_process(cmd, timeout):
+    """asyncio replacement for subprocess.run(capture_output=True, text=True)"""
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise
+    return process.returncode, stdout.decode(errors='replace'), stderr.decode(errors='replace')
+
+
+async def download_media_async(url, format_type='video', quality='best', format_id=None):
+    """Async version of universal_downloader.download_media"""
+    output_template = new_output_template()
+    info_json = write_probe(url, output_template)
+    cmd = build_ytdlp_command(url, format_type, quality, output_template, format_id, info_json)
+
+    print(f"[Async yt-dlp] Running{' from cached probe' if info_json else ''}: {' '.join(cmd[:10])}...")
+    try:
+        try:
+            _, _, stderr = await run_process(cmd, timeout=300)
+        finally:
+            remove_probe(info_json)
+        result = find_downloaded_file(output_template, format_type, stderr)
+        if result.get('success'):
+            return result
+        print(f"[Async yt-dlp] Returned error: {result.get('error')}")
+    except asyncio.TimeoutError:
+        print("[Async yt-dlp] Timed out after 300s")
+    except Exception as e:
+        print(f"[Async yt-dlp] Exception: {type(e).__name__}: {e}")
+
+    # The scraper fallbacks are rarely hit, so they run on the default executor
+    return await asyncio.to_thread(download_fallbacks, url, format_type)
+
+
+async def upload_async(uploader, telegram, kind, chat_id, file_path, text=None):
+    """Uploader routing for the asyncio runtime.
+
+    Bot API uploads stay on the event loop; files over the Bot API limit (or
+    rejected with 413) take the shared Uploader's MTProto route on a thread,
+    since the MTProto client blocks. Both count in uploader.stats().
+    """
+    size = os.path.getsize(file_path)
+    route = uploader.route_for(size)
+    if route is None:
+        return uploader.too_large(size)
+    if route == 'bot_api':
+        started = time.time()
+        if kind == 'audio':
+            result = await telegram.send_audio_file(chat_id, file_path, text)
+        else:
+            result = await telegram.send_video_file(chat_id, file_path, text)
+        result = uploader.record('bot_api', size, result or {'ok': False, 'description': 'No response'}, time.time() - started)
+        if result.get('error_code') != 413:
+            return result
+        print(f"[Async Upload] Bot API rejected {size} bytes as too large, retrying over MTProto")
+    return await asyncio.to_thread(uploader.send_over_mtproto, kind, chat_id, file_path, text)
+
+
+class AsyncTelegramClient:
+    """Minimal aiohttp counterpart of TelegramHandlers for the asyncio execution mode"""
+
+    def __init__(self, session, bot_token):
+        self.session = session
+        self.api_base = f"{TELEGRAM_API_URL}/bot{bot_token}"
+
+    async def _make_request(self, method, data=None, files=None, timeout=120):
+        """Same rate limiting and 429 handling as TelegramHandlers._make_request, sleeping on the loop.
+
+        The limiter's SQLite transactions run in a worker thread so a busy
+        database never stalls the loop.
+        """
+        chat_id = data.get('chat_id') if data else None
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            try:
+                wait = await asyncio.to_thread(rate_limiter.reserve, method, chat_id)
+            except sqlite3.Error as e:
+                print(f"[AsyncTelegram] Rate limiter error, sending unthrottled: {e}")
+                wait = 0
+            if wait > 0:
+                await asyncio.sleep(wait)
+            result = await self._send_request(method, data, files, timeout)
+
+            retry_after = (result.get('parameters') or {}).get('retry_after')
+            if result.get('error_code') != 429 or not retry_after or attempt == RATE_LIMIT_MAX_RETRIES:
+                return result
+
+            print(f"[AsyncTelegram] {method} throttled for chat {chat_id}, retrying in {retry_after}s")
+            try:
+                await asyncio.to_thread(rate_limiter.block, chat_id, retry_after)
+            except sqlite3.Error as e:
+                print(f"[AsyncTelegram] Rate limiter error, waiting out retry_after here: {e}")
+                await asyncio.sleep(retry_after)
+        return result
+
+    async def _send_request(self, method, data, files, timeout):
+        url = f"{self.api_base}/{method}"
+        opened = []
+        try:
+            if files:
+                form = aiohttp.FormData()
+                for key, value in (data or {}).items():
+                    if value is None:
+                        continue
+                    # Same encoding as MultipartEncoder: reply_markup and friends go as JSON
+                    form.add_field(key, json.dumps(value) if isinstance(value, (dict, list)) else str(value))
+                for field, path in files.items():
+                    f = open(path, 'rb')
+                    opened.append(f)
+                    form.add_field(field, f, filename=os.path.basename(path))
+                request = self.session.post(url, data=form, timeout=aiohttp.ClientTimeout(total=timeout))
+            else:
+                request = self.session.post(url, json=data, timeout=aiohttp.ClientTimeout(total=timeout))
+            async with request as response:
+                return await response.json(content_type=None)
+        except Exception as e:
+            print(f"[AsyncTelegram] Request error: {e}")
+            return {'ok': False, 'error': str(e)}
+        finally:
+            for f in opened:
+                f.close()
+
+    async def send_message(self, chat_id, text, reply_to_message_id=None, reply_markup=None):
+        data = {'chat_id': chat_id, 'text': text, 'parse_mode': 'HTML'}
+        if reply_to_message_id:
+            data['reply_to_message_id'] = reply_to_message_id
+        if reply_markup:
+            data['reply_markup'] = {'inline_keyboard': reply_markup}
+        result = await self._make_request('sendMessage', data)
+        if result.get('ok'):
+            return result.get('result', {}).get('message_id')
+        return None
+
+    async def edit_message(self, chat_id, message_id, text, reply_markup=None):
+        data = {'chat_id': chat_id, 'message_id': message_id, 'text': text, 'parse_mode': 'HTML'}
+        if reply_markup:
+            data['reply_markup'] = {'inline_keyboard': reply_markup}
+        return await self._make_request('editMessageText', data)
+
+    async def delete_message(self, chat_id, message_id):
+        return await self._make_request('deleteMessage', {'chat_id': chat_id, 'message_id': message_id})
+
+    async def send_action(self, chat_id, action):
+        return await self._make_request('sendChatAction', {'chat_id': chat_id, 'action': action})
+
+    async def send_video(self, chat_id, video, caption=None):
+        """Send a video by file_id or URL"""
+        data = {'chat_id': chat_id, 'video': video, 'parse_mode': 'HTML'}
+        if caption:
+            data['caption'] = caption
+        return await self._make_request('sendVideo', data)
+
+    async def send_audio(self, chat_id, audio, title=None):
+        """Send an audio by file_id or URL"""
+        data = {'chat_id': chat_id, 'audio': audio, 'parse_mode': 'HTML'}
+        if title:
+            data['title'] = title
+        return await self._make_request('sendAudio', data)
+
+    async def send_video_file(self, chat_id, file_path, caption=None, reply_to_message_id=None):
+        data = {'chat_id': chat_id, 'parse_mode': 'HTML'}
+        if caption:
+            data['caption'] = caption
+        if reply_to_message_id:
+            data['reply_to_message_id'] = reply_to_message_id
+        return await self._make_request('sendVideo', data, {'video': file_path}, timeout=300)
+
+    async def send_audio_file(self, chat_id, file_path, title=None, reply_to_message_id=None):
+        data = {'chat_id': chat_id, 'parse_mode': 'HTML'}
+        if title:
+            data['title'] = title
+        if reply_to_message_id:
+            data['reply_to_message_id'] = reply_to_message_id
+        return await self._make_request('sendAudio', data, {'audio': file_path}, timeout=300)
+
+
+class AsyncRuntime:
+    """Event loop on a background thread that runs slow jobs as coroutines instead of OS threads"""
+
+    def __init__(self, max_jobs=ASYNC_MAX_JOBS):
+        self.max_jobs = max_jobs
+        self.loop = None
+        self.thread = None
+        self.session = None
+        self.telegram = None
+        self.active_jobs = 0
+        self._lock = threading.Lock()
+        self._loop_ready = threading.Event()
+
+    async def _open_session(self):
+        connector = aiohttp.TCPConnector(limit=ASYNC_HTTP_CONNECTIONS)
+        self.session = aiohttp.ClientSession(connector=connector)
+        self.telegram = AsyncTelegramClient(self.session, BOT_TOKEN)
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._open_session())
+        self._loop_ready.set()
+        self.loop.run_forever()
+
+    def start(self):
+        with self._lock:
+            if self.thread is None or not self.thread.is_alive():
+                self._loop_ready.clear()
+                self.thread = threading.Thread(target=self._run_loop, name='async-runtime', daemon=True)
+                self.thread.start()
+        if not self._loop_ready.wait(timeout=10):
+            raise Exception("Async runtime event loop failed to start")
+
+    def submit(self, coroutine_function, *args):
+        """Schedule coroutine_function(*args) on the loop. Returns False when at capacity."""
+        self.start()
+        with self._lock:
+            if self.active_jobs >= self.max_jobs:
+                print(f"[AsyncRuntime] {self.active_jobs} jobs running, rejecting")
+                return False
+            self.active_jobs += 1
+        asyncio.run_coroutine_threadsafe(self._run_job(coroutine_function, args), self.loop)
+        return True
+
+    async def _run_job(self, coroutine_function, args):
+        try:
+            await coroutine_function(*args)
+        except Exception as e:
+            print(f"[AsyncRuntime] Job {coroutine_function.__name__} failed: {e}")
+        finally:
+            with self._lock:
+                self.active_jobs -= 1
+
+
+runtime = AsyncRuntime()
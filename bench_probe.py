@@ -0,0 +1,48 @@
+"""Cold versus warm yt-dlp latency: python bench_probe.py [url]
+
+Cold runs start a new yt-dlp process per call, as every probe did before
+ytdlp_pool; warm runs send the same command line to an already started
+pool worker. Without a url only `yt-dlp --version` is timed, which is pure
+interpreter start plus yt_dlp import; with one, a full `-j` probe is timed
+as well (network time included on both sides).
+"""
+import statistics
+import subprocess
+import sys
+import time
+from ytdlp_pool import YtdlpPool
+
+
+def timed(fn, rounds):
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+        if result.returncode != 0:
+            print(f"[Bench] exit {result.returncode}: {result.stderr.strip()[:200]}")
+    return samples
+
+
+def run(cmd, label, rounds=10, timeout=120):
+    pool = YtdlpPool('bench', 1, rounds + 1)
+    pool.start()
+    # First call waits for the worker's own startup, which production pays at boot
+    pool.run(cmd, timeout)
+    if pool.stats()['disabled']:
+        print("[Bench] yt_dlp is not importable here, warm workers cannot start")
+        return
+    cold = timed(lambda: subprocess.run(cmd, capture_output=True, text=True, timeout=timeout), rounds)
+    warm = timed(lambda: pool.run(cmd, timeout), rounds)
+    print(f"[Bench] {label}: {rounds} rounds")
+    for name, samples in (('cold subprocess', cold), ('warm worker', warm)):
+        print(f"{name:16s} median {statistics.median(samples) * 1000:8.1f} ms   min {min(samples) * 1000:8.1f} ms")
+    print(f"{'speedup':16s} {statistics.median(cold) / statistics.median(warm):8.1f}x")
+    for worker in pool.idle:
+        worker.close()
+
+
+if __name__ == '__main__':
+    run(['yt-dlp', '--version'], 'yt-dlp --version')
+    if len(sys.argv) > 1:
+        run(['yt-dlp', '-j', '--no-warnings', '--skip-download', sys.argv[1]], 'yt-dlp -j probe', rounds=5)
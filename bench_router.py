@@ -0,0 +1,116 @@
+"""Microbenchmark of per-update dispatch cost: python bench_router.py
+
+Compares an if/elif chain against router.Router on the route table main.py
+registers. Commands: text.lower().startswith(...) per branch versus one dict
+lookup. Callbacks: the payloads the bot actually sends (callback_codec.encode
+plus the exact values) and a few legacy '_' payloads from buttons sent before
+the codec, matched by an exact/action-code/prefix chain versus
+Router.match_callback.
+
+On the current table, typical results are:
+- Encoded callbacks: the router takes about 550 ns/update against 800-1000
+  ns/update for the chain.
+- Legacy payloads: the trie walk is only on par with the short startswith
+  chain (1300-1800 vs ~1300 ns/update). It pulls ahead only as the number
+  of prefixes grows.
+"""
+import timeit
+import callback_codec
+from callback_codec import encode
+from router import Router
+
+COMMANDS = ['/start', '/song', '/korean', '/tiktok', '/dl', '/brod']
+EXACT_CALLBACKS = ['ignore_progress', 'ignore_branding', 'set_mode_owner', 'set_mode_user', 'admin_users_count', 'admin_broadcast']
+ACTIONS = ['songcount', 'ytdl', 'urldl_tkaudio', 'urldl', 'owndl', 'aipv', 'aipi']
+# Legacy namespaces still routed for old buttons, with their field counts
+LEGACY_PREFIXES = [('extract_audio_', None), ('songcount_', 1), ('ytdl_', 2), ('urldl_tkaudio_', 0),
+                   ('urldl_', 2), ('owndl_', 2), ('ai_dl_', 2)]
+
+SAMPLE_TEXTS = [
+    '/start',
+    '/song never gonna give you up',
+    '/dl https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+    '/brod',
+    'https://www.tiktok.com/@user/video/7234567890123456789',
+    'hello there',
+]
+SAMPLE_CALLBACKS = [
+    'ignore_progress',
+    encode('songcount', 5, '3fK9'),
+    encode('ytdl', 'video', '720', '3fK9'),
+    encode('urldl', 'audio', 'best', '3fK9'),
+    encode('urldl', 'video', '720p', '3fK9', optional='137'),
+    encode('urldl_tkaudio', '3fK9'),
+    encode('owndl', 'video', '1080p', '3fK9', optional='137'),
+    encode('aipv', 'next', 2, '3fK9'),
+    encode('aipi', 'dl', 0, '3fK9'),
+    'admin_broadcast',
+]
+LEGACY_CALLBACKS = [
+    'songcount_5_a1b2c3d4',
+    'ytdl_video_720_a1b2c3d4',
+    'ai_dl_video_best_a1b2c3d4',
+]
+
+
+def chain_command(text, commands=COMMANDS):
+    """The previous dispatch: one lowercase + startswith per branch"""
+    for command in commands:
+        if text.lower().startswith(command):
+            return command, text[len(command):].strip()
+    return None, None
+
+
+def chain_callback(data, actions=ACTIONS, prefixes=LEGACY_PREFIXES):
+    """The same table as an if/elif chain: exact values, then action codes, then legacy prefixes"""
+    for exact in EXACT_CALLBACKS:
+        if data == exact:
+            return exact, None
+    code, args = callback_codec.decode(data)
+    if code is not None:
+        for action in actions:
+            if code == callback_codec.ACTION_CODES[action]:
+                return action, args
+        return None, None
+    for prefix, fields in prefixes:
+        if data.startswith(prefix):
+            return prefix, data[len(prefix):].split('_')
+    return None, None
+
+
+def build_router(commands=COMMANDS, actions=ACTIONS, prefixes=LEGACY_PREFIXES):
+    router = Router()
+    for command in commands:
+        router.command(command)(lambda ctx, args: None)
+    for exact in EXACT_CALLBACKS:
+        router.callback(data=exact)(lambda ctx, args: None)
+    for action in actions:
+        router.callback(action=action)(lambda ctx, args: None)
+    for prefix, fields in prefixes:
+        router.callback(prefix=prefix, fields=fields)(lambda ctx, args: None)
+    return router
+
+
+def run(commands, prefixes, label, rounds=20000):
+    router = build_router(commands, ACTIONS, prefixes)
+    cases = [
+        ('commands (chain)', lambda: [chain_command(t, commands) for t in SAMPLE_TEXTS], len(SAMPLE_TEXTS)),
+        ('commands (router)', lambda: [router.match_command(t) for t in SAMPLE_TEXTS], len(SAMPLE_TEXTS)),
+        ('callbacks (chain)', lambda: [chain_callback(d, ACTIONS, prefixes) for d in SAMPLE_CALLBACKS], len(SAMPLE_CALLBACKS)),
+        ('callbacks (router)', lambda: [router.match_callback(d) for d in SAMPLE_CALLBACKS], len(SAMPLE_CALLBACKS)),
+        ('legacy (chain)', lambda: [chain_callback(d, ACTIONS, prefixes) for d in LEGACY_CALLBACKS], len(LEGACY_CALLBACKS)),
+        ('legacy (router)', lambda: [router.match_callback(d) for d in LEGACY_CALLBACKS], len(LEGACY_CALLBACKS)),
+    ]
+    print(f"[Bench] {label}: {len(commands)} commands, {len(ACTIONS)} actions, {len(prefixes)} legacy prefixes")
+    for name, fn, per_call in cases:
+        seconds = min(timeit.repeat(fn, number=rounds, repeat=5))
+        print(f"{name:20s} {seconds / (rounds * per_call) * 1e9:8.0f} ns/update")
+
+
+if __name__ == '__main__':
+    run(COMMANDS, LEGACY_PREFIXES, 'current route table')
+    # Every new command or legacy namespace adds a branch; the chain grows linearly while the router does not
+    extra = 40
+    run([f'/extra{i}' for i in range(extra)] + COMMANDS,
+        [(f'extra{i}_', 2) for i in range(extra)] + LEGACY_PREFIXES,
+        f'route table with {extra} more entries')
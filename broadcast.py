@@ -0,0 +1,96 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from helpers import html_bold
+from user_registry import user_registry
+from config import BROADCAST_CONCURRENCY, BROADCAST_PAGE_SIZE, BROADCAST_REPORT_SECONDS
+
+# Errors after which a chat can never receive messages again
+GONE_DESCRIPTIONS = ('chat not found', 'user is deactivated', 'bot was kicked', 'peer_id_invalid')
+
+
+def is_gone(result):
+    if result.get('error_code') == 403:
+        return True
+    description = (result.get('description') or '').lower()
+    return result.get('error_code') == 400 and any(text in description for text in GONE_DESCRIPTIONS)
+
+
+class Broadcaster:
+    """Copies one message to every active chat.
+
+    copyMessage calls run on BROADCAST_CONCURRENCY threads; the shared rate
+    limiter decides the actual pace. Chats are walked in chat_id order one page
+    at a time and the cursor is checkpointed after each page, so a resumed
+    broadcast (job.state) continues after the last finished page. Chats that
+    blocked the bot are pruned from the registry.
+    """
+
+    def __init__(self, handlers, concurrency=BROADCAST_CONCURRENCY, page_size=BROADCAST_PAGE_SIZE):
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.page_size = page_size
+
+    def _copy(self, target_chat_id, from_chat_id, message_id):
+        return self.handlers._make_request('copyMessage', {
+            'chat_id': target_chat_id,
+            'from_chat_id': from_chat_id,
+            'message_id': message_id
+        })
+
+    def run(self, from_chat_id, message_id, job=None, status_message_id=None):
+        """Send to all active chats and return {'successful_sends', 'failed_sends', 'pruned'}"""
+        state = job.state if job else {}
+        cursor = state.get('cursor')
+        results = {
+            'successful_sends': state.get('successful_sends', 0),
+            'failed_sends': state.get('failed_sends', 0),
+            'pruned': state.get('pruned', 0)
+        }
+        total = results['successful_sends'] + results['failed_sends'] + user_registry.count(after=cursor)
+        started = time.time()
+        done_at_start = results['successful_sends'] + results['failed_sends']
+        last_report = 0
+        
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='broadcast') as pool:
+            while True:
+                chat_ids = user_registry.active_ids(after=cursor, limit=self.page_size)
+                if not chat_ids:
+                    break
+                
+                gone = []
+                for chat_id, result in zip(chat_ids, pool.map(lambda target: self._copy(target, from_chat_id, message_id), chat_ids)):
+                    if result.get('ok'):
+                        results['successful_sends'] += 1
+                    else:
+                        results['failed_sends'] += 1
+                        if is_gone(result):
+                            gone.append(chat_id)
+                user_registry.deactivate(gone)
+                results['pruned'] += len(gone)
+                cursor = chat_ids[-1]
+                
+                if job:
+                    job.update(cursor=cursor, **results)
+                
+                if status_message_id and time.time() - last_report >= BROADCAST_REPORT_SECONDS:
+                    last_report = time.time()
+                    self.report(from_chat_id, status_message_id, results, total, started, done_at_start)
+        
+        return results
+
+    def report(self, chat_id, status_message_id, results, total, started, done_at_start):
+        """Live progress for the owner: counts, messages per second and ETA"""
+        done = results['successful_sends'] + results['failed_sends']
+        elapsed = max(time.time() - started, 0.001)
+        rate = (done - done_at_start) / elapsed
+        remaining = max(total - done, 0)
+        eta = f"{int(remaining / rate) // 60}m {int(remaining / rate) % 60}s" if rate > 0 else 'N/A'
+        self.handlers.edit_status(
+            chat_id, status_message_id,
+            html_bold('📣 Broadcasting...') + '\n\n' +
+            f"📨 Progress: {done}/{total}\n"
+            f"🚀 Successful: {results['successful_sends']}\n"
+            f"❗️ Failed/Blocked: {results['failed_sends']} (pruned {results['pruned']})\n"
+            f"⚡ Speed: {rate:.1f} msg/s\n"
+            f"⏳ ETA: {eta}"
+        )
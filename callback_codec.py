@@ -0,0 +1,83 @@
+"""Compact callback_data: one action character, then '|'-separated arguments.
+
+    'u|video|720p|3fK9|137'  ->  ('urldl', ['video', '720p', '3fK9', '137'])
+
+Cache ids are short base62 strings drawn from a counter in the state backend,
+so they are unique across every worker and host that shares it.
+"""
+import threading
+import state_backend
+
+SEPARATOR = '|'
+MAX_CALLBACK_BYTES = 64
+
+ACTION_CODES = {
+    'songcount': 's',
+    'ytdl': 'y',
+    'urldl': 'u',
+    'urldl_tkaudio': 't',
+    'owndl': 'o',
+    'aipv': 'v',
+    'aipi': 'i'
+}
+
+BASE62 = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+# Ids are reserved from the backend in blocks so most calls never leave the process
+ID_BLOCK_SIZE = 64
+
+
+def base62(number):
+    if number == 0:
+        return BASE62[0]
+    digits = []
+    while number:
+        number, remainder = divmod(number, 62)
+        digits.append(BASE62[remainder])
+    return ''.join(reversed(digits))
+
+
+class IdAllocator:
+    def __init__(self, name='callback_ids', block_size=ID_BLOCK_SIZE):
+        self.name = name
+        self.block_size = block_size
+        self.next = 0
+        self.limit = 0
+        self._lock = threading.Lock()
+
+    def new_id(self):
+        with self._lock:
+            if self.next >= self.limit:
+                self.next = state_backend.backend.allocate_ids(self.name, self.block_size)
+                self.limit = self.next + self.block_size
+            value = self.next
+            self.next += 1
+        return base62(value)
+
+
+id_allocator = IdAllocator()
+
+
+def new_id():
+    """Short collision-free id for a callback cache entry"""
+    return id_allocator.new_id()
+
+
+def encode(action, *args, optional=None):
+    """Payload for action and args. `optional` is appended only when it still fits in 64 bytes,
+    so handlers must be able to do without it."""
+    data = ACTION_CODES[action] + SEPARATOR + SEPARATOR.join(str(arg) for arg in args)
+    if optional:
+        extended = data + SEPARATOR + str(optional)
+        if len(extended.encode('utf-8')) <= MAX_CALLBACK_BYTES:
+            return extended
+    if len(data.encode('utf-8')) > MAX_CALLBACK_BYTES:
+        raise ValueError(f"callback_data for {action} exceeds {MAX_CALLBACK_BYTES} bytes: {data}")
+    return data
+
+
+def decode(data):
+    """Return (code, args) for an encoded payload, or (None, None) for anything else"""
+    if len(data) > 1 and data[1] == SEPARATOR:
+        return data[0], data[2:].split(SEPARATOR)
+    return None, None
@@ -0,0 +1,104 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import CHAT_ACTION_INTERVAL, CHAT_ACTION_MAX_SECONDS, CHAT_ACTION_WORKERS
+
+
+class ChatActionKeeper:
+    """Keeps "typing"/"uploading" indicators alive for as long as the work behind them runs.
+
+    hold(chat_id, action) takes a lease owned by the calling thread (a
+    scheduler job) and sends the action unless the chat already shows it.
+    One timer thread re-sends the newest action of every chat with a lease
+    every CHAT_ACTION_INTERVAL seconds, just before Telegram's 5 second
+    expiry. Leases end with release(), which the scheduler calls when a job
+    finishes, or after CHAT_ACTION_MAX_SECONDS.
+    """
+
+    def __init__(self, send, interval=CHAT_ACTION_INTERVAL, max_age=CHAT_ACTION_MAX_SECONDS, workers=CHAT_ACTION_WORKERS):
+        self.send = send
+        self.interval = interval
+        self.max_age = max_age
+        self.workers = workers
+        # (thread id, chat_id) -> (action, taken_at)
+        self.leases = {}
+        # chat_id -> (action, sent_at)
+        self.last_sent = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+        self._pool = None
+        self.sent = 0
+        self.skipped = 0
+
+    def _start(self):
+        # Called with self._lock held; started lazily so gunicorn forks first
+        if self._thread is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='chat-action')
+            self._thread = threading.Thread(target=self._timer_loop, name='chat-action-timer', daemon=True)
+            self._thread.start()
+
+    def hold(self, chat_id, action):
+        now = time.time()
+        with self._lock:
+            self.leases[(threading.get_ident(), chat_id)] = (action, now)
+            last = self.last_sent.get(chat_id)
+            due = last is None or last[0] != action or now - last[1] >= self.interval
+            if due:
+                self.last_sent[chat_id] = (action, now)
+            else:
+                self.skipped += 1
+            self._start()
+            self._wakeup.notify()
+        if due:
+            self._send(chat_id, action)
+
+    def release(self, chat_id=None):
+        """End the calling thread's leases (for one chat, or all of them)"""
+        ident = threading.get_ident()
+        with self._lock:
+            for key in [key for key in self.leases if key[0] == ident and (chat_id is None or key[1] == chat_id)]:
+                del self.leases[key]
+
+    def _send(self, chat_id, action):
+        try:
+            self.send(chat_id, action)
+            self.sent += 1
+        except Exception as e:
+            print(f"[ChatActions] sendChatAction failed for {chat_id}: {e}")
+
+    def _due_actions(self, now):
+        # Called with self._lock held; returns (due list, seconds until the next one)
+        for key in [key for key, (_, taken_at) in self.leases.items() if now - taken_at > self.max_age]:
+            del self.leases[key]
+        wanted = {}
+        for (_, chat_id), (action, taken_at) in self.leases.items():
+            if chat_id not in wanted or taken_at > wanted[chat_id][1]:
+                wanted[chat_id] = (action, taken_at)
+        for chat_id in [chat_id for chat_id in self.last_sent if chat_id not in wanted]:
+            del self.last_sent[chat_id]
+        due = []
+        next_in = None
+        for chat_id, (action, _) in wanted.items():
+            last = self.last_sent.get(chat_id)
+            at = last[1] + self.interval if last and last[0] == action else now
+            if at <= now:
+                due.append((chat_id, action))
+                self.last_sent[chat_id] = (action, now)
+                at = now + self.interval
+            next_in = at - now if next_in is None else min(next_in, at - now)
+        return due, next_in
+
+    def _timer_loop(self):
+        while True:
+            with self._lock:
+                due, next_in = self._due_actions(time.time())
+                if not due:
+                    self._wakeup.wait(next_in)
+                    continue
+            for chat_id, action in due:
+                self._pool.submit(self._send, chat_id, action)
+
+    def stats(self):
+        with self._lock:
+            return {'leases': len(self.leases), 'sent': self.sent, 'skipped': self.skipped}
@@ -2,9 +2,18 @@ import os
 
 BOT_TOKEN = os.environ.get('BOT_TOKEN', '')
 OWNER_ID = os.environ.get('OWNER_ID', '')
-MAX_FILE_SIZE_BYTES = int(os.environ.get('MAX_FILE_SIZE_BYTES', 50 * 1024 * 1024))
 
-TELEGRAM_API = f"https://api.telegram.org/bot{BOT_TOKEN}"
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org').rstrip('/')
+TELEGRAM_API = f"{TELEGRAM_API_URL}/bot{BOT_TOKEN}"
+# Self-hosted telegram-bot-api server (run with --local) at TELEGRAM_API_URL: uploads up to 2000MB.
+# TELEGRAM_LOCAL_PATHS sends file:// paths instead of uploading, when the server shares our filesystem;
+# it only applies in local mode, since api.telegram.org cannot read our paths.
+TELEGRAM_LOCAL_MODE = os.environ.get('TELEGRAM_LOCAL_MODE', 'false').lower() == 'true'
+TELEGRAM_LOCAL_PATHS = TELEGRAM_LOCAL_MODE and os.environ.get('TELEGRAM_LOCAL_PATHS', 'true').lower() == 'true'
+
+MAX_FILE_SIZE_BYTES = int(os.environ.get('MAX_FILE_SIZE_BYTES', (2000 if TELEGRAM_LOCAL_MODE else 50) * 1024 * 1024))
+# Files above MAX_FILE_SIZE_BYTES are uploaded over MTProto (mtproto_client) up to this size
+MTPROTO_MAX_FILE_SIZE_BYTES = int(os.environ.get('MTPROTO_MAX_FILE_SIZE_BYTES', 2000 * 1024 * 1024))
 
 PROGRESS_STATES = [
     {"text": "⏳ <b>Loading</b>...▒▒▒▒▒▒▒▒▒▒", "percentage": "0%"},
@@ -19,3 +28,115 @@ PROGRESS_STATES = [
     {"text": "✨ <b>Finalizing</b>...█████████▒", "percentage": "90%"},
     {"text": "✅ <b>Done!</b> ██████████", "percentage": "100%"}
 ]
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 8))
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', 200))
+JOB_PER_CHAT_LIMIT = int(os.environ.get('JOB_PER_CHAT_LIMIT', 3))
+
+# Fast-ack: the webhook only validates and queues updates, all Telegram calls happen on update workers
+WEBHOOK_FAST_ACK = os.environ.get('WEBHOOK_FAST_ACK', 'true').lower() == 'true'
+UPDATE_WORKERS = int(os.environ.get('UPDATE_WORKERS', 4))
+UPDATE_QUEUE_SIZE = int(os.environ.get('UPDATE_QUEUE_SIZE', 1000))
+# Updates one chat may have queued at once, so a flooding chat cannot fill the whole update queue
+UPDATE_PER_CHAT_LIMIT = int(os.environ.get('UPDATE_PER_CHAT_LIMIT', 8))
+
+# Scheduler lanes as (workers, queue size, per-chat limit). Each lane has its own threads,
+# so /start replies and previews never wait behind 300s downloads.
+JOB_LANES = {
+    'interactive': (UPDATE_WORKERS, UPDATE_QUEUE_SIZE, UPDATE_PER_CHAT_LIMIT),
+    'metadata': (
+        int(os.environ.get('METADATA_WORKERS', 4)),
+        int(os.environ.get('METADATA_QUEUE_SIZE', 200)),
+        int(os.environ.get('METADATA_PER_CHAT_LIMIT', 5))
+    ),
+    'download': (JOB_WORKERS, JOB_QUEUE_SIZE, JOB_PER_CHAT_LIMIT),
+    'transcode': (
+        int(os.environ.get('TRANSCODE_WORKERS', 2)),
+        int(os.environ.get('TRANSCODE_QUEUE_SIZE', 50)),
+        int(os.environ.get('TRANSCODE_PER_CHAT_LIMIT', 2))
+    ),
+    # Broadcasts run for hours at broadcast rate limits; here they never hold a download worker or the owner's mailbox
+    'broadcast': (
+        int(os.environ.get('BROADCAST_WORKERS', 1)),
+        int(os.environ.get('BROADCAST_QUEUE_SIZE', 5)),
+        int(os.environ.get('BROADCAST_PER_CHAT_LIMIT', 1))
+    )
+}
+
+# Callback/button state: 'memory' (single worker), 'sqlite' (all workers on one host) or 'postgres' (many hosts)
+STATE_BACKEND = os.environ.get('STATE_BACKEND', 'sqlite')
+STATE_DB = os.environ.get('STATE_DB', 'bot_state.db')
+DATABASE_URL = os.environ.get('DATABASE_URL', '')
+STATE_PG_POOL_SIZE = int(os.environ.get('STATE_PG_POOL_SIZE', 10))
+
+# Journal of in-flight jobs, re-queued after a restart. Older unfinished jobs are dropped.
+JOB_JOURNAL_DB = os.environ.get('JOB_JOURNAL_DB', 'job_journal.db')
+JOB_JOURNAL_MAX_AGE = int(os.environ.get('JOB_JOURNAL_MAX_AGE', 6 * 3600))
+
+# Expiry in seconds for each state namespace (None never expires); others use CACHE_DEFAULT_TTL
+CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 3600))
+CACHE_TTLS = {
+    'ai_video': 300,
+    'ai_pages': 600,
+    'settings': None
+}
+# Limits for each in-process cache
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 32 * 1024 * 1024))
+MEDIA_INFO_TTL = int(os.environ.get('MEDIA_INFO_TTL', 300))
+
+# Keep-alive connections to the Bot API per process, and how many to open at startup
+TELEGRAM_POOL_SIZE = int(os.environ.get('TELEGRAM_POOL_SIZE', 32))
+TELEGRAM_WARM_CONNECTIONS = int(os.environ.get('TELEGRAM_WARM_CONNECTIONS', 4))
+# Bytes read from disk per chunk when streaming an upload
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+# Photos per sendMediaGroup (Telegram allows 2-10) and parallel image downloads when URL delivery fails
+MEDIA_GROUP_SIZE = int(os.environ.get('MEDIA_GROUP_SIZE', 10))
+MEDIA_FETCH_WORKERS = int(os.environ.get('MEDIA_FETCH_WORKERS', 8))
+
+# Bot API rate limits, shared by all workers on this host through RATE_LIMIT_DB
+RATE_LIMIT_DB = os.environ.get('RATE_LIMIT_DB', 'rate_limits.db')
+RATE_LIMIT_GLOBAL_PER_SEC = float(os.environ.get('RATE_LIMIT_GLOBAL_PER_SEC', 30))
+RATE_LIMIT_PRIVATE_PER_SEC = float(os.environ.get('RATE_LIMIT_PRIVATE_PER_SEC', 1))
+RATE_LIMIT_PRIVATE_BURST = float(os.environ.get('RATE_LIMIT_PRIVATE_BURST', 3))
+RATE_LIMIT_GROUP_PER_MIN = float(os.environ.get('RATE_LIMIT_GROUP_PER_MIN', 20))
+RATE_LIMIT_MAX_RETRIES = int(os.environ.get('RATE_LIMIT_MAX_RETRIES', 3))
+
+# Status/progress edits: at most one per message per interval, the latest text wins
+EDIT_MIN_INTERVAL = float(os.environ.get('EDIT_MIN_INTERVAL', 1.5))
+EDIT_FLUSH_WORKERS = int(os.environ.get('EDIT_FLUSH_WORKERS', 4))
+PROGRESS_STEP_SECONDS = float(os.environ.get('PROGRESS_STEP_SECONDS', 2))
+
+# Chat actions expire after 5s on Telegram's side, so active ones are re-sent every CHAT_ACTION_INTERVAL
+CHAT_ACTION_INTERVAL = float(os.environ.get('CHAT_ACTION_INTERVAL', 4.5))
+CHAT_ACTION_MAX_SECONDS = int(os.environ.get('CHAT_ACTION_MAX_SECONDS', 900))
+CHAT_ACTION_WORKERS = int(os.environ.get('CHAT_ACTION_WORKERS', 4))
+
+# Telegram file_ids of uploaded media, reused for repeat links; entries unused for FILE_ID_CACHE_MAX_AGE seconds are ignored
+FILE_ID_CACHE_DB = os.environ.get('FILE_ID_CACHE_DB', 'file_ids.db')
+FILE_ID_CACHE_MAX_AGE = int(os.environ.get('FILE_ID_CACHE_MAX_AGE', 30 * 24 * 3600))
+
+# Users (new chats are written in batches every USERS_FLUSH_SECONDS) and broadcasts:
+# copyMessage threads (the rate limiter sets the real pace), chats per checkpoint
+USERS_DB = os.environ.get('USERS_DB', 'users.db')
+USERS_FLUSH_SECONDS = float(os.environ.get('USERS_FLUSH_SECONDS', 5))
+BROADCAST_CONCURRENCY = int(os.environ.get('BROADCAST_CONCURRENCY', 16))
+BROADCAST_PAGE_SIZE = int(os.environ.get('BROADCAST_PAGE_SIZE', 200))
+BROADCAST_REPORT_SECONDS = float(os.environ.get('BROADCAST_REPORT_SECONDS', 5))
+
+# Warm yt-dlp worker processes (yt_dlp imported once each), replaced after YTDLP_WORKER_MAX_JOBS jobs; 0 disables a pool
+YTDLP_PROBE_WORKERS = int(os.environ.get('YTDLP_PROBE_WORKERS', 2))
+YTDLP_DOWNLOAD_WORKERS = int(os.environ.get('YTDLP_DOWNLOAD_WORKERS', 2))
+YTDLP_WORKER_MAX_JOBS = int(os.environ.get('YTDLP_WORKER_MAX_JOBS', 50))
+
+UPDATE_DEDUP_SIZE = int(os.environ.get('UPDATE_DEDUP_SIZE', 10000))
+UPDATE_DEDUP_DB = os.environ.get('UPDATE_DEDUP_DB', 'update_ids.db')
+
+POLLING_OFFSET_FILE = os.environ.get('POLLING_OFFSET_FILE', 'polling_offset.json')
+POLLING_TIMEOUT = int(os.environ.get('POLLING_TIMEOUT', 30))
+POLLING_BATCH_SIZE = int(os.environ.get('POLLING_BATCH_SIZE', 100))
+
+# 'threads' runs jobs on the JobScheduler pool, 'asyncio' runs downloads as coroutines
+EXECUTION_MODE = os.environ.get('EXECUTION_MODE', 'threads')
+ASYNC_MAX_JOBS = int(os.environ.get('ASYNC_MAX_JOBS', 1000))
+ASYNC_HTTP_CONNECTIONS = int(os.environ.get('ASYNC_HTTP_CONNECTIONS', 100))
@@ -0,0 +1,201 @@
+import heapq
+import itertools
+import json
+import threading
+import time
+from ttl_cache import TTLCache
+from config import EDIT_MIN_INTERVAL, EDIT_FLUSH_WORKERS
+
+
+class _MessageEdits:
+    def __init__(self):
+        # Serializes sends for one message so an older edit can never land after a newer one
+        self.send_lock = threading.Lock()
+        self.last_signature = None
+        self.last_at = 0
+        self.pending = None
+        self.scheduled = False
+        self.closed = False
+
+
+class EditCoalescer:
+    """Debounces edits per (chat, message).
+
+    Intermediate edits (submit) go out immediately when the message has not
+    been edited for `interval` seconds; otherwise only the latest one is kept
+    and flushed once the interval has passed. Edits identical to the last one
+    sent are dropped. A final edit (finalize) discards anything pending, waits
+    for an in-flight edit and is sent straight away. After finalize or close,
+    stale pending edits for the message are never sent. submit_later hands
+    an edit to the flusher threads for a future time, so callers never sleep.
+    """
+
+    IDLE_SECONDS = 600
+
+    def __init__(self, send, interval=EDIT_MIN_INTERVAL, flush_workers=EDIT_FLUSH_WORKERS):
+        self.send = send
+        self.interval = interval
+        self.flush_workers = flush_workers
+        self.messages = {}
+        self.closed = TTLCache(self.IDLE_SECONDS, max_entries=100000, name='closed_edits')
+        self._due = []
+        self._timers = []
+        self._timer_seq = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._threads = []
+        self._last_sweep = time.time()
+        self.sent = 0
+        self.coalesced = 0
+        self.identical = 0
+
+    def _start(self):
+        # Called with self._lock held; threads start lazily so gunicorn forks first
+        if self._threads:
+            return
+        for i in range(self.flush_workers):
+            thread = threading.Thread(target=self._flush_loop, name=f"edit-flusher-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, chat_id, message_id, method, data, reopen=True):
+        """Queue an intermediate edit. With reopen=False it is dropped once the message was finalized."""
+        key = (chat_id, message_id)
+        signature = (method, json.dumps(data, sort_keys=True))
+        now = time.time()
+        with self._lock:
+            if key in self.closed:
+                if not reopen:
+                    return None
+                self.closed.delete(key)
+            state = self.messages.get(key)
+            if state is None:
+                state = self.messages[key] = _MessageEdits()
+            if signature == state.last_signature or (state.pending and state.pending[2] == signature):
+                self.identical += 1
+                return None
+            if state.pending is None and now - state.last_at >= self.interval:
+                state.last_at = now
+                send_now = True
+            else:
+                if state.pending is not None:
+                    self.coalesced += 1
+                state.pending = (method, data, signature)
+                if not state.scheduled:
+                    state.scheduled = True
+                    heapq.heappush(self._due, (state.last_at + self.interval, key))
+                    self._start()
+                    self._wakeup.notify()
+                send_now = False
+            self._sweep(now)
+        if send_now:
+            return self._deliver(state, method, data, signature)
+        return None
+
+    def submit_later(self, delay, chat_id, message_id, method, data):
+        """Submit an intermediate edit (reopen=False) after `delay` seconds from a flusher thread"""
+        with self._lock:
+            heapq.heappush(self._timers, (time.time() + delay, next(self._timer_seq), chat_id, message_id, method, data))
+            self._start()
+            self._wakeup.notify()
+
+    def finalize(self, chat_id, message_id, method, data):
+        """Send the final edit for a message now, superseding anything pending"""
+        key = (chat_id, message_id)
+        signature = (method, json.dumps(data, sort_keys=True))
+        with self._lock:
+            state = self.messages.pop(key, None)
+            self.closed[key] = True
+            if state is not None:
+                state.pending = None
+                state.closed = True
+        if state is None:
+            self.sent += 1
+            return self.send(method, data)
+        with state.send_lock:
+            if state.last_signature == signature:
+                self.identical += 1
+                return {'ok': True, 'result': True}
+            self.sent += 1
+            return self.send(method, data)
+
+    def close(self, chat_id, message_id):
+        """Forget a message (e.g. it was deleted) and drop its pending edit"""
+        key = (chat_id, message_id)
+        with self._lock:
+            state = self.messages.pop(key, None)
+            self.closed[key] = True
+            if state is not None:
+                state.pending = None
+                state.closed = True
+
+    def is_open(self, chat_id, message_id):
+        return (chat_id, message_id) not in self.closed
+
+    def _deliver(self, state, method, data, signature):
+        with state.send_lock:
+            if state.closed:
+                return None
+            result = self.send(method, data)
+            self.sent += 1
+            with self._lock:
+                state.last_signature = signature
+                state.last_at = time.time()
+            return result
+
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                while not self._due and not self._timers:
+                    self._wakeup.wait()
+                due = min(heap[0][0] for heap in (self._due, self._timers) if heap)
+                now = time.time()
+                if due > now:
+                    self._wakeup.wait(due - now)
+                    continue
+                timer = None
+                if self._timers and self._timers[0][0] <= now:
+                    timer = heapq.heappop(self._timers)
+            if timer is not None:
+                # submit takes the lock itself and drops the edit if the message was finalized meanwhile
+                self.submit(*timer[2:], reopen=False)
+                continue
+            with self._lock:
+                if not self._due or self._due[0][0] > time.time():
+                    continue
+                due, key = heapq.heappop(self._due)
+                state = self.messages.get(key)
+                if state is None:
+                    continue
+                state.scheduled = False
+                if state.pending is None:
+                    continue
+                if now - state.last_at < self.interval:
+                    # An immediate edit went out since this was scheduled
+                    state.scheduled = True
+                    heapq.heappush(self._due, (state.last_at + self.interval, key))
+                    continue
+                method, data, signature = state.pending
+                state.pending = None
+                state.last_at = now
+            self._deliver(state, method, data, signature)
+
+    def _sweep(self, now):
+        # Called with self._lock held
+        if now - self._last_sweep < self.IDLE_SECONDS:
+            return
+        self._last_sweep = now
+        idle = [key for key, state in self.messages.items()
+                if state.pending is None and now - state.last_at > self.IDLE_SECONDS]
+        for key in idle:
+            del self.messages[key]
+
+    def stats(self):
+        with self._lock:
+            tracked = len(self.messages)
+        return {
+            'tracked_messages': tracked,
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'identical_dropped': self.identical
+        }
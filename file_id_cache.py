@@ -0,0 +1,115 @@
+import json
+import time
+import threading
+from sqlite_store import SQLiteStore
+from config import FILE_ID_CACHE_DB, FILE_ID_CACHE_MAX_AGE
+
+
+def file_id_from_result(result, kind):
+    """file_id of the media in a send* result, or None.
+
+    Only the field matching the kind counts: a video Telegram stored as a
+    document cannot be re-sent with sendVideo.
+    """
+    if not result or not result.get('ok'):
+        return None
+    media = (result.get('result') or {}).get(kind) or {}
+    return media.get('file_id')
+
+
+class FileIdCache:
+    """Persistent (media key, format, quality) -> Telegram file_id, so a repeat link is one sendVideo/sendAudio call.
+
+    The media key is the canonical id of the source media (e.g. 'Youtube:dQw4w9WgXcQ'),
+    not the URL, so every link form of the same video shares one entry.
+    """
+
+    SCHEMA = [
+        '''CREATE TABLE IF NOT EXISTS file_ids (
+            media_key TEXT NOT NULL,
+            format TEXT NOT NULL,
+            quality TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            metadata TEXT,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (media_key, format, quality)
+        )'''
+    ]
+
+    def __init__(self, path=FILE_ID_CACHE_DB, max_age=FILE_ID_CACHE_MAX_AGE):
+        self.store = SQLiteStore(path, self.SCHEMA)
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.invalidated = 0
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, media_key, fmt, quality):
+        """{'kind', 'file_id', 'metadata'} for a previously sent file, or None"""
+        if not media_key:
+            return None
+        now = time.time()
+        row = self.store.execute(
+            'SELECT kind, file_id, metadata, last_used FROM file_ids WHERE media_key = ? AND format = ? AND quality = ?',
+            (media_key, fmt, str(quality))
+        ).fetchone()
+        if row is None or (self.max_age and now - row[3] > self.max_age):
+            self._count('misses')
+            return None
+        self.store.execute(
+            'UPDATE file_ids SET hits = hits + 1, last_used = ? WHERE media_key = ? AND format = ? AND quality = ?',
+            (now, media_key, fmt, str(quality))
+        )
+        self._count('hits')
+        return {'kind': row[0], 'file_id': row[1], 'metadata': json.loads(row[2]) if row[2] else {}}
+
+    def put(self, media_key, fmt, quality, kind, file_id, metadata=None):
+        if not media_key or not file_id:
+            return
+        now = time.time()
+        self.store.execute(
+            '''INSERT OR REPLACE INTO file_ids (media_key, format, quality, kind, file_id, metadata, created_at, last_used)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+            (media_key, fmt, str(quality), kind, file_id, json.dumps(metadata or {}), now, now)
+        )
+        self._count('stored')
+
+    def remember(self, media_key, fmt, quality, kind, send_result, metadata=None):
+        """Store the file_id from a successful upload"""
+        file_id = file_id_from_result(send_result, kind)
+        if file_id:
+            self.put(media_key, fmt, quality, kind, file_id, metadata)
+        return file_id
+
+    def invalidate(self, media_key, fmt, quality):
+        """Drop an entry whose file_id Telegram no longer accepts"""
+        self.store.execute(
+            'DELETE FROM file_ids WHERE media_key = ? AND format = ? AND quality = ?',
+            (media_key, fmt, str(quality))
+        )
+        self._count('invalidated')
+
+    def stats(self):
+        with self._lock:
+            hits, misses, stored, invalidated = self.hits, self.misses, self.stored, self.invalidated
+        lookups = hits + misses
+        entries = self.store.execute('SELECT COUNT(*) FROM file_ids').fetchone()[0]
+        return {
+            'entries': entries,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'stored': stored,
+            'invalidated': invalidated
+        }
+
+
+file_id_cache = FileIdCache()
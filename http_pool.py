@@ -0,0 +1,37 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PooledSession:
+    """requests.Session over a sized keep-alive connection pool, with reuse counters"""
+
+    def __init__(self, pool_size=32):
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        # Telegram calls are never retried blindly at this level: a resent sendMessage is a duplicate message
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+    def post(self, url, **kwargs):
+        return self.session.post(url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def stats(self):
+        new_connections = 0
+        total_requests = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            new_connections += pool.num_connections
+            total_requests += pool.num_requests
+        return {
+            'pool_size': self.pool_size,
+            'requests': total_requests,
+            'new_connections': new_connections,
+            'reused_connections': max(0, total_requests - new_connections)
+        }
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from sqlite_store import SQLiteStore
+from config import JOB_JOURNAL_DB, JOB_JOURNAL_MAX_AGE
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Job:
+    """One journaled job. `state` holds the results of completed stages."""
+
+    def __init__(self, journal, job_id, kind, chat_id, lane, args, state):
+        self.journal = journal
+        self.id = job_id
+        self.kind = kind
+        self.chat_id = chat_id
+        self.lane = lane
+        self.args = args
+        self.state = state
+
+    def done(self, stage):
+        return stage in self.state.get('stages', [])
+
+    def complete(self, stage, **values):
+        """Mark a stage finished and persist whatever a resumed run needs to skip it"""
+        self.state.update(values)
+        self.state['stages'] = self.state.get('stages', []) + [stage]
+        self.journal.save_state(self, stage)
+
+    def update(self, **values):
+        self.state.update(values)
+        self.journal.save_state(self, None)
+
+
+class JobJournal:
+    """Durable record of in-flight jobs so they survive restarts and gunicorn --reload.
+
+    Jobs are registered by kind with JSON-serializable args. Each row is owned
+    by the pid that is running it; rows whose owner has died are claimed and
+    re-queued by the next process to start.
+    """
+
+    SCHEMA = [
+        '''CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            chat_id INTEGER,
+            lane TEXT NOT NULL,
+            args TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT '{}',
+            stage TEXT,
+            status TEXT NOT NULL,
+            owner_pid INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )''',
+        'CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)'
+    ]
+
+    def __init__(self, path=JOB_JOURNAL_DB, max_age=JOB_JOURNAL_MAX_AGE):
+        self.store = SQLiteStore(path, self.SCHEMA)
+        self.max_age = max_age
+        self.handlers = {}
+        # Jobs this process is responsible for, so a recycled pid cannot hide an orphan
+        self._owned = set()
+        self._lock = threading.Lock()
+
+    def register(self, kind):
+        def decorator(handler):
+            self.handlers[kind] = handler
+            return handler
+        return decorator
+
+    def create(self, kind, chat_id, lane, args):
+        now = time.time()
+        job = Job(self, uuid.uuid4().hex, kind, chat_id, lane, list(args), {})
+        self.store.execute(
+            '''INSERT INTO jobs (id, kind, chat_id, lane, args, status, owner_pid, created_at, updated_at)
+               VALUES (?, ?, ?, ?, ?, 'pending', ?, ?, ?)''',
+            (job.id, kind, chat_id, lane, json.dumps(job.args), os.getpid(), now, now)
+        )
+        with self._lock:
+            self._owned.add(job.id)
+        return job
+
+    def save_state(self, job, stage):
+        self.store.execute(
+            'UPDATE jobs SET state = ?, stage = COALESCE(?, stage), updated_at = ? WHERE id = ?',
+            (json.dumps(job.state), stage, time.time(), job.id)
+        )
+
+    def finish(self, job, status='done'):
+        self.store.execute('UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?', (status, time.time(), job.id))
+        with self._lock:
+            self._owned.discard(job.id)
+
+    def start(self, job):
+        self.store.execute("UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ?", (time.time(), job.id))
+
+    def run(self, job):
+        """Scheduler entry point for a journaled job"""
+        self.start(job)
+        try:
+            self.handlers[job.kind](job)
+        except Exception:
+            self.finish(job, 'failed')
+            raise
+        self.finish(job, 'done')
+
+    async def run_async(self, job, handler):
+        """run() for a coroutine handler on the asyncio runtime; journal writes go through a worker thread"""
+        await asyncio.to_thread(self.start, job)
+        try:
+            await handler(job)
+        except Exception:
+            await asyncio.to_thread(self.finish, job, 'failed')
+            raise
+        await asyncio.to_thread(self.finish, job, 'done')
+
+    def claim_orphaned(self):
+        """Take ownership of unfinished jobs whose process is gone and return them"""
+        now = time.time()
+        pid = os.getpid()
+        claimed = []
+        with self._lock:
+            owned = set(self._owned)
+
+        with self.store.transaction() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status NOT IN ('pending', 'running') AND updated_at < ?",
+                (now - self.max_age,)
+            )
+            conn.execute(
+                "UPDATE jobs SET status = 'expired', updated_at = ? WHERE status IN ('pending', 'running') AND created_at < ?",
+                (now, now - self.max_age)
+            )
+            rows = conn.execute(
+                "SELECT id, kind, chat_id, lane, args, state, owner_pid FROM jobs WHERE status IN ('pending', 'running')"
+            ).fetchall()
+            for job_id, kind, chat_id, lane, args, state, owner_pid in rows:
+                if job_id in owned or kind not in self.handlers:
+                    continue
+                if owner_pid != pid and pid_alive(owner_pid):
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET status = 'pending', owner_pid = ?, updated_at = ? WHERE id = ?",
+                    (pid, now, job_id)
+                )
+                claimed.append(Job(self, job_id, kind, chat_id, lane, json.loads(args), json.loads(state)))
+
+        with self._lock:
+            self._owned.update(job.id for job in claimed)
+        return claimed
+
+
+job_journal = JobJournal()
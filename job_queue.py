@@ -0,0 +1,136 @@
+import queue
+import threading
+from collections import deque
+from config import JOB_WORKERS, JOB_QUEUE_SIZE, JOB_PER_CHAT_LIMIT, JOB_LANES
+
+
+class JobScheduler:
+    """Worker pool with one ordered mailbox per chat.
+
+    Jobs for the same chat run one at a time in submission order, while
+    different chats run in parallel. A chat's mailbox only exists while it has
+    queued or running work, so idle chats cost no memory.
+    """
+
+    def __init__(self, num_workers=JOB_WORKERS, max_queue_size=JOB_QUEUE_SIZE, per_chat_limit=JOB_PER_CHAT_LIMIT, name='job'):
+        self.name = name
+        self.num_workers = num_workers
+        self.max_queue_size = max_queue_size
+        self.per_chat_limit = per_chat_limit
+        self._mailboxes = {}
+        # Keys of mailboxes that have work and no worker currently draining them
+        self._ready = queue.Queue()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._workers = []
+        self._started = False
+        # Called with no arguments on the worker thread after every job
+        self.finish_hooks = []
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self):
+        # Workers are started lazily so that gunicorn forks before any thread exists
+        with self._lock:
+            if self._started:
+                return
+            for i in range(self.num_workers):
+                worker = threading.Thread(target=self._worker, name=f"{self.name}-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            self._started = True
+            print(f"[JobQueue] Started {self.num_workers} {self.name} workers (queue size: {self.max_queue_size})")
+
+    def submit(self, chat_id, target, *args, **kwargs):
+        """Queue a job. Returns False when the queue or the chat's quota is full."""
+        self.start()
+        # Jobs without a chat get a mailbox of their own and no ordering
+        key = chat_id if chat_id is not None else object()
+
+        with self._lock:
+            if self._pending >= self.max_queue_size:
+                self.rejected += 1
+                print(f"[JobQueue] {self.name} queue full ({self.max_queue_size}), rejecting job for chat {chat_id}")
+                return False
+
+            mailbox = self._mailboxes.get(key)
+            if mailbox is not None and len(mailbox) >= self.per_chat_limit:
+                self.rejected += 1
+                print(f"[JobQueue] Chat {chat_id} has {len(mailbox)} {self.name} jobs in progress, rejecting")
+                return False
+
+            if mailbox is None:
+                mailbox = self._mailboxes[key] = deque()
+                self._ready.put(key)
+            mailbox.append((target, args, kwargs))
+            self._pending += 1
+        return True
+
+    def _worker(self):
+        while True:
+            key = self._ready.get()
+            with self._lock:
+                target, args, kwargs = self._mailboxes[key][0]
+            try:
+                target(*args, **kwargs)
+                with self._lock:
+                    self.completed += 1
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                print(f"[JobQueue] Job {getattr(target, '__name__', target)} failed: {e}")
+            finally:
+                for hook in self.finish_hooks:
+                    try:
+                        hook()
+                    except Exception as e:
+                        print(f"[JobQueue] Finish hook failed: {e}")
+                self._finish(key)
+
+    def _finish(self, key):
+        with self._lock:
+            self._pending -= 1
+            mailbox = self._mailboxes[key]
+            # The running job stays at the head of its mailbox until it is done,
+            # which is what keeps a second worker away from the same chat
+            mailbox.popleft()
+            if mailbox:
+                self._ready.put(key)
+            else:
+                del self._mailboxes[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.num_workers,
+                'queued': self._pending,
+                'max_queue': self.max_queue_size,
+                'active_chats': len(self._mailboxes),
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected
+            }
+
+
+class LaneScheduler:
+    """One JobScheduler per lane, so each class of work has its own workers and quotas"""
+
+    def __init__(self, lanes=JOB_LANES):
+        self.lanes = {
+            name: JobScheduler(num_workers, max_queue_size, per_chat_limit, name=name)
+            for name, (num_workers, max_queue_size, per_chat_limit) in lanes.items()
+        }
+
+    def submit(self, lane, chat_id, target, *args, **kwargs):
+        return self.lanes[lane].submit(chat_id, target, *args, **kwargs)
+
+    def on_finish(self, hook):
+        for lane in self.lanes.values():
+            lane.finish_hooks.append(hook)
+
+    def stats(self):
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+
+scheduler = LaneScheduler()
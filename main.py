@@ -1,11 +1,12 @@
 import re
 import time
+import asyncio
 import threading
 import os
 import tempfile
 import subprocess
 from flask import Flask, request, jsonify, render_template, redirect, url_for, send_file, Response
-from config import BOT_TOKEN, OWNER_ID, PROGRESS_STATES
+from config import BOT_TOKEN, OWNER_ID, PROGRESS_STATES, EXECUTION_MODE, WEBHOOK_FAST_ACK
 from telegram_handlers import TelegramHandlers
 from tiktok_api import download_tiktok_video
 from helpers import format_tiktok_caption, html_bold, strip_html_tags
@@ -13,28 +14,53 @@ from youtube import download_and_send_songs, search_youtube, download_audio, get
 from songHistory import is_already_downloaded, add_to_history
 from facebook import is_facebook_profile_url, get_facebook_photos, download_photo_to_temp
 from universal_downloader import (
-    detect_platform, get_media_info, get_youtube_quality_options,
-    download_media, format_duration, format_views, is_supported_url
+    detect_platform, get_media_info, get_youtube_quality_options, MEDIA_INFO_CACHE, PROBE_CACHE,
+    download_media, format_duration, format_views, is_supported_url, canonical_media_id
 )
+from file_id_cache import file_id_cache
+from uploader import Uploader
+from user_registry import user_registry
 from pexels_downloader import process_korean_video, cleanup_files
 from ai_handler import AIBot, search_videos
+from router import Router
+from callback_codec import encode as encode_callback, new_id
+from job_queue import scheduler
+from job_journal import job_journal
+from update_dedup import update_deduplicator
+import state_backend
+import ytdlp_pool
+from rate_limiter import rate_limiter
+from metrics import webhook_ack_latency, update_processing_latency, telegram_api_latency, counters
+
+if EXECUTION_MODE == 'asyncio':
+    from async_runtime import runtime as async_runtime, download_media_async, upload_async
 
 app = Flask(__name__)
 
 handlers = TelegramHandlers(BOT_TOKEN, OWNER_ID)
+uploader = Uploader(handlers)
+# Chat actions last until the job that started them is done
+scheduler.on_finish(handlers.stop_action)
 
 user_inline_keyboard = [
     [{"text": "LK NEWS Download Bot", "callback_data": "ignore_branding"}]
 ]
 
-song_query_cache = {}
-download_cache = {}
-youtube_quality_cache = {}
-url_download_cache = {}
-ai_video_cache = {}
-owner_mode = 'owner'
+# Button state lives in the shared backend so any worker can serve any callback
+song_query_cache = state_backend.namespace('song_query')
+download_cache = state_backend.namespace('download')
+youtube_quality_cache = state_backend.namespace('youtube_quality')
+url_download_cache = state_backend.namespace('url_download')
+ai_video_cache = state_backend.namespace('ai_video')
+bot_settings = state_backend.namespace('settings')
+
+ai_bot = AIBot(handlers, ai_video_cache, state_backend.namespace('ai_pages'))
 
-ai_bot = AIBot(handlers, ai_video_cache)
+def get_owner_mode():
+    return bot_settings.get('owner_mode', 'owner')
+
+def set_owner_mode(mode):
+    bot_settings['owner_mode'] = mode
 
 URL_PATTERN = re.compile(
     r'https?://(?:[\w-]+\.)*(?:'
@@ -64,6 +90,46 @@ def extract_url_from_text(text):
     match = URL_PATTERN.search(text)
     return match.group(0) if match else None
 
+def submit_job(chat_id, target, *args, reply_to=None, lane='download'):
+    """Queue work on a scheduler lane, telling the user when we are at capacity"""
+    if scheduler.submit(lane, chat_id, target, *args):
+        return True
+    handlers.send_message(
+        chat_id,
+        html_bold('⏳ Too many requests in progress.') + '\n\nPlease wait for your current downloads to finish and try again.',
+        reply_to
+    )
+    return False
+
+def submit_journaled_job(kind, chat_id, *args, reply_to=None, lane='download'):
+    """Record a resumable job in the journal, then queue it. Args must be JSON-serializable."""
+    job = job_journal.create(kind, chat_id, lane, args)
+    if submit_job(chat_id, job_journal.run, job, reply_to=reply_to, lane=lane):
+        return True
+    job_journal.finish(job, 'rejected')
+    return False
+
+def resume_unfinished_jobs():
+    """Re-queue jobs left behind by a worker that died or was reloaded"""
+    for job in job_journal.claim_orphaned():
+        print(f"[Journal] Resuming {job.kind} job {job.id} for chat {job.chat_id} (stages done: {job.state.get('stages', [])})")
+        if EXECUTION_MODE == 'asyncio' and job.kind == 'universal_download':
+            submit_async_job(job)
+        elif not scheduler.submit(job.lane, job.chat_id, job_journal.run, job):
+            job_journal.finish(job, 'rejected')
+
+def callback_button(text, action, *args, format_id=None):
+    """Inline button, or None when its callback_data cannot fit. The format_id is left out when it does not fit."""
+    try:
+        return {"text": text, "callback_data": encode_callback(action, *args, optional=format_id)}
+    except ValueError as e:
+        print(f"[Bot] Skipping button {text}: {e}")
+        return None
+
+def cached_format_id(info, format_type, quality):
+    """The preview's format_id for a quality label, for buttons whose payload had no room for it"""
+    return info.get(f'{format_type}_formats', {}).get(quality, {}).get('format_id')
+
 def get_platform_emoji(platform):
     """Get emoji for platform"""
     emojis = {
@@ -101,7 +167,7 @@ def process_auto_url_download(url, handlers, chat_id, message_id, is_owner):
         )
         
         if platform == 'tiktok':
-            handlers.edit_message(chat_id, status_msg_id, html_bold('🎵 Downloading TikTok video...'))
+            handlers.edit_status(chat_id, status_msg_id, html_bold('🎵 Downloading TikTok video...'))
             video_data = download_tiktok_video(url)
             
             if video_data.get('success'):
@@ -117,9 +183,9 @@ def process_auto_url_download(url, handlers, chat_id, message_id, is_owner):
                     final_caption = format_tiktok_caption(video_data)
                     handlers.send_action(chat_id, 'upload_video')
                     
-                    cache_id = f"tkaudio_{chat_id}_{int(time.time() * 1000)}"
+                    cache_id = new_id()
                     keyboard = [
-                        [{"text": "🎵 Extract Audio", "callback_data": f"urldl_tkaudio_{cache_id}"}],
+                        [{"text": "🎵 Extract Audio", "callback_data": encode_callback('urldl_tkaudio', cache_id)}],
                         [{"text": "LK NEWS Download Bot", "callback_data": "ignore_branding"}]
                     ]
                     url_download_cache[cache_id] = {'url': url, 'video_url': video_url, 'caption': final_caption, 'timestamp': time.time()}
@@ -142,7 +208,7 @@ def process_auto_url_download(url, handlers, chat_id, message_id, is_owner):
             handlers.edit_message(chat_id, status_msg_id, html_bold('❌ Failed to fetch info: ') + info.get('error', 'Unknown error'))
             return
         
-        cache_id = f"urldl_{chat_id}_{int(time.time() * 1000)}"
+        cache_id = new_id()
         url_download_cache[cache_id] = {
             'url': url,
             'info': info,
@@ -165,14 +231,16 @@ def process_auto_url_download(url, handlers, chat_id, message_id, is_owner):
         if video_formats:
             video_row = []
             for quality, fmt in list(video_formats.items())[:2]:
-                video_row.append({"text": f"🎬 {quality}", "callback_data": f"urldl_video_{quality}_{cache_id}"})
+                button = callback_button(f"🎬 {quality}", 'urldl', 'video', quality, cache_id, format_id=fmt.get('format_id'))
+                if button:
+                    video_row.append(button)
             if video_row:
                 keyboard.append(video_row)
         
         if not keyboard:
-            keyboard.append([{"text": "🎬 Best Video", "callback_data": f"urldl_video_best_{cache_id}"}])
+            keyboard.append([{"text": "🎬 Best Video", "callback_data": encode_callback('urldl', 'video', 'best', cache_id)}])
         
-        keyboard.append([{"text": "🎵 Audio (MP3)", "callback_data": f"urldl_audio_best_{cache_id}"}])
+        keyboard.append([{"text": "🎵 Audio (MP3)", "callback_data": encode_callback('urldl', 'audio', 'best', cache_id)}])
         keyboard.append([{"text": "LK NEWS Download Bot", "callback_data": "ignore_branding"}])
         
         if info.get('thumbnail'):
@@ -213,7 +281,7 @@ def process_facebook_profile(url, handlers, chat_id, message_id, is_owner):
         photos_sent = 0
         
         if photos.get('profile_photo'):
-            handlers.edit_message(chat_id, status_msg_id, html_bold('📤 Sending profile photo...'))
+            handlers.edit_status(chat_id, status_msg_id, html_bold('📤 Sending profile photo...'))
             handlers.send_action(chat_id, 'upload_photo')
             
             temp_file = download_photo_to_temp(photos['profile_photo'], 'fb_profile')
@@ -234,7 +302,7 @@ def process_facebook_profile(url, handlers, chat_id, message_id, is_owner):
                 photos_sent += 1
         
         if photos.get('cover_photo'):
-            handlers.edit_message(chat_id, status_msg_id, html_bold('📤 Sending cover photo...'))
+            handlers.edit_status(chat_id, status_msg_id, html_bold('📤 Sending cover photo...'))
             handlers.send_action(chat_id, 'upload_photo')
             
             temp_file = download_photo_to_temp(photos['cover_photo'], 'fb_cover')
@@ -270,7 +338,6 @@ def process_facebook_profile(url, handlers, chat_id, message_id, is_owner):
         handlers.send_message(chat_id, html_bold('❌ Error processing Facebook profile: ') + str(e), message_id)
 
 def get_video_keyboard(video_url, video_caption, is_owner_user=False):
-    global owner_mode
     # Extract Audio button ONLY for owner
     if is_owner_user:
         return [
@@ -306,7 +373,7 @@ def download_and_send_single_song(query, handlers, chat_id, message_id, is_owner
             return
         
         # Get metadata
-        handlers.edit_message(chat_id, message_id, html_bold('🎵 Fetching song info...'))
+        handlers.edit_status(chat_id, message_id, html_bold('🎵 Fetching song info...'))
         metadata = get_video_metadata(video_url)
         
         if metadata and metadata.get('thumbnail'):
@@ -322,8 +389,19 @@ def download_and_send_single_song(query, handlers, chat_id, message_id, is_owner
             )
             handlers.send_photo_with_caption(chat_id, metadata['thumbnail'], info_caption, None)
         
+        media_key = f"Youtube:{video_id}" if video_id else None
+        if send_cached_file(handlers, chat_id, media_key, 'audio', 'mp3'):
+            title = metadata['title'] if metadata else 'Unknown Song'
+            add_to_history({
+                'title': title,
+                'url': video_url,
+                'video_id': video_id
+            })
+            handlers.edit_message(chat_id, message_id, html_bold('✅ Download Complete!') + f'\n\n🎵 {title}')
+            return
+        
         # Update status and download
-        handlers.edit_message(chat_id, message_id, html_bold('📥 Downloading audio...'))
+        handlers.edit_status(chat_id, message_id, html_bold('📥 Downloading audio...'))
         handlers.send_action(chat_id, 'upload_audio')
         
         # Download audio
@@ -335,7 +413,8 @@ def download_and_send_single_song(query, handlers, chat_id, message_id, is_owner
         if os.path.exists(downloaded_path):
             title = metadata['title'] if metadata else 'Unknown Song'
             handlers.send_action(chat_id, 'upload_audio')
-            handlers.send_audio_file(chat_id, downloaded_path, title, None)
+            send_result = uploader.send_audio(chat_id, downloaded_path, title, None)
+            file_id_cache.remember(media_key, 'audio', 'mp3', 'audio', send_result, {'title': title})
             
             # Add to history
             add_to_history({
@@ -358,7 +437,88 @@ def download_and_send_single_song(query, handlers, chat_id, message_id, is_owner
         print(f"[Bot] Single song download error: {e}")
         handlers.edit_message(chat_id, message_id, html_bold('❌ Error downloading song: ') + str(e))
 
-def process_universal_download(url, handlers, chat_id, message_id, is_owner, selected_format='video', quality='best'):
+def cached_file_plan(media_key, fmt, quality):
+    """How to re-send a previously uploaded file: (chat action, kind, file_id, caption), or None"""
+    cached = file_id_cache.get(media_key, fmt, quality)
+    if not cached:
+        return None
+    metadata = cached['metadata']
+    if cached['kind'] == 'audio':
+        return 'upload_audio', 'audio', cached['file_id'], metadata.get('title')
+    return 'upload_video', 'video', cached['file_id'], metadata.get('caption')
+
+def cached_file_sent(media_key, fmt, quality, send_result):
+    """Log a re-send from the file_id cache and drop a file_id Telegram rejected. True when it was sent."""
+    if send_result and send_result.get('ok'):
+        print(f"[FileIdCache] Sent {media_key} {fmt} {quality} from cache")
+        return True
+    print(f"[FileIdCache] Cached file_id rejected for {media_key}: {send_result.get('description') if send_result else 'No response'}")
+    file_id_cache.invalidate(media_key, fmt, quality)
+    return False
+
+def send_cached_file(handlers, chat_id, media_key, fmt, quality):
+    """Re-send a previously uploaded file by its file_id. True when it was sent."""
+    plan = cached_file_plan(media_key, fmt, quality)
+    if not plan:
+        return False
+    action, kind, file_id, caption = plan
+    handlers.send_action(chat_id, action)
+    send = handlers.send_audio if kind == 'audio' else handlers.send_video
+    return cached_file_sent(media_key, fmt, quality, send(chat_id, file_id, caption))
+
+def upload_progress(handlers, chat_id, message_id, label):
+    """Progress callback for send_*_file that keeps the status message at the current percentage"""
+    last = {'percent': -1}
+    def report(sent, total):
+        percent = sent * 100 // total if total else 100
+        if percent != last['percent']:
+            last['percent'] = percent
+            handlers.edit_status(chat_id, message_id, html_bold(f'📤 Uploading {label}... {percent}%') + f'\n\n{sent // 1024 // 1024}/{total // 1024 // 1024}MB')
+    return report
+
+def resumed_download(job):
+    """The download result of a resumed job whose file is still on disk, or None"""
+    if job and job.done('download') and os.path.exists(job.state.get('path', '')):
+        # Resumed after a restart: the file is already on disk
+        print(f"[Journal] Reusing downloaded file {job.state['path']}")
+        return {'success': True, 'path': job.state['path'], 'type': job.state.get('type')}
+    return None
+
+def downloaded_file(job, result):
+    """(path, None) for a usable download, journaled so a resumed job skips it, or (None, error text)"""
+    if not result.get('success'):
+        return None, html_bold('❌ Download failed: ') + result.get('error', 'Unknown error')
+    file_path = result.get('path')
+    if not file_path or not os.path.exists(file_path):
+        return None, html_bold('❌ Downloaded file not found')
+    if job and not job.done('download'):
+        job.complete('download', path=file_path, type=result.get('type'))
+    return file_path, None
+
+def upload_kind(result, platform_name):
+    """(kind, metadata) to upload a download result with"""
+    if result.get('type') == 'audio':
+        return 'audio', {'title': f"{platform_name} Audio"}
+    return 'video', {'caption': f"📥 Downloaded from {platform_name}"}
+
+def finish_upload(job, media_key, fmt, cache_quality, kind, metadata, send_result, file_path):
+    """Cache the file_id, close the journal's upload stage and delete the file. Returns the final status text."""
+    file_id_cache.remember(media_key, fmt, cache_quality, kind, send_result, metadata)
+    if job:
+        job.complete('upload')
+    
+    try:
+        os.unlink(file_path)
+    except:
+        pass
+    
+    if send_result and send_result.get('ok'):
+        return html_bold('✅ Download Complete!')
+    error_msg = send_result.get('description', 'Upload failed') if send_result else 'No response'
+    print(f"[Upload] Failed: {error_msg}")
+    return html_bold('❌ Upload failed: ') + error_msg
+
+def process_universal_download(url, handlers, chat_id, message_id, is_owner, selected_format='video', quality='best', format_id=None, job=None):
     """Process download from various platforms using universal downloader"""
     try:
         handlers.send_action(chat_id, 'typing')
@@ -366,48 +526,128 @@ def process_universal_download(url, handlers, chat_id, message_id, is_owner, sel
         platform = detect_platform(url)
         platform_name = platform.capitalize() if platform != 'unknown' else 'Media'
         
-        handlers.edit_message(chat_id, message_id, html_bold(f'📥 Downloading {platform_name} {selected_format}...'))
-        
-        result = download_media(url, selected_format, quality)
-        
-        if not result.get('success'):
-            handlers.edit_message(chat_id, message_id, html_bold('❌ Download failed: ') + result.get('error', 'Unknown error'))
+        media_key = canonical_media_id(url)
+        cache_quality = format_id or quality
+        if send_cached_file(handlers, chat_id, media_key, selected_format, cache_quality):
+            if job:
+                job.complete('upload')
+            handlers.edit_message(chat_id, message_id, html_bold('✅ Download Complete!'))
             return
         
-        file_path = result.get('path')
-        if not file_path or not os.path.exists(file_path):
-            handlers.edit_message(chat_id, message_id, html_bold('❌ Downloaded file not found'))
+        result = resumed_download(job)
+        if result is None:
+            handlers.edit_status(chat_id, message_id, html_bold(f'📥 Downloading {platform_name} {selected_format}...'))
+            result = download_media(url, selected_format, quality, format_id)
+        
+        file_path, error = downloaded_file(job, result)
+        if error:
+            handlers.edit_message(chat_id, message_id, error)
             return
         
         file_size = os.path.getsize(file_path)
         print(f"[Upload] Starting upload: {file_path} ({file_size} bytes)")
-        handlers.edit_message(chat_id, message_id, html_bold(f'📤 Uploading {selected_format}... ({file_size // 1024 // 1024}MB)'))
+        handlers.edit_status(chat_id, message_id, html_bold(f'📤 Uploading {selected_format}... ({file_size // 1024 // 1024}MB)'))
         
-        if result.get('type') == 'audio':
+        kind, metadata = upload_kind(result, platform_name)
+        progress = upload_progress(handlers, chat_id, message_id, selected_format)
+        if kind == 'audio':
             handlers.send_action(chat_id, 'upload_audio')
-            send_result = handlers.send_audio_file(chat_id, file_path, f"{platform_name} Audio", None)
+            send_result = uploader.send_audio(chat_id, file_path, metadata['title'], None, progress=progress)
         else:
             handlers.send_action(chat_id, 'upload_video')
-            send_result = handlers.send_video_file(chat_id, file_path, f"📥 Downloaded from {platform_name}", None)
+            send_result = uploader.send_video(chat_id, file_path, metadata['caption'], None, progress=progress)
         
         print(f"[Upload] Send result: {send_result}")
-        
-        try:
-            os.unlink(file_path)
-        except:
-            pass
-        
-        if send_result and send_result.get('ok'):
-            handlers.edit_message(chat_id, message_id, html_bold('✅ Download Complete!'))
-        else:
-            error_msg = send_result.get('description', 'Upload failed') if send_result else 'No response'
-            print(f"[Upload] Failed: {error_msg}")
-            handlers.edit_message(chat_id, message_id, html_bold('❌ Upload failed: ') + error_msg)
+        handlers.edit_message(chat_id, message_id, finish_upload(job, media_key, selected_format, cache_quality, kind, metadata, send_result, file_path))
         
     except Exception as e:
         print(f"[Universal Download] Error: {e}")
         handlers.edit_message(chat_id, message_id, html_bold('❌ Error: ') + str(e))
 
+async def send_cached_file_async(telegram, chat_id, media_key, fmt, quality):
+    """send_cached_file for the asyncio runtime"""
+    plan = await asyncio.to_thread(cached_file_plan, media_key, fmt, quality)
+    if not plan:
+        return False
+    action, kind, file_id, caption = plan
+    await telegram.send_action(chat_id, action)
+    send = telegram.send_audio if kind == 'audio' else telegram.send_video
+    send_result = await send(chat_id, file_id, caption)
+    return await asyncio.to_thread(cached_file_sent, media_key, fmt, quality, send_result)
+
+async def process_universal_download_async(url, chat_id, message_id, selected_format='video', quality='best', format_id=None, job=None):
+    """asyncio twin of process_universal_download, used when EXECUTION_MODE=asyncio.
+
+    The file_id cache and the journal are SQLite, so their helpers run via asyncio.to_thread.
+    """
+    telegram = async_runtime.telegram
+    try:
+        await telegram.send_action(chat_id, 'typing')
+        
+        platform = detect_platform(url)
+        platform_name = platform.capitalize() if platform != 'unknown' else 'Media'
+        
+        media_key = canonical_media_id(url)
+        cache_quality = format_id or quality
+        if await send_cached_file_async(telegram, chat_id, media_key, selected_format, cache_quality):
+            if job:
+                await asyncio.to_thread(job.complete, 'upload')
+            await telegram.edit_message(chat_id, message_id, html_bold('✅ Download Complete!'))
+            return
+        
+        result = resumed_download(job)
+        if result is None:
+            await telegram.edit_message(chat_id, message_id, html_bold(f'📥 Downloading {platform_name} {selected_format}...'))
+            result = await download_media_async(url, selected_format, quality, format_id)
+        
+        file_path, error = await asyncio.to_thread(downloaded_file, job, result)
+        if error:
+            await telegram.edit_message(chat_id, message_id, error)
+            return
+        
+        file_size = os.path.getsize(file_path)
+        print(f"[Async Upload] Starting upload: {file_path} ({file_size} bytes)")
+        await telegram.edit_message(chat_id, message_id, html_bold(f'📤 Uploading {selected_format}... ({file_size // 1024 // 1024}MB)'))
+        
+        kind, metadata = upload_kind(result, platform_name)
+        await telegram.send_action(chat_id, f'upload_{kind}')
+        send_result = await upload_async(uploader, telegram, kind, chat_id, file_path, metadata['title'] if kind == 'audio' else metadata['caption'])
+        
+        status = await asyncio.to_thread(finish_upload, job, media_key, selected_format, cache_quality, kind, metadata, send_result, file_path)
+        await telegram.edit_message(chat_id, message_id, status)
+        
+    except Exception as e:
+        print(f"[Async Universal Download] Error: {e}")
+        await telegram.edit_message(chat_id, message_id, html_bold('❌ Error: ') + str(e))
+
+async def run_universal_download_job_async(job):
+    url, chat_id, status_msg_id, is_owner, selected_format, quality = job.args[:6]
+    format_id = job.args[6] if len(job.args) > 6 else None
+    await process_universal_download_async(url, chat_id, status_msg_id, selected_format, quality, format_id, job=job)
+
+def submit_async_job(job):
+    """Run a journaled universal download on the asyncio runtime"""
+    if async_runtime.submit(job_journal.run_async, job, run_universal_download_job_async):
+        return True
+    job_journal.finish(job, 'rejected')
+    return False
+
+def submit_download(url, chat_id, status_msg_id, is_owner, selected_format, quality, format_id=None):
+    """Queue a universal download on the asyncio runtime or the thread pool, depending on EXECUTION_MODE"""
+    if EXECUTION_MODE == 'asyncio':
+        job = job_journal.create('universal_download', chat_id, 'download', [url, chat_id, status_msg_id, is_owner, selected_format, quality, format_id])
+        if submit_async_job(job):
+            return True
+        handlers.edit_message(chat_id, status_msg_id, html_bold('⏳ Too many downloads in progress.') + '\n\nPlease try again in a minute.')
+        return False
+    return submit_journaled_job('universal_download', chat_id, url, chat_id, status_msg_id, is_owner, selected_format, quality, format_id)
+
+@job_journal.register('universal_download')
+def run_universal_download_job(job):
+    url, chat_id, status_msg_id, is_owner, selected_format, quality = job.args[:6]
+    format_id = job.args[6] if len(job.args) > 6 else None
+    process_universal_download(url, handlers, chat_id, status_msg_id, is_owner, selected_format, quality, format_id, job=job)
+
 def process_youtube_user_mode(url, handlers, chat_id, message_id):
     """Show YouTube video thumbnail with quality selection for users"""
     try:
@@ -419,7 +659,7 @@ def process_youtube_user_mode(url, handlers, chat_id, message_id):
             handlers.edit_message(chat_id, message_id, html_bold('❌ Failed to fetch video info: ') + info.get('error', 'Unknown error'))
             return
         
-        cache_id = f"ytq_{chat_id}_{int(time.time() * 1000)}"
+        cache_id = new_id()
         youtube_quality_cache[cache_id] = {
             'url': url,
             'title': info.get('title'),
@@ -436,11 +676,11 @@ def process_youtube_user_mode(url, handlers, chat_id, message_id):
         
         keyboard = [
             [
-                {"text": "🎬 Best Video", "callback_data": f"ytdl_video_best_{cache_id}"},
-                {"text": "🎬 720p Video", "callback_data": f"ytdl_video_720_{cache_id}"}
+                {"text": "🎬 Best Video", "callback_data": encode_callback('ytdl', 'video', 'best', cache_id)},
+                {"text": "🎬 720p Video", "callback_data": encode_callback('ytdl', 'video', '720', cache_id)}
             ],
             [
-                {"text": "🎵 Audio (MP3)", "callback_data": f"ytdl_audio_best_{cache_id}"}
+                {"text": "🎵 Audio (MP3)", "callback_data": encode_callback('ytdl', 'audio', 'best', cache_id)}
             ]
         ]
         
@@ -487,7 +727,7 @@ def extract_tiktok_audio(video_url, chat_id, caption, handlers):
                 
                 # Send as audio file
                 audio_keyboard = [[{"text": "LK NEWS Download Bot", "callback_data": "ignore_branding"}]]
-                handlers.send_audio_file(chat_id, path, "TikTok Audio", None, audio_keyboard)
+                uploader.send_audio(chat_id, path, "TikTok Audio", None, audio_keyboard)
                 
                 # Clean up
                 try:
@@ -597,93 +837,85 @@ def hacker_download():
         print(f"[Hacker Download] Error: {e}")
         return render_template('hacker.html', error=f'Download error: {str(e)}')
 
-@app.route('/', methods=['POST'])
-def webhook():
-    global owner_mode, song_query_cache
+router = Router()
+
+def owner_callback(handler):
+    """Reject callbacks from anyone but the owner before running handler"""
+    def wrapper(ctx, args):
+        if OWNER_ID and str(ctx['chat_id']) != str(OWNER_ID):
+            handlers.answer_callback_query(ctx['callback_query']['id'], "❌ You cannot use this command.")
+            return
+        return handler(ctx, args)
+    return wrapper
+
+def handle_broadcast_reply(ctx):
+    """Owner replied to the broadcast prompt. Returns True when the message was consumed."""
+    message, chat_id, message_id = ctx['message'], ctx['chat_id'], ctx['message_id']
+    replied_message = message['reply_to_message']
+    replied_text = replied_message.get('text', '')
+    
+    if "Please reply with the message you want to broadcast:" not in replied_text:
+        return False
+    
+    message_to_broadcast_id = message_id
+    prompt_message_id = replied_message['message_id']
+    
+    handlers.edit_message(chat_id, prompt_message_id, html_bold("📣 Broadcast started. Please wait."))
+    submit_journaled_job('broadcast', chat_id, chat_id, message_to_broadcast_id, prompt_message_id, 'Broadcast', reply_to=message_id, lane='broadcast')
+    return True
+
+@router.command('/brod')
+def cmd_brod(ctx, args):
+    message = ctx['message']
+    chat_id, message_id, is_owner = ctx['chat_id'], ctx['message_id'], ctx['is_owner']
+    if not is_owner or not message.get('reply_to_message'):
+        return False
+    
+    message_to_broadcast_id = message['reply_to_message']['message_id']
     
+    status_message_id = handlers.send_message(chat_id, html_bold("📣 Quick Broadcast started..."), message_id)
+    submit_journaled_job('broadcast', chat_id, chat_id, message_to_broadcast_id, status_message_id, 'Quick Broadcast', reply_to=message_id, lane='broadcast')
+
+@job_journal.register('broadcast')
+def run_broadcast_job(job):
+    chat_id, message_to_broadcast_id, status_message_id, label = job.args
     try:
-        update = request.get_json()
-        print(f"[Bot] Received update: {str(update)[:300]}")
-        
-        message = update.get('message')
-        callback_query = update.get('callback_query')
-        
-        if not message and not callback_query:
-            print("[Bot] No message or callback query found")
-            return jsonify({"ok": True})
-        
-        if message:
-            chat_id = message['chat']['id']
-            message_id = message['message_id']
-            text = message.get('text', '').strip() if message.get('text') else None
-            is_owner = bool(OWNER_ID and str(chat_id) == str(OWNER_ID))
-            user_name = message.get('from', {}).get('first_name', 'User')
-            
-            threading.Thread(target=handlers.save_user_id, args=(chat_id,)).start()
-            
-            if is_owner and message.get('reply_to_message'):
-                replied_message = message['reply_to_message']
-                replied_text = replied_message.get('text', '')
-                
-                if "Please reply with the message you want to broadcast:" in replied_text:
-                    message_to_broadcast_id = message_id
-                    prompt_message_id = replied_message['message_id']
-                    
-                    handlers.edit_message(chat_id, prompt_message_id, html_bold("📣 Broadcast started. Please wait."))
-                    
-                    def do_broadcast():
-                        try:
-                            results = handlers.broadcast_message(chat_id, message_to_broadcast_id)
-                            result_message = (
-                                html_bold('Broadcast Complete ✅') + '\n\n' +
-                                html_bold('🚀 Successful: ') + str(results['successful_sends']) + '\n' +
-                                html_bold('❗️ Failed/Blocked: ') + str(results['failed_sends'])
-                            )
-                            handlers.send_message(chat_id, result_message, message_to_broadcast_id)
-                        except Exception as e:
-                            handlers.send_message(chat_id, html_bold("❌ Broadcast Process Failed.") + f"\n\nError: {e}", message_to_broadcast_id)
-                    
-                    threading.Thread(target=do_broadcast).start()
-                    return jsonify({"ok": True})
-            
-            if is_owner and text and text.lower().startswith('/brod') and message.get('reply_to_message'):
-                message_to_broadcast_id = message['reply_to_message']['message_id']
-                
-                handlers.send_message(chat_id, html_bold("📣 Quick Broadcast started..."), message_id)
-                
-                def do_quick_broadcast():
-                    try:
-                        results = handlers.broadcast_message(chat_id, message_to_broadcast_id)
-                        result_message = (
-                            html_bold('Quick Broadcast Complete ✅') + '\n\n' +
-                            html_bold('🚀 Successful: ') + str(results['successful_sends']) + '\n' +
-                            html_bold('❗️ Failed/Blocked: ') + str(results['failed_sends'])
-                        )
-                        handlers.send_message(chat_id, result_message, message_to_broadcast_id)
-                    except Exception as e:
-                        handlers.send_message(chat_id, html_bold("❌ Quick Broadcast failed.") + f"\n\nError: {e}", message_id)
-                
-                threading.Thread(target=do_quick_broadcast).start()
-                return jsonify({"ok": True})
-            
-            # /start command
-            if text and text.lower().startswith('/start'):
-                if is_owner:
-                    # Owner always sees mode selection buttons
-                    mode_text = '👑 Owner Mode' if owner_mode == 'owner' else '👤 User Mode'
-                    owner_text = html_bold("👑 Welcome Back, Admin!") + "\n\nThis is your Admin Control Panel.\n\n" + html_bold(f"Current Mode: {mode_text}")
-                    admin_keyboard = [
-                        [
-                            {"text": "✅ Owner Mode" if owner_mode == 'owner' else "👑 Owner Mode", "callback_data": "set_mode_owner"},
-                            {"text": "✅ User Mode" if owner_mode == 'user' else "👤 User Mode", "callback_data": "set_mode_user"}
-                        ],
-                        [{"text": "📊 Users Count", "callback_data": "admin_users_count"}],
-                        [{"text": "📣 Broadcast", "callback_data": "admin_broadcast"}],
-                        [{"text": "LK NEWS Download Bot", "callback_data": "ignore_branding"}]
-                    ]
-                    handlers.send_message(chat_id, owner_text, message_id, admin_keyboard)
-                else:
-                    user_text = f"""👋 <b>Hello {user_name}!</b>
+        results = handlers.broadcast_message(chat_id, message_to_broadcast_id, job, status_message_id)
+        result_message = (
+            html_bold(f'{label} Complete ✅') + '\n\n' +
+            html_bold('🚀 Successful: ') + str(results['successful_sends']) + '\n' +
+            html_bold('❗️ Failed/Blocked: ') + str(results['failed_sends']) + '\n' +
+            html_bold('🧹 Pruned: ') + str(results['pruned'])
+        )
+        if status_message_id:
+            handlers.edit_message(chat_id, status_message_id, html_bold(f'📣 {label} finished.'))
+        handlers.send_message(chat_id, result_message, message_to_broadcast_id)
+    except Exception as e:
+        handlers.send_message(chat_id, html_bold(f"❌ {label} failed.") + f"\n\nError: {e}", message_to_broadcast_id)
+        raise
+
+@router.command('/start')
+def cmd_start(ctx, args):
+    chat_id, message_id, is_owner = ctx['chat_id'], ctx['message_id'], ctx['is_owner']
+    user_name = ctx['user_name']
+    
+    if is_owner:
+        # Owner always sees mode selection buttons
+        owner_mode = get_owner_mode()
+        mode_text = '👑 Owner Mode' if owner_mode == 'owner' else '👤 User Mode'
+        owner_text = html_bold("👑 Welcome Back, Admin!") + "\n\nThis is your Admin Control Panel.\n\n" + html_bold(f"Current Mode: {mode_text}")
+        admin_keyboard = [
+            [
+                {"text": "✅ Owner Mode" if owner_mode == 'owner' else "👑 Owner Mode", "callback_data": "set_mode_owner"},
+                {"text": "✅ User Mode" if owner_mode == 'user' else "👤 User Mode", "callback_data": "set_mode_user"}
+            ],
+            [{"text": "📊 Users Count", "callback_data": "admin_users_count"}],
+            [{"text": "📣 Broadcast", "callback_data": "admin_broadcast"}],
+            [{"text": "LK NEWS Download Bot", "callback_data": "ignore_branding"}]
+        ]
+        handlers.send_message(chat_id, owner_text, message_id, admin_keyboard)
+    else:
+        user_text = f"""👋 <b>Hello {user_name}!</b>
 
 🎬 Welcome to <b>LK NEWS Download Bot</b>!
 
@@ -703,349 +935,354 @@ The bot automatically detects and downloads from:
 🚀 <b>Universal Media Downloader</b>
 🔥 <b>Powered by Replit</b>
 ◇───────────────◇"""
-                    handlers.send_message(chat_id, user_text, message_id, user_inline_keyboard)
-                return jsonify({"ok": True})
+        handlers.send_message(chat_id, user_text, message_id, user_inline_keyboard)
+
+@router.command('/song')
+def cmd_song(ctx, args):
+    chat_id, message_id, is_owner = ctx['chat_id'], ctx['message_id'], ctx['is_owner']
+    query = args
+    
+    if not query:
+        handlers.send_message(
+            chat_id,
+            html_bold('🎵 YouTube Song Downloader') + '\n\n' +
+            'Usage: <code>/song [name or url]</code>\n\n' +
+            'Examples:\n' +
+            '• <code>/song new sinhala dj song</code>\n' +
+            '• <code>/song alan walker faded</code>\n' +
+            '• <code>/song https://youtube.com/watch?v=xxx</code>',
+            message_id
+        )
+        return
+    
+    # Check if owner is in Owner Mode - show song count selection
+    if is_owner and get_owner_mode() == 'owner':
+        query_id = new_id()
+        song_query_cache[query_id] = {"query": query, "chat_id": chat_id, "timestamp": time.time()}
+        
+        song_count_keyboard = [
+            [
+                {"text": "1 Song", "callback_data": encode_callback('songcount', 1, query_id)},
+                {"text": "5 Songs", "callback_data": encode_callback('songcount', 5, query_id)}
+            ],
+            [
+                {"text": "15 Songs", "callback_data": encode_callback('songcount', 15, query_id)},
+                {"text": "50 Songs", "callback_data": encode_callback('songcount', 50, query_id)}
+            ]
+        ]
+        
+        handlers.send_message(
+            chat_id,
+            html_bold('🎵 YouTube Song Downloader') + '\n\n' +
+            f'🔍 Query: <i>{query}</i>\n\n' +
+            html_bold('How many songs do you want to download?'),
+            message_id,
+            song_count_keyboard
+        )
+    else:
+        # User mode or regular users: Direct download with thumbnail
+        status_msg_id = handlers.send_message(
+            chat_id,
+            html_bold('🎵 Searching for song...') + f'\n\n🔍 Query: <i>{query}</i>',
+            message_id
+        )
+        
+        def do_single_download():
+            download_and_send_single_song(query, handlers, chat_id, status_msg_id, is_owner)
+        
+        submit_job(chat_id, do_single_download, reply_to=message_id)
+    
+
+# /korean command - Download Korean videos from Pexels with viral music
+@router.command('/korean')
+def cmd_korean(ctx, args):
+    chat_id, message_id, is_owner = ctx['chat_id'], ctx['message_id'], ctx['is_owner']
+    
+    if not is_owner:
+        handlers.send_message(chat_id, html_bold('❌ This command is only available for the owner.'), message_id)
+        return
+    
+    status_msg_id = handlers.send_message(
+        chat_id,
+        html_bold('🇰🇷 Korean Video Generator') + '\n\n' +
+        '📥 Fetching random Korean video...\n' +
+        '🎵 Adding viral music...\n' +
+        '⏳ Please wait...',
+        message_id
+    )
+    
+    def process_korean():
+        try:
+            handlers.send_action(chat_id, 'upload_video')
             
-            # /song command
-            if text and text.lower().startswith('/song'):
-                query = re.sub(r'^/song\s*', '', text, flags=re.IGNORECASE).strip()
-                
-                if not query:
-                    handlers.send_message(
-                        chat_id,
-                        html_bold('🎵 YouTube Song Downloader') + '\n\n' +
-                        'Usage: <code>/song [name or url]</code>\n\n' +
-                        'Examples:\n' +
-                        '• <code>/song new sinhala dj song</code>\n' +
-                        '• <code>/song alan walker faded</code>\n' +
-                        '• <code>/song https://youtube.com/watch?v=xxx</code>',
-                        message_id
-                    )
-                    return jsonify({"ok": True})
-                
-                # Check if owner is in Owner Mode - show song count selection
-                if is_owner and owner_mode == 'owner':
-                    query_id = f"song_{chat_id}_{int(time.time() * 1000)}"
-                    song_query_cache[query_id] = {"query": query, "chat_id": chat_id, "timestamp": time.time()}
-                    
-                    song_count_keyboard = [
-                        [
-                            {"text": "1 Song", "callback_data": f"songcount_1_{query_id}"},
-                            {"text": "5 Songs", "callback_data": f"songcount_5_{query_id}"}
-                        ],
-                        [
-                            {"text": "15 Songs", "callback_data": f"songcount_15_{query_id}"},
-                            {"text": "50 Songs", "callback_data": f"songcount_50_{query_id}"}
-                        ]
-                    ]
-                    
-                    handlers.send_message(
-                        chat_id,
-                        html_bold('🎵 YouTube Song Downloader') + '\n\n' +
-                        f'🔍 Query: <i>{query}</i>\n\n' +
-                        html_bold('How many songs do you want to download?'),
-                        message_id,
-                        song_count_keyboard
-                    )
-                else:
-                    # User mode or regular users: Direct download with thumbnail
-                    status_msg_id = handlers.send_message(
-                        chat_id,
-                        html_bold('🎵 Searching for song...') + f'\n\n🔍 Query: <i>{query}</i>',
-                        message_id
-                    )
-                    
-                    def do_single_download():
-                        download_and_send_single_song(query, handlers, chat_id, status_msg_id, is_owner)
-                    
-                    threading.Thread(target=do_single_download).start()
-                
-                return jsonify({"ok": True})
+            result = process_korean_video()
             
-            # /korean command - Download Korean videos from Pexels with viral music
-            if text and text.lower().startswith('/korean'):
-                if not is_owner:
-                    handlers.send_message(chat_id, html_bold('❌ This command is only available for the owner.'), message_id)
-                    return jsonify({"ok": True})
-                
-                status_msg_id = handlers.send_message(
-                    chat_id,
-                    html_bold('🇰🇷 Korean Video Generator') + '\n\n' +
-                    '📥 Fetching random Korean video...\n' +
-                    '🎵 Adding viral music...\n' +
-                    '⏳ Please wait...',
-                    message_id
+            if not result.get('success'):
+                handlers.edit_message(
+                    chat_id, status_msg_id,
+                    html_bold('❌ Failed to get video') + f"\n\n{result.get('error', 'Unknown error')}"
                 )
-                
-                def process_korean():
-                    try:
-                        handlers.send_action(chat_id, 'upload_video')
-                        
-                        result = process_korean_video()
-                        
-                        if not result.get('success'):
-                            handlers.edit_message(
-                                chat_id, status_msg_id,
-                                html_bold('❌ Failed to get video') + f"\n\n{result.get('error', 'Unknown error')}"
-                            )
-                            return
-                        
-                        video_path = result.get('video_path')
-                        caption = result.get('caption')
-                        cleanup_paths = result.get('cleanup_paths', [])
-                        
-                        handlers.edit_message(chat_id, status_msg_id, html_bold('📤 Uploading video...'))
-                        handlers.send_action(chat_id, 'upload_video')
-                        
-                        keyboard = [[{"text": "LK NEWS Download Bot", "callback_data": "ignore_branding"}]]
-                        send_result = handlers.send_video_file(chat_id, video_path, caption, message_id, keyboard)
-                        
-                        cleanup_files(cleanup_paths)
-                        
-                        if send_result and send_result.get('ok'):
-                            handlers.edit_message(
-                                chat_id, status_msg_id,
-                                html_bold('✅ Korean Video Sent!') + '\n\n' +
-                                f"📹 Video ID: {result.get('video_id')}\n" +
-                                f"📸 By: {result.get('photographer')}"
-                            )
-                        else:
-                            error_msg = send_result.get('description', 'Upload failed') if send_result else 'No response'
-                            handlers.edit_message(
-                                chat_id, status_msg_id,
-                                html_bold('❌ Upload failed') + f"\n\n{error_msg}"
-                            )
-                        
-                    except Exception as e:
-                        print(f"[Korean] Error: {e}")
-                        handlers.edit_message(
-                            chat_id, status_msg_id,
-                            html_bold('❌ Error processing video') + f"\n\n{str(e)}"
-                        )
-                
-                threading.Thread(target=process_korean).start()
-                return jsonify({"ok": True})
+                return
             
-            # /tiktok command
-            if text and text.lower().startswith('/tiktok'):
-                tiktok_url = re.sub(r'^/tiktok\s*', '', text, flags=re.IGNORECASE).strip()
-                
-                if not tiktok_url:
-                    handlers.send_message(
-                        chat_id,
-                        html_bold('🎥 TikTok Video Downloader') + '\n\n' +
-                        'Usage: <code>/tiktok [url]</code>\n\n' +
-                        'Example:\n' +
-                        '• <code>/tiktok https://vm.tiktok.com/xxx</code>\n' +
-                        '• <code>/tiktok https://www.tiktok.com/@user/video/123</code>',
-                        message_id
-                    )
-                    return jsonify({"ok": True})
-                
-                is_tiktok_link = bool(re.match(r'^https?://(www\.)?(tiktok\.com|vm\.tiktok\.com|vt\.tiktok\.com)', tiktok_url, re.IGNORECASE))
-                
-                if not is_tiktok_link:
-                    handlers.send_message(chat_id, html_bold('❌ Please provide a valid TikTok URL.'), message_id)
-                    return jsonify({"ok": True})
-                
-                threading.Thread(target=handlers.send_action, args=(chat_id, 'typing')).start()
-                
-                initial_text = html_bold('⏳ Fetching TikTok video... Please wait.')
-                progress_message_id = handlers.send_message(chat_id, initial_text, message_id, get_initial_progress_keyboard())
-                
-                def process_tiktok():
-                    if progress_message_id:
-                        threading.Thread(target=handlers.simulate_progress, args=(chat_id, progress_message_id, message_id)).start()
-                    
-                    try:
-                        video_data = download_tiktok_video(tiktok_url)
-                        
-                        if not video_data.get('success'):
-                            handlers.progress_active = False
-                            error_text = html_bold('❌ Failed to fetch video.') + f"\n\n{video_data.get('error', 'The video might be private or unavailable.')}"
-                            if progress_message_id:
-                                handlers.edit_message(chat_id, progress_message_id, error_text)
-                            else:
-                                handlers.send_message(chat_id, error_text, message_id)
-                            return
-                        
-                        if video_data.get('type') == 'image' and video_data.get('images'):
-                            handlers.progress_active = False
-                            if progress_message_id:
-                                handlers.delete_message(chat_id, progress_message_id)
-                            
-                            caption = format_tiktok_caption(video_data)
-                            handlers.send_photos(chat_id, video_data['images'], caption, message_id, user_inline_keyboard)
-                            return
-                        
-                        final_caption = format_tiktok_caption(video_data)
-                        video_url = video_data.get('video_url')
-                        
-                        if video_url:
-                            handlers.progress_active = False
-                            
-                            if progress_message_id:
-                                handlers.delete_message(chat_id, progress_message_id)
-                            
-                            threading.Thread(target=handlers.send_action, args=(chat_id, 'upload_video')).start()
-                            
-                            try:
-                                # Extract Audio button ONLY for owner
-                                video_keyboard = get_video_keyboard(video_url, final_caption, is_owner)
-                                button_id = video_keyboard[0][0]['callback_data']
-                                if button_id.startswith('extract_audio_'):
-                                    handlers.cache_video_for_audio(chat_id, button_id, video_url, final_caption)
-                                
-                                if video_data.get('video_hd') and video_data.get('video_sd'):
-                                    handlers.send_video_with_quality_fallback(
-                                        chat_id, video_data['video_hd'], video_data['video_sd'],
-                                        final_caption, message_id, video_data.get('thumbnail'), video_keyboard
-                                    )
-                                else:
-                                    handlers.send_video(chat_id, video_url, final_caption, message_id, video_data.get('thumbnail'), video_keyboard)
-                            except Exception as e:
-                                print(f"[Bot] sendVideo failed: {e}")
-                                print("[Bot] Sending direct download link instead...")
-                                handlers.send_link_message(chat_id, video_url, final_caption, message_id)
-                        else:
-                            handlers.progress_active = False
-                            error_text = html_bold('⚠️ Could not get the video download link.') + '\n\nThe video might be private or the format is not supported.'
-                            if progress_message_id:
-                                handlers.edit_message(chat_id, progress_message_id, error_text)
-                            else:
-                                handlers.send_message(chat_id, error_text, message_id)
-                    except Exception as e:
-                        handlers.progress_active = False
-                        print(f"[Bot] Error: {e}")
-                        error_text = html_bold('❌ An error occurred while processing the video.')
-                        if progress_message_id:
-                            handlers.edit_message(chat_id, progress_message_id, error_text)
-                        else:
-                            handlers.send_message(chat_id, error_text, message_id)
-                
-                threading.Thread(target=process_tiktok).start()
-                return jsonify({"ok": True})
+            video_path = result.get('video_path')
+            caption = result.get('caption')
+            cleanup_paths = result.get('cleanup_paths', [])
             
-            # Facebook profile photo download - OWNER ONLY
-            if text and is_owner and is_facebook_profile_url(text):
-                threading.Thread(target=process_facebook_profile, args=(text, handlers, chat_id, message_id, is_owner)).start()
-                return jsonify({"ok": True})
+            handlers.edit_status(chat_id, status_msg_id, html_bold('📤 Uploading video...'))
+            handlers.send_action(chat_id, 'upload_video')
             
-            # /dl command - Owner mode multi-platform downloader
-            if text and text.lower().startswith('/dl'):
-                if not is_owner or owner_mode != 'owner':
-                    handlers.send_message(chat_id, html_bold('❌ This command is only available for the owner in Owner Mode.'), message_id)
-                    return jsonify({"ok": True})
-                
-                dl_url = re.sub(r'^/dl\s*', '', text, flags=re.IGNORECASE).strip()
-                
-                if not dl_url:
-                    handlers.send_message(
-                        chat_id,
-                        html_bold('📥 Universal Downloader') + '\n\n' +
-                        'Usage: <code>/dl [url]</code>\n\n' +
-                        '<b>Supported platforms:</b>\n' +
-                        '• YouTube, Instagram, Twitter/X\n' +
-                        '• TikTok, Facebook, Vimeo\n' +
-                        '• Reddit, Twitch, SoundCloud\n' +
-                        '• And many more...\n\n' +
-                        'Example:\n' +
-                        '• <code>/dl https://youtube.com/watch?v=xxx</code>\n' +
-                        '• <code>/dl https://instagram.com/p/xxx</code>',
-                        message_id
-                    )
-                    return jsonify({"ok": True})
+            keyboard = [[{"text": "LK NEWS Download Bot", "callback_data": "ignore_branding"}]]
+            send_result = uploader.send_video(chat_id, video_path, caption, message_id, keyboard,
+                                              progress=upload_progress(handlers, chat_id, status_msg_id, 'video'))
+            
+            cleanup_files(cleanup_paths)
+            
+            if send_result and send_result.get('ok'):
+                handlers.edit_message(
+                    chat_id, status_msg_id,
+                    html_bold('✅ Korean Video Sent!') + '\n\n' +
+                    f"📹 Video ID: {result.get('video_id')}\n" +
+                    f"📸 By: {result.get('photographer')}"
+                )
+            else:
+                error_msg = send_result.get('description', 'Upload failed') if send_result else 'No response'
+                handlers.edit_message(
+                    chat_id, status_msg_id,
+                    html_bold('❌ Upload failed') + f"\n\n{error_msg}"
+                )
+            
+        except Exception as e:
+            print(f"[Korean] Error: {e}")
+            handlers.edit_message(
+                chat_id, status_msg_id,
+                html_bold('❌ Error processing video') + f"\n\n{str(e)}"
+            )
+    
+    submit_job(chat_id, process_korean, reply_to=message_id)
+
+@router.command('/tiktok')
+def cmd_tiktok(ctx, args):
+    chat_id, message_id, is_owner = ctx['chat_id'], ctx['message_id'], ctx['is_owner']
+    tiktok_url = args
+    
+    if not tiktok_url:
+        handlers.send_message(
+            chat_id,
+            html_bold('🎥 TikTok Video Downloader') + '\n\n' +
+            'Usage: <code>/tiktok [url]</code>\n\n' +
+            'Example:\n' +
+            '• <code>/tiktok https://vm.tiktok.com/xxx</code>\n' +
+            '• <code>/tiktok https://www.tiktok.com/@user/video/123</code>',
+            message_id
+        )
+        return
+    
+    is_tiktok_link = bool(re.match(r'^https?://(www\.)?(tiktok\.com|vm\.tiktok\.com|vt\.tiktok\.com)', tiktok_url, re.IGNORECASE))
+    
+    if not is_tiktok_link:
+        handlers.send_message(chat_id, html_bold('❌ Please provide a valid TikTok URL.'), message_id)
+        return
+    
+    handlers.send_action(chat_id, 'typing')
+    
+    initial_text = html_bold('⏳ Fetching TikTok video... Please wait.')
+    progress_message_id = handlers.send_message(chat_id, initial_text, message_id, get_initial_progress_keyboard())
+    
+    def process_tiktok():
+        if progress_message_id:
+            handlers.simulate_progress(chat_id, progress_message_id, message_id)
+        
+        try:
+            video_data = download_tiktok_video(tiktok_url)
+            
+            if not video_data.get('success'):
+                error_text = html_bold('❌ Failed to fetch video.') + f"\n\n{video_data.get('error', 'The video might be private or unavailable.')}"
+                if progress_message_id:
+                    handlers.edit_message(chat_id, progress_message_id, error_text)
+                else:
+                    handlers.send_message(chat_id, error_text, message_id)
+                return
+            
+            if video_data.get('type') == 'image' and video_data.get('images'):
+                if progress_message_id:
+                    handlers.delete_message(chat_id, progress_message_id)
                 
-                if not is_supported_url(dl_url):
-                    handlers.send_message(chat_id, html_bold('❌ Unsupported URL or platform.'), message_id)
-                    return jsonify({"ok": True})
+                caption = format_tiktok_caption(video_data)
+                handlers.send_photos(chat_id, video_data['images'], caption, message_id, user_inline_keyboard)
+                return
+            
+            final_caption = format_tiktok_caption(video_data)
+            video_url = video_data.get('video_url')
+            
+            if video_url:
+                if progress_message_id:
+                    handlers.delete_message(chat_id, progress_message_id)
                 
-                status_msg_id = handlers.send_message(
-                    chat_id,
-                    html_bold('📥 Fetching media info...') + '\n\n⏳ Please wait...',
-                    message_id
-                )
+                handlers.send_action(chat_id, 'upload_video')
                 
-                def do_owner_download():
-                    try:
-                        info = get_media_info(dl_url)
-                        
-                        if not info.get('success'):
-                            handlers.edit_message(chat_id, status_msg_id, html_bold('❌ Failed to fetch info: ') + info.get('error', 'Unknown error'))
-                            return
-                        
-                        cache_id = f"dl_{chat_id}_{int(time.time() * 1000)}"
-                        download_cache[cache_id] = {
-                            'url': dl_url,
-                            'info': info,
-                            'chat_id': chat_id,
-                            'timestamp': time.time()
-                        }
-                        
-                        platform = info.get('platform', 'unknown').capitalize()
-                        caption = (
-                            f"📥 <b>{platform} Downloader</b>\n\n"
-                            f"🎬 <b>{info.get('title', 'Unknown')}</b>\n"
-                            f"⏱ <b>Duration:</b> {format_duration(info.get('duration'))}\n"
-                            f"👁 <b>Views:</b> {format_views(info.get('view_count'))}\n"
-                            f"📺 <b>Uploader:</b> {info.get('uploader', 'Unknown')}\n\n"
-                            f"<b>Select quality:</b>"
+                try:
+                    # Extract Audio button ONLY for owner
+                    video_keyboard = get_video_keyboard(video_url, final_caption, is_owner)
+                    button_id = video_keyboard[0][0]['callback_data']
+                    if button_id.startswith('extract_audio_'):
+                        handlers.cache_video_for_audio(chat_id, button_id, video_url, final_caption)
+                    
+                    if video_data.get('video_hd') and video_data.get('video_sd'):
+                        handlers.send_video_with_quality_fallback(
+                            chat_id, video_data['video_hd'], video_data['video_sd'],
+                            final_caption, message_id, video_data.get('thumbnail'), video_keyboard
                         )
-                        
-                        keyboard = []
-                        
-                        video_formats = info.get('video_formats', {})
-                        if video_formats:
-                            video_row = []
-                            for quality, fmt in list(video_formats.items())[:3]:
-                                video_row.append({"text": f"🎬 {quality}", "callback_data": f"owndl_video_{quality}_{cache_id}"})
-                            if video_row:
-                                keyboard.append(video_row)
-                        
-                        audio_formats = info.get('audio_formats', {})
-                        if audio_formats:
-                            audio_row = []
-                            for quality, fmt in list(audio_formats.items())[:2]:
-                                audio_row.append({"text": f"🎵 {quality}", "callback_data": f"owndl_audio_{quality}_{cache_id}"})
-                            if audio_row:
-                                keyboard.append(audio_row)
-                        
-                        if not keyboard:
-                            keyboard.append([{"text": "🎬 Best Video", "callback_data": f"owndl_video_best_{cache_id}"}])
-                            keyboard.append([{"text": "🎵 Audio", "callback_data": f"owndl_audio_best_{cache_id}"}])
-                        
-                        if info.get('thumbnail'):
-                            handlers.delete_message(chat_id, status_msg_id)
-                            handlers.send_photo_with_caption(chat_id, info['thumbnail'], caption, message_id, keyboard)
-                        else:
-                            handlers.edit_message(chat_id, status_msg_id, caption, keyboard)
-                        
-                    except Exception as e:
-                        print(f"[Owner Download] Error: {e}")
-                        handlers.edit_message(chat_id, status_msg_id, html_bold('❌ Error: ') + str(e))
-                
-                threading.Thread(target=do_owner_download).start()
-                return jsonify({"ok": True})
+                    else:
+                        handlers.send_video(chat_id, video_url, final_caption, message_id, video_data.get('thumbnail'), video_keyboard)
+                except Exception as e:
+                    print(f"[Bot] sendVideo failed: {e}")
+                    print("[Bot] Sending direct download link instead...")
+                    handlers.send_link_message(chat_id, video_url, final_caption, message_id)
+            else:
+                error_text = html_bold('⚠️ Could not get the video download link.') + '\n\nThe video might be private or the format is not supported.'
+                if progress_message_id:
+                    handlers.edit_message(chat_id, progress_message_id, error_text)
+                else:
+                    handlers.send_message(chat_id, error_text, message_id)
+        except Exception as e:
+            print(f"[Bot] Error: {e}")
+            error_text = html_bold('❌ An error occurred while processing the video.')
+            if progress_message_id:
+                handlers.edit_message(chat_id, progress_message_id, error_text)
+            else:
+                handlers.send_message(chat_id, error_text, message_id)
+    
+    submit_job(chat_id, process_tiktok, reply_to=message_id)
+
+# /dl command - Owner mode multi-platform downloader
+@router.command('/dl')
+def cmd_dl(ctx, args):
+    chat_id, message_id, is_owner = ctx['chat_id'], ctx['message_id'], ctx['is_owner']
+    
+    if not is_owner or get_owner_mode() != 'owner':
+        handlers.send_message(chat_id, html_bold('❌ This command is only available for the owner in Owner Mode.'), message_id)
+        return
+    
+    dl_url = args
+    
+    if not dl_url:
+        handlers.send_message(
+            chat_id,
+            html_bold('📥 Universal Downloader') + '\n\n' +
+            'Usage: <code>/dl [url]</code>\n\n' +
+            '<b>Supported platforms:</b>\n' +
+            '• YouTube, Instagram, Twitter/X\n' +
+            '• TikTok, Facebook, Vimeo\n' +
+            '• Reddit, Twitch, SoundCloud\n' +
+            '• And many more...\n\n' +
+            'Example:\n' +
+            '• <code>/dl https://youtube.com/watch?v=xxx</code>\n' +
+            '• <code>/dl https://instagram.com/p/xxx</code>',
+            message_id
+        )
+        return
+    
+    if not is_supported_url(dl_url):
+        handlers.send_message(chat_id, html_bold('❌ Unsupported URL or platform.'), message_id)
+        return
+    
+    status_msg_id = handlers.send_message(
+        chat_id,
+        html_bold('📥 Fetching media info...') + '\n\n⏳ Please wait...',
+        message_id
+    )
+    
+    def do_owner_download():
+        try:
+            info = get_media_info(dl_url)
             
-            # Auto-detect any supported URL and show download options
-            if text:
-                detected_url = extract_url_from_text(text)
-                if detected_url and is_supported_url(detected_url):
-                    def do_auto_download():
-                        process_auto_url_download(detected_url, handlers, chat_id, message_id, is_owner)
-                    
-                    threading.Thread(target=do_auto_download).start()
-                    return jsonify({"ok": True})
+            if not info.get('success'):
+                handlers.edit_message(chat_id, status_msg_id, html_bold('❌ Failed to fetch info: ') + info.get('error', 'Unknown error'))
+                return
             
-            if text and is_owner:
-                def process_ai_request():
-                    ai_bot.process_message(text, chat_id, message_id, is_owner)
-                
-                threading.Thread(target=process_ai_request).start()
-                return jsonify({"ok": True})
+            cache_id = new_id()
+            download_cache[cache_id] = {
+                'url': dl_url,
+                'info': info,
+                'chat_id': chat_id,
+                'timestamp': time.time()
+            }
+            
+            platform = info.get('platform', 'unknown').capitalize()
+            caption = (
+                f"📥 <b>{platform} Downloader</b>\n\n"
+                f"🎬 <b>{info.get('title', 'Unknown')}</b>\n"
+                f"⏱ <b>Duration:</b> {format_duration(info.get('duration'))}\n"
+                f"👁 <b>Views:</b> {format_views(info.get('view_count'))}\n"
+                f"📺 <b>Uploader:</b> {info.get('uploader', 'Unknown')}\n\n"
+                f"<b>Select quality:</b>"
+            )
+            
+            keyboard = []
+            
+            video_formats = info.get('video_formats', {})
+            if video_formats:
+                video_row = []
+                for quality, fmt in list(video_formats.items())[:3]:
+                    button = callback_button(f"🎬 {quality}", 'owndl', 'video', quality, cache_id, format_id=fmt.get('format_id'))
+                    if button:
+                        video_row.append(button)
+                if video_row:
+                    keyboard.append(video_row)
+            
+            audio_formats = info.get('audio_formats', {})
+            if audio_formats:
+                audio_row = []
+                for quality, fmt in list(audio_formats.items())[:2]:
+                    button = callback_button(f"🎵 {quality}", 'owndl', 'audio', quality, cache_id, format_id=fmt.get('format_id'))
+                    if button:
+                        audio_row.append(button)
+                if audio_row:
+                    keyboard.append(audio_row)
+            
+            if not keyboard:
+                keyboard.append([{"text": "🎬 Best Video", "callback_data": encode_callback('owndl', 'video', 'best', cache_id)}])
+                keyboard.append([{"text": "🎵 Audio", "callback_data": encode_callback('owndl', 'audio', 'best', cache_id)}])
+            
+            if info.get('thumbnail'):
+                handlers.delete_message(chat_id, status_msg_id)
+                handlers.send_photo_with_caption(chat_id, info['thumbnail'], caption, message_id, keyboard)
+            else:
+                handlers.edit_message(chat_id, status_msg_id, caption, keyboard)
             
-            if text:
-                help_text = """📌 <b>How to use this bot:</b>
+        except Exception as e:
+            print(f"[Owner Download] Error: {e}")
+            handlers.edit_message(chat_id, status_msg_id, html_bold('❌ Error: ') + str(e))
+    
+    submit_job(chat_id, do_owner_download, reply_to=message_id, lane='metadata')
+
+def handle_text(ctx):
+    """Non-command messages: Facebook profiles (owner), links, AI requests (owner), then help"""
+    text = ctx['text']
+    chat_id, message_id, is_owner = ctx['chat_id'], ctx['message_id'], ctx['is_owner']
+    
+    # Facebook profile photo download - OWNER ONLY
+    if is_owner and is_facebook_profile_url(text):
+        submit_job(chat_id, process_facebook_profile, text, handlers, chat_id, message_id, is_owner, reply_to=message_id)
+        return
+    
+    # Auto-detect any supported URL and show download options
+    detected_url = extract_url_from_text(text)
+    if detected_url and is_supported_url(detected_url):
+        def do_auto_download():
+            process_auto_url_download(detected_url, handlers, chat_id, message_id, is_owner)
+        
+        submit_job(chat_id, do_auto_download, reply_to=message_id, lane='metadata')
+        return
+    
+    if is_owner:
+        def process_ai_request():
+            ai_bot.process_message(text, chat_id, message_id, is_owner)
+        
+        submit_job(chat_id, process_ai_request, reply_to=message_id, lane='metadata')
+        return
+    
+    help_text = """📌 <b>How to use this bot:</b>
 
 <b>🔗 Just send a link!</b>
 The bot will automatically detect and download from:
@@ -1061,359 +1298,511 @@ The bot will automatically detect and download from:
 
 ◇───────────────◇
 🚀 <b>Powered by LK NEWS Download Bot</b>"""
-                handlers.send_message(chat_id, help_text, message_id, user_inline_keyboard)
-                return jsonify({"ok": True})
-        
-        if callback_query:
-            chat_id = callback_query['message']['chat']['id']
-            data = callback_query['data']
-            callback_message_id = callback_query['message']['message_id']
-            is_owner = bool(OWNER_ID and str(chat_id) == str(OWNER_ID))
-            
-            all_buttons = []
-            if callback_query['message'].get('reply_markup', {}).get('inline_keyboard'):
-                for row in callback_query['message']['reply_markup']['inline_keyboard']:
-                    all_buttons.extend(row)
-            button = next((b for b in all_buttons if b.get('callback_data') == data), None)
-            button_text = button['text'] if button else "Action Complete"
-            
-            if data in ['ignore_progress', 'ignore_branding']:
-                handlers.answer_callback_query(callback_query['id'], button_text)
-                return jsonify({"ok": True})
-            
-            # Extract audio - ONLY for owner
-            if data.startswith('extract_audio_'):
-                if not is_owner:
-                    handlers.answer_callback_query(callback_query['id'], '❌ Only the owner can use this feature.')
-                    return jsonify({"ok": True})
-                
-                handlers.answer_callback_query(callback_query['id'], '🎵 Extracting audio...')
-                video_data = handlers.get_video_for_audio(chat_id, data)
-                if video_data:
-                    def do_extract():
-                        success = extract_tiktok_audio(video_data['video_url'], chat_id, video_data['caption'], handlers)
-                        if not success:
-                            handlers.send_message(chat_id, html_bold('❌ Failed to extract audio. Please try again.'), None)
-                        handlers.clear_video_for_audio(chat_id, data)
-                    
-                    threading.Thread(target=do_extract).start()
-                else:
-                    handlers.send_message(chat_id, html_bold('❌ Video data expired. Please send the link again.'), None)
-                return jsonify({"ok": True})
-            
-            if data.startswith('songcount_'):
-                parts = data.split('_')
-                count = int(parts[1])
-                query_id = '_'.join(parts[2:])
-                
-                cached_data = song_query_cache.get(query_id)
-                
-                if not cached_data:
-                    handlers.answer_callback_query(callback_query['id'], '❌ Request expired')
-                    handlers.edit_message(chat_id, callback_message_id, html_bold('❌ Request expired. Please send the /song command again.'))
-                    return jsonify({"ok": True})
-                
-                handlers.answer_callback_query(callback_query['id'], f'🎵 Downloading {count} song(s)...')
-                
-                del song_query_cache[query_id]
-                
-                handlers.edit_message(
-                    chat_id, callback_message_id,
-                    html_bold('🎵 Starting YouTube search...') + '\n\n' +
-                    f'🔍 Query: <i>{cached_data["query"]}</i>\n' +
-                    f'📥 Downloading {count} song(s)...'
-                )
-                
-                def do_song_download():
-                    try:
-                        history_functions = {
-                            'is_already_downloaded': is_already_downloaded,
-                            'add_to_history': add_to_history
-                        }
-                        download_and_send_songs(cached_data['query'], count, handlers, chat_id, callback_message_id, history_functions)
-                    except Exception as e:
-                        print(f"[Bot] Song download error: {e}")
-                        handlers.edit_message(chat_id, callback_message_id, html_bold('❌ Error downloading songs') + '\n\n' + str(e))
-                
-                threading.Thread(target=do_song_download).start()
-                return jsonify({"ok": True})
-            
-            # YouTube quality selection - User mode
-            if data.startswith('ytdl_'):
-                parts = data.split('_')
-                format_type = parts[1]
-                quality = parts[2]
-                cache_id = '_'.join(parts[3:])
-                
-                cached_data = youtube_quality_cache.get(cache_id)
-                
-                if not cached_data:
-                    handlers.answer_callback_query(callback_query['id'], '❌ Request expired')
-                    handlers.delete_message(chat_id, callback_message_id)
-                    handlers.send_message(chat_id, html_bold('❌ Request expired. Please send the link again.'), None)
-                    return jsonify({"ok": True})
-                
-                handlers.answer_callback_query(callback_query['id'], f'📥 Starting download...')
-                
-                handlers.delete_message(chat_id, callback_message_id)
-                
-                status_msg_id = handlers.send_message(
-                    chat_id,
-                    html_bold(f'📥 Downloading {format_type}...') + f'\n\n🎬 {cached_data.get("title", "Video")}',
-                    None
-                )
-                
-                del youtube_quality_cache[cache_id]
-                
-                def do_ytdl_download():
-                    process_universal_download(cached_data['url'], handlers, chat_id, status_msg_id, False, format_type, quality)
-                
-                threading.Thread(target=do_ytdl_download).start()
-                return jsonify({"ok": True})
-            
-            # Universal URL download callbacks
-            if data.startswith('urldl_'):
-                parts = data.split('_')
-                action_type = parts[1]
-                
-                if action_type == 'tkaudio':
-                    cache_id = '_'.join(parts[2:])
-                    cached_data = url_download_cache.get(cache_id)
-                    
-                    if not cached_data:
-                        handlers.answer_callback_query(callback_query['id'], '❌ Request expired')
-                        return jsonify({"ok": True})
-                    
-                    handlers.answer_callback_query(callback_query['id'], '🎵 Extracting audio...')
-                    
-                    def do_tiktok_audio():
-                        success = extract_tiktok_audio(cached_data['video_url'], chat_id, cached_data['caption'], handlers)
-                        if not success:
-                            handlers.send_message(chat_id, html_bold('❌ Failed to extract audio.'), None)
-                        if cache_id in url_download_cache:
-                            del url_download_cache[cache_id]
-                    
-                    threading.Thread(target=do_tiktok_audio).start()
-                    return jsonify({"ok": True})
-                
-                format_type = action_type
-                quality = parts[2]
-                cache_id = '_'.join(parts[3:])
-                
-                cached_data = url_download_cache.get(cache_id)
-                
-                if not cached_data:
-                    handlers.answer_callback_query(callback_query['id'], '❌ Request expired')
-                    handlers.delete_message(chat_id, callback_message_id)
-                    handlers.send_message(chat_id, html_bold('❌ Request expired. Please send the link again.'), None)
-                    return jsonify({"ok": True})
-                
-                handlers.answer_callback_query(callback_query['id'], f'📥 Starting download...')
-                
-                handlers.delete_message(chat_id, callback_message_id)
-                
-                info = cached_data.get('info', {})
-                status_msg_id = handlers.send_message(
-                    chat_id,
-                    html_bold(f'📥 Downloading {format_type}...') + f'\n\n🎬 {info.get("title", "Media")}',
-                    None
-                )
-                
-                if cache_id in url_download_cache:
-                    del url_download_cache[cache_id]
-                
-                def do_urldl_download():
-                    process_universal_download(cached_data['url'], handlers, chat_id, status_msg_id, False, format_type, quality)
-                
-                threading.Thread(target=do_urldl_download).start()
-                return jsonify({"ok": True})
-            
-            # Owner mode multi-platform download
-            if data.startswith('owndl_'):
-                if not is_owner:
-                    handlers.answer_callback_query(callback_query['id'], '❌ Owner only')
-                    return jsonify({"ok": True})
-                
-                parts = data.split('_')
-                format_type = parts[1]
-                quality = parts[2]
-                cache_id = '_'.join(parts[3:])
-                
-                cached_data = download_cache.get(cache_id)
-                
-                if not cached_data:
-                    handlers.answer_callback_query(callback_query['id'], '❌ Request expired')
-                    handlers.delete_message(chat_id, callback_message_id)
-                    handlers.send_message(chat_id, html_bold('❌ Request expired. Please send the /dl command again.'), None)
-                    return jsonify({"ok": True})
-                
-                handlers.answer_callback_query(callback_query['id'], f'📥 Starting download...')
-                
-                handlers.delete_message(chat_id, callback_message_id)
-                
-                info = cached_data.get('info', {})
-                status_msg_id = handlers.send_message(
-                    chat_id,
-                    html_bold(f'📥 Downloading {format_type} ({quality})...') + f'\n\n🎬 {info.get("title", "Media")}',
-                    None
-                )
-                
-                del download_cache[cache_id]
-                
-                def do_owndl_download():
-                    process_universal_download(cached_data['url'], handlers, chat_id, status_msg_id, True, format_type, quality)
-                
-                threading.Thread(target=do_owndl_download).start()
-                return jsonify({"ok": True})
-            
-            # AI paginated video callbacks (aipv_)
-            if data.startswith('aipv_'):
-                if not is_owner:
-                    handlers.answer_callback_query(callback_query['id'], '❌ Owner only')
-                    return jsonify({"ok": True})
-                
-                result = ai_bot.handle_pagination_callback(data, chat_id, callback_message_id, callback_query['id'])
-                
-                if result and result.get('action') == 'download':
-                    video_url = result['url']
-                    title = result['title']
-                    format_type = result['format']
-                    
-                    handlers.delete_message(chat_id, callback_message_id)
-                    
-                    status_msg_id = handlers.send_message(
-                        chat_id,
-                        html_bold(f'📥 Downloading {format_type}...') + f'\n\n🎬 {title}',
-                        None
-                    )
-                    
-                    def do_paginated_download():
-                        process_universal_download(video_url, handlers, chat_id, status_msg_id, True, format_type, 'best')
-                    
-                    threading.Thread(target=do_paginated_download).start()
-                
-                return jsonify({"ok": True})
-            
-            # AI paginated image callbacks (aipi_)
-            if data.startswith('aipi_'):
-                if not is_owner:
-                    handlers.answer_callback_query(callback_query['id'], '❌ Owner only')
-                    return jsonify({"ok": True})
-                
-                result = ai_bot.handle_image_pagination_callback(data, chat_id, callback_message_id, callback_query['id'])
-                
-                if result and result.get('action') == 'download':
-                    image_url = result['url']
-                    title = result['title']
-                    
-                    def do_image_download():
-                        from ai_handler import download_image
-                        handlers.send_action(chat_id, 'upload_photo')
-                        temp_file = download_image(image_url, 'dl_img')
-                        if temp_file and os.path.exists(temp_file):
-                            handlers.send_photo_file(chat_id, temp_file, f"📷 {title[:100]}", None)
-                            try:
-                                os.unlink(temp_file)
-                            except:
-                                pass
-                        else:
-                            handlers.send_photo_with_caption(chat_id, image_url, f"📷 {title[:100]}", None)
-                    
-                    threading.Thread(target=do_image_download).start()
-                
-                return jsonify({"ok": True})
-            
-            # AI download callbacks (legacy)
-            if data.startswith('ai_dl_'):
-                parts = data.split('_')
-                dl_type = parts[2]
-                video_index = int(parts[3])
-                cache_id = '_'.join(parts[4:])
-                
-                if not is_owner:
-                    handlers.answer_callback_query(callback_query['id'], '❌ Owner only')
-                    return jsonify({"ok": True})
-                
-                cached_data = ai_video_cache.get(cache_id)
-                
-                if not cached_data or video_index >= len(cached_data.get('videos', [])):
-                    handlers.answer_callback_query(callback_query['id'], '❌ Request expired')
-                    return jsonify({"ok": True})
-                
-                if time.time() - cached_data.get('timestamp', 0) > 300:
-                    del ai_video_cache[cache_id]
-                    handlers.answer_callback_query(callback_query['id'], '❌ Request expired')
-                    return jsonify({"ok": True})
-                
-                video = cached_data['videos'][video_index]
-                video_url = video.get('content', '')
-                title = video.get('title', 'Video')
-                
-                if cache_id in ai_video_cache:
-                    del ai_video_cache[cache_id]
-                
-                handlers.answer_callback_query(callback_query['id'], f'📥 Starting download...')
-                handlers.delete_message(chat_id, callback_message_id)
-                
-                status_msg_id = handlers.send_message(
-                    chat_id,
-                    html_bold(f'📥 Downloading {dl_type}...') + f'\n\n🎬 {title}',
-                    None
-                )
-                
-                def do_ai_download():
-                    fmt = 'audio' if dl_type == 'audio' else 'video'
-                    process_universal_download(video_url, handlers, chat_id, status_msg_id, True, fmt, 'best')
-                
-                threading.Thread(target=do_ai_download).start()
-                return jsonify({"ok": True})
-            
-            # Admin callbacks - only for owner
-            if OWNER_ID and str(chat_id) != str(OWNER_ID):
-                handlers.answer_callback_query(callback_query['id'], "❌ You cannot use this command.")
-                return jsonify({"ok": True})
-            
-            if data == 'set_mode_owner':
-                owner_mode = 'owner'
-                handlers.answer_callback_query(callback_query['id'], '✅ Owner Mode activated')
-                owner_mode_keyboard = [
-                    [
-                        {"text": "✅ Owner Mode", "callback_data": "set_mode_owner"},
-                        {"text": "👤 User Mode", "callback_data": "set_mode_user"}
-                    ],
-                    [{"text": "📊 Users Count", "callback_data": "admin_users_count"}],
-                    [{"text": "📣 Broadcast", "callback_data": "admin_broadcast"}],
-                    [{"text": "LK NEWS Download Bot", "callback_data": "ignore_branding"}]
-                ]
-                handlers.edit_message(chat_id, callback_message_id, html_bold("👑 Welcome Back, Admin!") + "\n\nThis is your Admin Control Panel.\n\n" + html_bold("Current Mode: 👑 Owner Mode"), owner_mode_keyboard)
-            
-            elif data == 'set_mode_user':
-                owner_mode = 'user'
-                handlers.answer_callback_query(callback_query['id'], '✅ User Mode activated')
-                user_mode_keyboard = [
-                    [
-                        {"text": "👑 Owner Mode", "callback_data": "set_mode_owner"},
-                        {"text": "✅ User Mode", "callback_data": "set_mode_user"}
-                    ],
-                    [{"text": "📊 Users Count", "callback_data": "admin_users_count"}],
-                    [{"text": "📣 Broadcast", "callback_data": "admin_broadcast"}],
-                    [{"text": "LK NEWS Download Bot", "callback_data": "ignore_branding"}]
-                ]
-                handlers.edit_message(chat_id, callback_message_id, html_bold("👑 Welcome Back, Admin!") + "\n\nThis is your Admin Control Panel.\n\n" + html_bold("Current Mode: 👤 User Mode"), user_mode_keyboard)
-            
-            elif data == 'admin_users_count':
-                count = handlers.get_all_users_count()
-                handlers.answer_callback_query(callback_query['id'], f'📊 Total Users: {count}')
-            
-            elif data == 'admin_broadcast':
-                handlers.answer_callback_query(callback_query['id'], '📣 Broadcast Mode')
-                handlers.send_message(chat_id, html_bold("📣 Broadcast Mode") + "\n\nPlease reply with the message you want to broadcast:", callback_message_id)
+    handlers.send_message(chat_id, help_text, message_id, user_inline_keyboard)
+
+@router.callback(data='ignore_progress')
+@router.callback(data='ignore_branding')
+def cb_ignore(ctx, args):
+    callback_query, data = ctx['callback_query'], ctx['data']
+    
+    all_buttons = []
+    if callback_query['message'].get('reply_markup', {}).get('inline_keyboard'):
+        for row in callback_query['message']['reply_markup']['inline_keyboard']:
+            all_buttons.extend(row)
+    button = next((b for b in all_buttons if b.get('callback_data') == data), None)
+    button_text = button['text'] if button else "Action Complete"
+    handlers.answer_callback_query(callback_query['id'], button_text)
+
+# Extract audio - ONLY for owner
+@router.callback(prefix='extract_audio_')
+def cb_extract_audio(ctx, args):
+    callback_query, chat_id, is_owner = ctx['callback_query'], ctx['chat_id'], ctx['is_owner']
+    data = ctx['data']
+    
+    if not is_owner:
+        handlers.answer_callback_query(callback_query['id'], '❌ Only the owner can use this feature.')
+        return
+    
+    handlers.answer_callback_query(callback_query['id'], '🎵 Extracting audio...')
+    video_data = handlers.get_video_for_audio(chat_id, data)
+    if video_data:
+        def do_extract():
+            success = extract_tiktok_audio(video_data['video_url'], chat_id, video_data['caption'], handlers)
+            if not success:
+                handlers.send_message(chat_id, html_bold('❌ Failed to extract audio. Please try again.'), None)
+            handlers.clear_video_for_audio(chat_id, data)
+        
+        submit_job(chat_id, do_extract, lane='transcode')
+    else:
+        handlers.send_message(chat_id, html_bold('❌ Video data expired. Please send the link again.'), None)
+
+@router.callback(action='songcount')
+@router.callback(prefix='songcount_', fields=1)
+def cb_songcount(ctx, args):
+    callback_query, chat_id, callback_message_id = ctx['callback_query'], ctx['chat_id'], ctx['message_id']
+    count = int(args[0])
+    query_id = args[1]
+    
+    cached_data = song_query_cache.get(query_id)
+    
+    if not cached_data:
+        handlers.answer_callback_query(callback_query['id'], '❌ Request expired')
+        handlers.edit_message(chat_id, callback_message_id, html_bold('❌ Request expired. Please send the /song command again.'))
+        return
+    
+    handlers.answer_callback_query(callback_query['id'], f'🎵 Downloading {count} song(s)...')
+    
+    del song_query_cache[query_id]
+    
+    handlers.edit_message(
+        chat_id, callback_message_id,
+        html_bold('🎵 Starting YouTube search...') + '\n\n' +
+        f'🔍 Query: <i>{cached_data["query"]}</i>\n' +
+        f'📥 Downloading {count} song(s)...'
+    )
+    
+    submit_journaled_job('song_batch', chat_id, cached_data['query'], count, chat_id, callback_message_id)
+
+@job_journal.register('song_batch')
+def run_song_batch_job(job):
+    query, count, chat_id, status_message_id = job.args
+    try:
+        history_functions = {
+            'is_already_downloaded': is_already_downloaded,
+            'add_to_history': add_to_history
+        }
+        download_and_send_songs(query, count, handlers, chat_id, status_message_id, history_functions, job=job)
+    except Exception as e:
+        print(f"[Bot] Song download error: {e}")
+        handlers.edit_message(chat_id, status_message_id, html_bold('❌ Error downloading songs') + '\n\n' + str(e))
+
+# YouTube quality selection - User mode
+@router.callback(action='ytdl')
+@router.callback(prefix='ytdl_', fields=2)
+def cb_ytdl(ctx, args):
+    callback_query, chat_id, callback_message_id = ctx['callback_query'], ctx['chat_id'], ctx['message_id']
+    format_type, quality, cache_id = args
+    
+    cached_data = youtube_quality_cache.get(cache_id)
+    
+    if not cached_data:
+        handlers.answer_callback_query(callback_query['id'], '❌ Request expired')
+        handlers.delete_message(chat_id, callback_message_id)
+        handlers.send_message(chat_id, html_bold('❌ Request expired. Please send the link again.'), None)
+        return
+    
+    handlers.answer_callback_query(callback_query['id'], f'📥 Starting download...')
+    
+    handlers.delete_message(chat_id, callback_message_id)
+    
+    status_msg_id = handlers.send_message(
+        chat_id,
+        html_bold(f'📥 Downloading {format_type}...') + f'\n\n🎬 {cached_data.get("title", "Video")}',
+        None
+    )
+    
+    del youtube_quality_cache[cache_id]
+    
+    submit_download(cached_data['url'], chat_id, status_msg_id, False, format_type, quality)
+
+# Universal URL download callbacks
+@router.callback(action='urldl_tkaudio')
+@router.callback(prefix='urldl_tkaudio_', fields=0)
+def cb_urldl_tkaudio(ctx, args):
+    callback_query, chat_id = ctx['callback_query'], ctx['chat_id']
+    cache_id = args[0]
+    cached_data = url_download_cache.get(cache_id)
+    
+    if not cached_data:
+        handlers.answer_callback_query(callback_query['id'], '❌ Request expired')
+        return
+    
+    handlers.answer_callback_query(callback_query['id'], '🎵 Extracting audio...')
+    
+    def do_tiktok_audio():
+        success = extract_tiktok_audio(cached_data['video_url'], chat_id, cached_data['caption'], handlers)
+        if not success:
+            handlers.send_message(chat_id, html_bold('❌ Failed to extract audio.'), None)
+        if cache_id in url_download_cache:
+            del url_download_cache[cache_id]
+    
+    submit_job(chat_id, do_tiktok_audio, lane='transcode')
+
+@router.callback(action='urldl')
+@router.callback(prefix='urldl_', fields=2)
+def cb_urldl(ctx, args):
+    callback_query, chat_id, callback_message_id = ctx['callback_query'], ctx['chat_id'], ctx['message_id']
+    format_type, quality, cache_id = args[:3]
+    # Encoded buttons carry the yt-dlp format id of the previewed quality
+    format_id = args[3] if len(args) > 3 and args[3] else None
+    
+    cached_data = url_download_cache.get(cache_id)
+    
+    if not cached_data:
+        handlers.answer_callback_query(callback_query['id'], '❌ Request expired')
+        handlers.delete_message(chat_id, callback_message_id)
+        handlers.send_message(chat_id, html_bold('❌ Request expired. Please send the link again.'), None)
+        return
+    
+    handlers.answer_callback_query(callback_query['id'], f'📥 Starting download...')
+    
+    handlers.delete_message(chat_id, callback_message_id)
+    
+    info = cached_data.get('info', {})
+    status_msg_id = handlers.send_message(
+        chat_id,
+        html_bold(f'📥 Downloading {format_type}...') + f'\n\n🎬 {info.get("title", "Media")}',
+        None
+    )
+    
+    if cache_id in url_download_cache:
+        del url_download_cache[cache_id]
+    
+    format_id = format_id or cached_format_id(info, format_type, quality)
+    submit_download(cached_data['url'], chat_id, status_msg_id, False, format_type, quality, format_id)
+
+# Owner mode multi-platform download
+@router.callback(action='owndl')
+@router.callback(prefix='owndl_', fields=2)
+def cb_owndl(ctx, args):
+    callback_query, chat_id, callback_message_id, is_owner = ctx['callback_query'], ctx['chat_id'], ctx['message_id'], ctx['is_owner']
+    
+    if not is_owner:
+        handlers.answer_callback_query(callback_query['id'], '❌ Owner only')
+        return
+    
+    format_type, quality, cache_id = args[:3]
+    format_id = args[3] if len(args) > 3 and args[3] else None
+    
+    cached_data = download_cache.get(cache_id)
+    
+    if not cached_data:
+        handlers.answer_callback_query(callback_query['id'], '❌ Request expired')
+        handlers.delete_message(chat_id, callback_message_id)
+        handlers.send_message(chat_id, html_bold('❌ Request expired. Please send the /dl command again.'), None)
+        return
+    
+    handlers.answer_callback_query(callback_query['id'], f'📥 Starting download...')
+    
+    handlers.delete_message(chat_id, callback_message_id)
+    
+    info = cached_data.get('info', {})
+    status_msg_id = handlers.send_message(
+        chat_id,
+        html_bold(f'📥 Downloading {format_type} ({quality})...') + f'\n\n🎬 {info.get("title", "Media")}',
+        None
+    )
+    
+    del download_cache[cache_id]
+    
+    format_id = format_id or cached_format_id(info, format_type, quality)
+    submit_download(cached_data['url'], chat_id, status_msg_id, True, format_type, quality, format_id)
+
+# AI paginated video callbacks
+@router.callback(action='aipv')
+def cb_aipv(ctx, args):
+    callback_query, chat_id, callback_message_id, is_owner = ctx['callback_query'], ctx['chat_id'], ctx['message_id'], ctx['is_owner']
+    
+    if not is_owner:
+        handlers.answer_callback_query(callback_query['id'], '❌ Owner only')
+        return
+    
+    result = ai_bot.handle_pagination_callback(args, chat_id, callback_message_id, callback_query['id'])
+    
+    if result and result.get('action') == 'download':
+        video_url = result['url']
+        title = result['title']
+        format_type = result['format']
+        
+        handlers.delete_message(chat_id, callback_message_id)
         
+        status_msg_id = handlers.send_message(
+            chat_id,
+            html_bold(f'📥 Downloading {format_type}...') + f'\n\n🎬 {title}',
+            None
+        )
+        
+        submit_download(video_url, chat_id, status_msg_id, True, format_type, 'best')
+    
+
+# AI paginated image callbacks
+@router.callback(action='aipi')
+def cb_aipi(ctx, args):
+    callback_query, chat_id, callback_message_id, is_owner = ctx['callback_query'], ctx['chat_id'], ctx['message_id'], ctx['is_owner']
+    
+    if not is_owner:
+        handlers.answer_callback_query(callback_query['id'], '❌ Owner only')
+        return
+    
+    result = ai_bot.handle_image_pagination_callback(args, chat_id, callback_message_id, callback_query['id'])
+    
+    if result and result.get('action') == 'download':
+        image_url = result['url']
+        title = result['title']
+        
+        def do_image_download():
+            from ai_handler import download_image
+            handlers.send_action(chat_id, 'upload_photo')
+            temp_file = download_image(image_url, 'dl_img')
+            if temp_file and os.path.exists(temp_file):
+                handlers.send_photo_file(chat_id, temp_file, f"📷 {title[:100]}", None)
+                try:
+                    os.unlink(temp_file)
+                except:
+                    pass
+            else:
+                handlers.send_photo_with_caption(chat_id, image_url, f"📷 {title[:100]}", None)
+        
+        submit_job(chat_id, do_image_download)
+    
+
+# AI download callbacks (legacy)
+@router.callback(prefix='ai_dl_', fields=2)
+def cb_ai_dl(ctx, args):
+    callback_query, chat_id, callback_message_id, is_owner = ctx['callback_query'], ctx['chat_id'], ctx['message_id'], ctx['is_owner']
+    dl_type, video_index, cache_id = args
+    video_index = int(video_index)
+    
+    if not is_owner:
+        handlers.answer_callback_query(callback_query['id'], '❌ Owner only')
+        return
+    
+    cached_data = ai_video_cache.get(cache_id)
+    
+    if not cached_data or video_index >= len(cached_data.get('videos', [])):
+        handlers.answer_callback_query(callback_query['id'], '❌ Request expired')
+        return
+    
+    video = cached_data['videos'][video_index]
+    video_url = video.get('content', '')
+    title = video.get('title', 'Video')
+    
+    if cache_id in ai_video_cache:
+        del ai_video_cache[cache_id]
+    
+    handlers.answer_callback_query(callback_query['id'], f'📥 Starting download...')
+    handlers.delete_message(chat_id, callback_message_id)
+    
+    status_msg_id = handlers.send_message(
+        chat_id,
+        html_bold(f'📥 Downloading {dl_type}...') + f'\n\n🎬 {title}',
+        None
+    )
+    
+    fmt = 'audio' if dl_type == 'audio' else 'video'
+    submit_download(video_url, chat_id, status_msg_id, True, fmt, 'best')
+
+@router.callback(data='set_mode_owner')
+@owner_callback
+def cb_set_mode_owner(ctx, args):
+    callback_query, chat_id, callback_message_id = ctx['callback_query'], ctx['chat_id'], ctx['message_id']
+    
+    set_owner_mode('owner')
+    handlers.answer_callback_query(callback_query['id'], '✅ Owner Mode activated')
+    owner_mode_keyboard = [
+        [
+            {"text": "✅ Owner Mode", "callback_data": "set_mode_owner"},
+            {"text": "👤 User Mode", "callback_data": "set_mode_user"}
+        ],
+        [{"text": "📊 Users Count", "callback_data": "admin_users_count"}],
+        [{"text": "📣 Broadcast", "callback_data": "admin_broadcast"}],
+        [{"text": "LK NEWS Download Bot", "callback_data": "ignore_branding"}]
+    ]
+    handlers.edit_message(chat_id, callback_message_id, html_bold("👑 Welcome Back, Admin!") + "\n\nThis is your Admin Control Panel.\n\n" + html_bold("Current Mode: 👑 Owner Mode"), owner_mode_keyboard)
+
+@router.callback(data='set_mode_user')
+@owner_callback
+def cb_set_mode_user(ctx, args):
+    callback_query, chat_id, callback_message_id = ctx['callback_query'], ctx['chat_id'], ctx['message_id']
+    
+    set_owner_mode('user')
+    handlers.answer_callback_query(callback_query['id'], '✅ User Mode activated')
+    user_mode_keyboard = [
+        [
+            {"text": "👑 Owner Mode", "callback_data": "set_mode_owner"},
+            {"text": "✅ User Mode", "callback_data": "set_mode_user"}
+        ],
+        [{"text": "📊 Users Count", "callback_data": "admin_users_count"}],
+        [{"text": "📣 Broadcast", "callback_data": "admin_broadcast"}],
+        [{"text": "LK NEWS Download Bot", "callback_data": "ignore_branding"}]
+    ]
+    handlers.edit_message(chat_id, callback_message_id, html_bold("👑 Welcome Back, Admin!") + "\n\nThis is your Admin Control Panel.\n\n" + html_bold("Current Mode: 👤 User Mode"), user_mode_keyboard)
+
+@router.callback(data='admin_users_count')
+@owner_callback
+def cb_admin_users_count(ctx, args):
+    callback_query = ctx['callback_query']
+    count = handlers.get_all_users_count()
+    handlers.answer_callback_query(callback_query['id'], f'📊 Total Users: {count}')
+
+@router.callback(data='admin_broadcast')
+@owner_callback
+def cb_admin_broadcast(ctx, args):
+    callback_query, chat_id, callback_message_id = ctx['callback_query'], ctx['chat_id'], ctx['message_id']
+    handlers.answer_callback_query(callback_query['id'], '📣 Broadcast Mode')
+    handlers.send_message(chat_id, html_bold("📣 Broadcast Mode") + "\n\nPlease reply with the message you want to broadcast:", callback_message_id)
+
+def process_message(message):
+    chat_id = message['chat']['id']
+    text = message.get('text', '').strip() if message.get('text') else None
+    ctx = {
+        'message': message,
+        'chat_id': chat_id,
+        'message_id': message['message_id'],
+        'text': text,
+        'is_owner': bool(OWNER_ID and str(chat_id) == str(OWNER_ID)),
+        'user_name': message.get('from', {}).get('first_name', 'User')
+    }
+    
+    handlers.save_user_id(chat_id)
+    
+    if ctx['is_owner'] and message.get('reply_to_message') and handle_broadcast_reply(ctx):
+        return
+    
+    if not text:
+        return
+    
+    handler, args = router.match_command(text)
+    if handler and handler(ctx, args) is not False:
+        return
+    
+    handle_text(ctx)
+
+def process_callback_query(callback_query):
+    chat_id = callback_query['message']['chat']['id']
+    data = callback_query['data']
+    ctx = {
+        'callback_query': callback_query,
+        'chat_id': chat_id,
+        'data': data,
+        'message_id': callback_query['message']['message_id'],
+        'is_owner': bool(OWNER_ID and str(chat_id) == str(OWNER_ID))
+    }
+    
+    handler, args = router.match_callback(data)
+    if handler:
+        handler(ctx, args)
+    elif OWNER_ID and str(chat_id) != str(OWNER_ID):
+        handlers.answer_callback_query(callback_query['id'], "❌ You cannot use this command.")
+
+def process_update(update):
+    """Dispatch one Telegram update on the calling thread (the webhook when WEBHOOK_FAST_ACK is off)"""
+    if update_deduplicator.is_duplicate(update.get('update_id')):
+        print(f"[Bot] Duplicate update {update.get('update_id')} ignored")
+        return
+    
+    try:
+        dispatch_update(update)
+    finally:
+        # Chat actions are leased per thread; scheduler jobs release theirs in the on_finish hook
+        handlers.stop_action()
+
+def dispatch_update(update):
+    """Route an update that already passed the duplicate check"""
+    message = update.get('message')
+    callback_query = update.get('callback_query')
+    
+    if message:
+        process_message(message)
+    elif callback_query:
+        process_callback_query(callback_query)
+    else:
+        print("[Bot] No message or callback query found")
+
+def update_chat_id(update):
+    """Chat an update belongs to, used to keep each chat's updates in order"""
+    message = update.get('message') or (update.get('callback_query') or {}).get('message') or {}
+    return message.get('chat', {}).get('id')
+
+_worker_started = threading.Event()
+
+def start_worker():
+    """One-time startup for a serving process: warm Bot API connections and yt-dlp workers, resume journaled jobs"""
+    if _worker_started.is_set():
+        return
+    _worker_started.set()
+    handlers.warm_up()
+    ytdlp_pool.start()
+    resume_unfinished_jobs()
+
+@app.before_request
+def start_worker_once():
+    # Runs in the serving worker after gunicorn has forked, never in the master
+    if not _worker_started.is_set():
+        start_worker()
+
+def enqueue_update(update, received_at, source='webhook'):
+    """Hand an update to the interactive lane, dropping duplicates first. False when the queue is full."""
+    if update_deduplicator.is_duplicate(update['update_id']):
+        # Retries are dropped here so they never take a queue slot
+        counters.inc(f'{source}_duplicate')
+        return True
+    
+    if not scheduler.submit('interactive', update_chat_id(update), process_queued_update, update, received_at):
+        # The update will be delivered again, which must not count as a duplicate
+        update_deduplicator.forget(update['update_id'])
+        counters.inc(f'{source}_rejected')
+        return False
+    counters.inc(f'{source}_queued')
+    return True
+
+def process_queued_update(update, received_at):
+    """Worker-side half of enqueue_update; duplicates were dropped before it was queued"""
+    try:
+        print(f"[Bot] Processing update: {str(update)[:300]}")
+        dispatch_update(update)
+    finally:
+        update_processing_latency.observe(time.perf_counter() - received_at)
+
+@app.route('/', methods=['POST'])
+def webhook():
+    received_at = time.perf_counter()
+    try:
+        update = request.get_json(silent=True)
+        if not isinstance(update, dict) or 'update_id' not in update:
+            counters.inc('webhook_invalid')
+            return jsonify({"ok": False, "error": "invalid update"})
+        
+        if not WEBHOOK_FAST_ACK:
+            print(f"[Bot] Received update: {str(update)[:300]}")
+            process_update(update)
+            return jsonify({"ok": True})
+        
+        if not enqueue_update(update, received_at):
+            # A non-2xx reply makes Telegram redeliver the update later
+            return jsonify({"ok": False, "error": "update queue full"}), 503
         return jsonify({"ok": True})
         
     except Exception as e:
         print(f"[Bot] Webhook error: {e}")
         return jsonify({"ok": False, "error": str(e)})
+    finally:
+        webhook_ack_latency.observe(time.perf_counter() - received_at)
+
+def get_cache_stats():
+    stats = {'media_info': MEDIA_INFO_CACHE.stats(), 'probe_json': PROBE_CACHE.stats()}
+    if hasattr(state_backend.backend, 'stats'):
+        stats.update(state_backend.backend.stats())
+    return stats
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        'webhook_ack': webhook_ack_latency.snapshot(),
+        'update_processing': update_processing_latency.snapshot(),
+        'telegram_api': telegram_api_latency.snapshot(),
+        'telegram_connections': handlers.http.stats(),
+        'rate_limiter': rate_limiter.stats(),
+        'telegram_edits': handlers.edits.stats(),
+        'file_id_cache': file_id_cache.stats(),
+        'uploads': uploader.stats(),
+        'chat_actions': handlers.actions.stats(),
+        'users': user_registry.stats(),
+        'ytdlp': ytdlp_pool.stats(),
+        'counters': counters.snapshot(),
+        'lanes': scheduler.stats(),
+        'caches': get_cache_stats()
+    })
 
 if __name__ == '__main__':
     print(f"[Server] TikTok Download Bot running on port 5000")
@@ -0,0 +1,125 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from http_pool import PooledSession
+from file_id_cache import file_id_cache
+from config import MEDIA_GROUP_SIZE, MEDIA_FETCH_WORKERS
+
+image_http = PooledSession(MEDIA_FETCH_WORKERS)
+fetch_pool = ThreadPoolExecutor(max_workers=MEDIA_FETCH_WORKERS, thread_name_prefix='media-fetch')
+
+
+def split_groups(items, size=MEDIA_GROUP_SIZE):
+    """Split into the fewest groups of at most `size`, as even as possible, so no group is a lone photo"""
+    if not items:
+        return []
+    count = -(-len(items) // size)
+    base, extra = divmod(len(items), count)
+    groups, start = [], 0
+    for i in range(count):
+        end = start + base + (1 if i < extra else 0)
+        groups.append(items[start:end])
+        start = end
+    return groups
+
+
+def photo_key(url):
+    # CDN links carry expiring signatures in the query; the path identifies the image
+    parsed = urlparse(url)
+    return f"photo:{parsed.hostname}{parsed.path}"
+
+
+def fetch_image(url):
+    response = image_http.get(url, timeout=30)
+    response.raise_for_status()
+    return io.BytesIO(response.content)
+
+
+def largest_file_id(message):
+    sizes = message.get('photo') or []
+    return sizes[-1]['file_id'] if sizes else None
+
+
+class MediaGroupSender:
+    """Sends any number of photos as ordered media groups of up to MEDIA_GROUP_SIZE.
+
+    Each photo goes by cached file_id when it was sent before, otherwise by
+    URL. When a group fails (Telegram cannot fetch a URL, or a cached file_id
+    went stale), the remaining photos are downloaded concurrently into memory
+    and uploaded with attach://.
+    The file_ids Telegram returns are cached per image.
+    """
+
+    def __init__(self, handlers):
+        self.handlers = handlers
+
+    def send(self, chat_id, photo_urls, caption=None, reply_to_message_id=None, reply_markup=None):
+        groups = split_groups(list(photo_urls))
+        buffers = None
+        messages = []
+        ok = True
+        for index, urls in enumerate(groups):
+            first = index == 0
+            args = (chat_id, urls, caption if first else None, reply_to_message_id if first else None, reply_markup)
+            result = self._send_group(*args, buffers)
+            if buffers is None and not result.get('ok') and result.get('error_code') != 429:
+                print(f"[MediaGroup] URL delivery failed ({result.get('description')}), uploading the remaining photos")
+                # Fetch everything not yet sent at once, in order, so later groups are ready when their turn comes
+                buffers = {url: fetch_pool.submit(fetch_image, url) for group in groups[index:] for url in group}
+                result = self._send_group(*args, buffers)
+            if not result.get('ok'):
+                ok = False
+                print(f"[MediaGroup] Group {index + 1}/{len(groups)} failed: {result.get('description') or result.get('error')}")
+                continue
+            sent = result['result'] if isinstance(result['result'], list) else [result['result']]
+            for url, message in zip(urls, sent):
+                file_id_cache.put(photo_key(url), 'photo', 'original', 'photo', largest_file_id(message))
+            messages.extend(sent)
+        return {'ok': ok, 'result': messages}
+
+    def _media_for(self, url, buffers, files):
+        if buffers is None:
+            cached = file_id_cache.get(photo_key(url), 'photo', 'original')
+            return cached['file_id'] if cached else url
+        name = f"photo{len(files)}"
+        try:
+            files[name] = buffers[url].result()
+        except Exception as e:
+            print(f"[MediaGroup] Could not fetch {url[:80]}: {e}")
+            return url
+        return f"attach://{name}"
+
+    def _send_group(self, chat_id, urls, caption, reply_to_message_id, reply_markup, buffers):
+        files = {}
+        if len(urls) == 1:
+            data = {
+                'chat_id': chat_id,
+                'photo': self._media_for(urls[0], buffers, files),
+                'parse_mode': 'HTML'
+            }
+            if caption:
+                data['caption'] = caption
+            if reply_to_message_id:
+                data['reply_to_message_id'] = reply_to_message_id
+            if reply_markup:
+                data['reply_markup'] = {'inline_keyboard': reply_markup}
+            if files:
+                # A single upload goes in the photo field itself
+                data['photo'] = None
+                return self.handlers._make_request('sendPhoto', data, {'photo': files.popitem()[1]})
+            return self.handlers._make_request('sendPhoto', data)
+        
+        media = []
+        for i, url in enumerate(urls):
+            item = {'type': 'photo', 'media': self._media_for(url, buffers, files)}
+            if i == 0 and caption:
+                item['caption'] = caption
+                item['parse_mode'] = 'HTML'
+            media.append(item)
+        data = {
+            'chat_id': chat_id,
+            'media': media
+        }
+        if reply_to_message_id:
+            data['reply_to_message_id'] = reply_to_message_id
+        return self.handlers._make_request('sendMediaGroup', data, files or None, timeout=300 if files else 120)
@@ -0,0 +1,61 @@
+import threading
+from collections import deque
+
+
+class LatencyRecorder:
+    """Keeps the most recent latency samples (in seconds) and reports percentiles in milliseconds"""
+
+    def __init__(self, window=2048):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def snapshot(self):
+        with self._lock:
+            ordered = sorted(self.samples)
+            count, total, worst = self.count, self.total, self.max
+
+        def percentile(p):
+            if not ordered:
+                return 0.0
+            index = min(len(ordered) - 1, int(len(ordered) * p))
+            return round(ordered[index] * 1000, 3)
+
+        return {
+            'count': count,
+            'avg_ms': round(total / count * 1000, 3) if count else 0.0,
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+            'max_ms': round(worst * 1000, 3)
+        }
+
+
+class Counter:
+    def __init__(self):
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1):
+        with self._lock:
+            self.values[name] = self.values.get(name, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.values)
+
+
+webhook_ack_latency = LatencyRecorder()
+update_processing_latency = LatencyRecorder()
+telegram_api_latency = LatencyRecorder()
+counters = Counter()
@@ -162,7 +162,7 @@ class MTProtoClient:
             print(f"[MTProto] Future error: {e}")
             return {'ok': False, 'error': str(e)}
     
-    def send_audio(self, chat_id, file_path, title=None, caption=None, reply_to_message_id=None):
+    def send_audio(self, chat_id, file_path, title=None, caption=None, reply_to_message_id=None, progress_callback=None):
         if not self.start():
             return {'ok': False, 'error': 'MTProto client not available'}
         
@@ -174,7 +174,8 @@ class MTProtoClient:
                     caption=caption,
                     title=title,
                     parse_mode="html",
-                    reply_to_message_id=reply_to_message_id
+                    reply_to_message_id=reply_to_message_id,
+                    progress=progress_callback
                 )
                 return {'ok': True, 'result': {'message_id': message.id}}
             except FloodWait as e:
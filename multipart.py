@@ -0,0 +1,79 @@
+import json
+import os
+import uuid
+from config import UPLOAD_CHUNK_SIZE
+
+
+class UploadCancelled(Exception):
+    pass
+
+
+class MultipartEncoder:
+    """Streams a multipart/form-data body straight from the files on disk.
+
+    requests sends it with a Content-Length (from __len__) and iterates it,
+    so each file is read UPLOAD_CHUNK_SIZE bytes at a time and never held in
+    memory. After every chunk progress(sent, total) is called; setting the
+    cancel Event aborts the upload with UploadCancelled.
+    """
+
+    def __init__(self, fields, files, chunk_size=UPLOAD_CHUNK_SIZE, progress=None, cancel=None):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.cancel = cancel
+        # Alternating header bytes and (file, size) pairs
+        self.parts = []
+        for name, value in (fields or {}).items():
+            if value is None:
+                continue
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value)
+            self.parts.append(self._header(name) + str(value).encode('utf-8') + b'\r\n')
+        for name, f in (files or {}).items():
+            # Works for open files and in-memory buffers alike
+            size = f.seek(0, os.SEEK_END)
+            f.seek(0)
+            filename = os.path.basename(getattr(f, 'name', name))
+            self.parts.append(self._header(name, filename))
+            self.parts.append((f, size))
+            self.parts.append(b'\r\n')
+        self.parts.append(f'--{self.boundary}--\r\n'.encode('utf-8'))
+        self.total = sum(len(part) if isinstance(part, bytes) else part[1] for part in self.parts)
+        self.sent = 0
+
+    def _header(self, name, filename=None):
+        disposition = f'form-data; name="{name}"'
+        if filename:
+            disposition += f'; filename="{filename}"'
+            return f'--{self.boundary}\r\nContent-Disposition: {disposition}\r\nContent-Type: application/octet-stream\r\n\r\n'.encode('utf-8')
+        return f'--{self.boundary}\r\nContent-Disposition: {disposition}\r\n\r\n'.encode('utf-8')
+
+    def __len__(self):
+        return self.total
+
+    def __iter__(self):
+        for part in self.parts:
+            if isinstance(part, bytes):
+                yield self._advance(part)
+                continue
+            f, size = part
+            remaining = size
+            while remaining > 0:
+                chunk = f.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    raise IOError(f"{getattr(f, 'name', 'file')} shrank during upload")
+                remaining -= len(chunk)
+                yield self._advance(chunk)
+
+    def _advance(self, chunk):
+        if self.cancel is not None and self.cancel.is_set():
+            raise UploadCancelled(f"Upload cancelled after {self.sent} of {self.total} bytes")
+        self.sent += len(chunk)
+        if self.progress:
+            try:
+                self.progress(self.sent, self.total)
+            except Exception as e:
+                print(f"[Multipart] Progress callback error: {e}")
+        return chunk
@@ -0,0 +1,80 @@
+"""Long-polling ingestion mode: python -m polling
+
+Pulls updates in batches with getUpdates and hands them to the same
+interactive lane as the fast-ack webhook, so a slow or throttled chat never
+stalls the loop. Useful when there is no public URL, and for load testing
+against a local fake Bot API (set TELEGRAM_API_URL).
+"""
+import json
+import os
+import time
+from config import BOT_TOKEN, POLLING_OFFSET_FILE, POLLING_TIMEOUT, POLLING_BATCH_SIZE
+from main import handlers, enqueue_update, start_worker
+
+
+def load_offset():
+    try:
+        if os.path.exists(POLLING_OFFSET_FILE):
+            with open(POLLING_OFFSET_FILE, 'r') as f:
+                return json.load(f).get('offset', 0)
+    except Exception as e:
+        print(f"[Polling] Error loading offset: {e}")
+    return 0
+
+
+def save_offset(offset):
+    try:
+        temp_path = f"{POLLING_OFFSET_FILE}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'offset': offset}, f)
+        os.replace(temp_path, POLLING_OFFSET_FILE)
+    except Exception as e:
+        print(f"[Polling] Error saving offset: {e}")
+
+
+def fetch_updates(offset):
+    data = {
+        'offset': offset,
+        'limit': POLLING_BATCH_SIZE,
+        'timeout': POLLING_TIMEOUT,
+        'allowed_updates': ['message', 'callback_query']
+    }
+    return handlers._make_request('getUpdates', data, timeout=POLLING_TIMEOUT + 15)
+
+
+def poll_forever():
+    # getUpdates is refused while a webhook is registered
+    handlers._make_request('deleteWebhook', {'drop_pending_updates': False})
+    start_worker()
+
+    offset = load_offset()
+    print(f"[Polling] Starting long polling from offset {offset}")
+
+    while True:
+        result = fetch_updates(offset)
+
+        if not result.get('ok'):
+            print(f"[Polling] getUpdates failed: {result.get('description') or result.get('error')}")
+            time.sleep(3)
+            continue
+
+        updates = result.get('result', [])
+        queued = 0
+        for update in updates:
+            if not enqueue_update(update, time.perf_counter(), source='polling'):
+                # Leave the offset here so the rest of the batch is fetched again
+                print(f"[Polling] Update queue full, retrying from {offset}")
+                time.sleep(1)
+                break
+            offset = update['update_id'] + 1
+            queued += 1
+
+        if queued:
+            save_offset(offset)
+            print(f"[Polling] Queued {queued} updates, next offset {offset}")
+
+
+if __name__ == '__main__':
+    if not BOT_TOKEN:
+        print("[Polling] WARNING: BOT_TOKEN is not set!")
+    poll_forever()
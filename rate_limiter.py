@@ -0,0 +1,107 @@
+import time
+from sqlite_store import SQLiteStore
+from config import (
+    RATE_LIMIT_DB, RATE_LIMIT_GLOBAL_PER_SEC, RATE_LIMIT_PRIVATE_PER_SEC, RATE_LIMIT_PRIVATE_BURST,
+    RATE_LIMIT_GROUP_PER_MIN
+)
+
+# Bot API methods that do not count against Telegram's message limits
+UNLIMITED_METHODS = {
+    'getMe', 'getUpdates', 'getFile', 'setWebhook', 'deleteWebhook',
+    'answerCallbackQuery', 'sendChatAction', 'deleteMessage'
+}
+
+
+class RateLimiter:
+    """Token buckets for Bot API calls, kept in SQLite so every worker process draws from the same buckets.
+
+    acquire() reserves a token from the global bucket and from the chat's
+    bucket in one transaction and returns how long the caller must wait before
+    sending. Buckets may go negative, which queues callers in arrival order.
+    """
+
+    SCHEMA = [
+        '''CREATE TABLE IF NOT EXISTS buckets (
+            key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            blocked_until REAL NOT NULL DEFAULT 0
+        )'''
+    ]
+
+    # Chat buckets untouched for this long are deleted
+    IDLE_SECONDS = 3600
+
+    def __init__(self, path=RATE_LIMIT_DB):
+        self.store = SQLiteStore(path, self.SCHEMA)
+        self.acquired = 0
+        self.throttled = 0
+        self.retries = 0
+
+    def limits_for(self, chat_id):
+        """(rate per second, burst capacity) for a chat's bucket"""
+        try:
+            is_private = int(chat_id) > 0
+        except (TypeError, ValueError):
+            # '@channelusername'
+            is_private = False
+        if is_private:
+            return RATE_LIMIT_PRIVATE_PER_SEC, RATE_LIMIT_PRIVATE_BURST
+        return RATE_LIMIT_GROUP_PER_MIN / 60.0, RATE_LIMIT_GROUP_PER_MIN
+
+    def _take(self, conn, key, rate, capacity, now):
+        row = conn.execute('SELECT tokens, updated_at, blocked_until FROM buckets WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            tokens, blocked_until = capacity, 0
+        else:
+            tokens = min(capacity, row[0] + (now - row[1]) * rate)
+            blocked_until = row[2]
+        tokens -= 1
+        conn.execute(
+            'INSERT OR REPLACE INTO buckets (key, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?)',
+            (key, tokens, now, blocked_until)
+        )
+        wait = -tokens / rate if tokens < 0 else 0
+        return max(wait, blocked_until - now)
+
+    def acquire(self, method, chat_id=None):
+        """Reserve a send slot and sleep until it is due"""
+        wait = self.reserve(method, chat_id)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def reserve(self, method, chat_id=None):
+        """Reserve a send slot and return how many seconds until it is due (asyncio callers sleep themselves)"""
+        if method in UNLIMITED_METHODS:
+            return 0
+        now = time.time()
+        with self.store.transaction() as conn:
+            wait = self._take(conn, 'global', RATE_LIMIT_GLOBAL_PER_SEC, RATE_LIMIT_GLOBAL_PER_SEC, now)
+            if chat_id is not None:
+                rate, capacity = self.limits_for(chat_id)
+                wait = max(wait, self._take(conn, f'chat:{chat_id}', rate, capacity, now))
+        self.acquired += 1
+        if self.acquired % 1000 == 0:
+            self.store.execute("DELETE FROM buckets WHERE key != 'global' AND updated_at < ?", (now - self.IDLE_SECONDS,))
+        if wait > 0:
+            self.throttled += 1
+        return wait
+
+    def block(self, chat_id, seconds):
+        """Honour a 429 retry_after: hold back every worker sending to this chat (or everything)"""
+        if chat_id is not None:
+            key, capacity = f'chat:{chat_id}', self.limits_for(chat_id)[1]
+        else:
+            key, capacity = 'global', RATE_LIMIT_GLOBAL_PER_SEC
+        now = time.time()
+        self.retries += 1
+        with self.store.transaction() as conn:
+            conn.execute('INSERT OR IGNORE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)', (key, capacity, now))
+            conn.execute('UPDATE buckets SET blocked_until = ? WHERE key = ?', (now + seconds, key))
+
+    def stats(self):
+        return {'acquired': self.acquired, 'throttled': self.throttled, 'retries_after_429': self.retries}
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,124 @@
+import callback_codec
+
+
+class PrefixTrie:
+    """Trie keyed on '_'-terminated segments, returning the longest registered prefix of a string.
+
+    Callback namespaces always end at a separator, so walking whole segments
+    costs one dict lookup per segment instead of one per character.
+    """
+
+    _VALUE = object()
+
+    def __init__(self, separator='_'):
+        self.separator = separator
+        self.root = {}
+
+    def insert(self, prefix, value):
+        node = self.root
+        start = 0
+        while start < len(prefix):
+            end = prefix.find(self.separator, start)
+            end = len(prefix) if end == -1 else end + 1
+            node = node.setdefault(prefix[start:end], {})
+            start = end
+        node[self._VALUE] = value
+
+    def longest_prefix(self, text):
+        node = self.root
+        best = (0, None)
+        start = 0
+        while True:
+            end = text.find(self.separator, start)
+            if end == -1:
+                return best
+            end += 1
+            node = node.get(text[start:end])
+            if node is None:
+                return best
+            if self._VALUE in node:
+                best = (end, node[self._VALUE])
+                if len(node) == 1:
+                    return best
+            start = end
+
+
+class Route:
+    def __init__(self, handler, fields=None):
+        self.handler = handler
+        self.fields = fields
+
+    def parse(self, payload):
+        """Split a callback payload into `fields` leading arguments plus the remainder"""
+        if self.fields is None:
+            return payload
+        if self.fields == 0:
+            return [payload]
+        return payload.split('_', self.fields)
+
+
+class Router:
+    """Table-driven dispatch for bot commands and callback_data.
+
+    Commands are matched by an exact dict lookup on the first word (lowercased,
+    with any @botname suffix removed). Callback data is matched exactly first,
+    then by its callback_codec action character, then by the longest
+    registered legacy namespace prefix, and split into arguments once at
+    dispatch time.
+    """
+
+    def __init__(self):
+        self.commands = {}
+        self.exact_callbacks = {}
+        self.coded_callbacks = {}
+        self.callback_prefixes = PrefixTrie()
+
+    def command(self, *names):
+        def decorator(handler):
+            for name in names:
+                self.commands[name.lower()] = handler
+            return handler
+        return decorator
+
+    def callback(self, data=None, action=None, prefix=None, fields=None):
+        """Register an exact callback_data value, a callback_codec action or a prefix namespace.
+
+        Action handlers receive the decoded argument list. For prefix routes,
+        `fields` is the number of '_'-separated arguments to split off before
+        the remainder (usually a cache id that may itself contain underscores).
+        Leave it as None to receive the raw payload.
+        """
+        def decorator(handler):
+            if data is not None:
+                self.exact_callbacks[data] = handler
+            if action is not None:
+                self.coded_callbacks[callback_codec.ACTION_CODES[action]] = handler
+            if prefix is not None:
+                self.callback_prefixes.insert(prefix, Route(handler, fields))
+            return handler
+        return decorator
+
+    def match_command(self, text):
+        """Return (handler, args) for a '/command args' message, or (None, None)"""
+        if not text or text[0] != '/':
+            return None, None
+        parts = text.split(None, 1)
+        name = parts[0].split('@', 1)[0].lower()
+        handler = self.commands.get(name)
+        if handler is None:
+            return None, None
+        return handler, parts[1].strip() if len(parts) > 1 else ''
+
+    def match_callback(self, data):
+        """Return (handler, args) for callback_data, or (None, None)"""
+        handler = self.exact_callbacks.get(data)
+        if handler is not None:
+            return handler, None
+        code, args = callback_codec.decode(data)
+        if code is not None:
+            handler = self.coded_callbacks.get(code)
+            return (handler, args) if handler is not None else (None, None)
+        length, route = self.callback_prefixes.longest_prefix(data)
+        if route is None:
+            return None, None
+        return route.handler, route.parse(data[length:])
@@ -0,0 +1,46 @@
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    """Thread-local SQLite connections to a WAL database shared by every process on the host"""
+
+    def __init__(self, path, schema=None):
+        self.path = path
+        self.schema = schema or []
+        self._local = threading.local()
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            for statement in self.schema:
+                conn.execute(statement)
+            self._local.conn = conn
+        return conn
+
+    def execute(self, sql, params=()):
+        return self.connection().execute(sql, params)
+
+    def transaction(self):
+        """BEGIN IMMEDIATE so read-modify-write sequences are atomic across processes"""
+        return _Transaction(self.connection())
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute('COMMIT')
+        else:
+            self.conn.execute('ROLLBACK')
+        return False
@@ -0,0 +1,334 @@
+import json
+import threading
+import time
+from sqlite_store import SQLiteStore
+from ttl_cache import TTLCache
+from config import (
+    STATE_BACKEND, STATE_DB, DATABASE_URL, STATE_PG_POOL_SIZE,
+    CACHE_DEFAULT_TTL, CACHE_TTLS, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES
+)
+
+# Persistent backends delete expired rows and enforce the size limits once every this many writes
+SWEEP_EVERY = 200
+
+
+def keys_to_evict(rows, entries, size, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+    """Keys to drop, from (key, size) rows oldest first, so a namespace fits its entry and byte limits"""
+    excess_entries = entries - max_entries
+    excess_bytes = size - max_bytes
+    keys = []
+    for key, row_size in rows:
+        if excess_entries <= 0 and excess_bytes <= 0:
+            break
+        keys.append(key)
+        excess_entries -= 1
+        excess_bytes -= row_size or 0
+    return keys
+
+
+class CacheCounters:
+    """Per-namespace hit/miss/eviction counts of a persistent backend, as seen by this process"""
+
+    FIELDS = ('hits', 'misses', 'evictions', 'expirations')
+
+    def __init__(self):
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def add(self, namespace, field, count=1):
+        with self._lock:
+            counts = self.counts.setdefault(namespace, dict.fromkeys(self.FIELDS, 0))
+            counts[field] += count
+
+    def snapshot(self, sizes):
+        """TTLCache.stats()-shaped dicts; sizes maps namespace -> (entries, bytes) from the store"""
+        with self._lock:
+            counts = {namespace: dict(values) for namespace, values in self.counts.items()}
+        stats = {}
+        for namespace in set(counts) | set(sizes):
+            entries, size = sizes.get(namespace, (0, 0))
+            stats[namespace] = dict(counts.get(namespace, dict.fromkeys(self.FIELDS, 0)), entries=entries, bytes=size)
+        return stats
+
+
+class MemoryBackend:
+    """Per-process state. Only correct with a single gunicorn worker."""
+
+    def __init__(self):
+        self.caches = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def cache(self, namespace):
+        with self._lock:
+            cache = self.caches.get(namespace)
+            if cache is None:
+                cache = self.caches[namespace] = TTLCache(None, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, name=namespace)
+            return cache
+
+    def get(self, namespace, key):
+        return self.cache(namespace).get(key)
+
+    def set(self, namespace, key, value, ttl=None):
+        # The namespace ttl is passed on every write, so the cache itself never expires by default
+        self.cache(namespace).set(key, value, ttl)
+
+    def delete(self, namespace, key):
+        return self.cache(namespace).delete(key)
+
+    def allocate_ids(self, name, count):
+        """Reserve `count` consecutive ids and return the first one"""
+        with self._lock:
+            # Start from the clock so ids from before a restart are never handed out again
+            start = max(self.counters.get(name, 0), int(time.time() * 1000))
+            self.counters[name] = start + count
+            return start
+
+    def stats(self):
+        with self._lock:
+            caches = list(self.caches.items())
+        return {namespace: cache.stats() for namespace, cache in caches}
+
+
+class SQLiteBackend:
+    """State shared by every worker process on this host through a WAL database"""
+
+    SCHEMA = [
+        '''CREATE TABLE IF NOT EXISTS state (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            expires_at REAL,
+            PRIMARY KEY (namespace, key)
+        )''',
+        'CREATE INDEX IF NOT EXISTS state_expires_at ON state (expires_at)',
+        'CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)'
+    ]
+
+    def __init__(self, path=STATE_DB, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.store = SQLiteStore(path, self.SCHEMA)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.writes = 0
+        self.cache_stats = CacheCounters()
+
+    def get(self, namespace, key):
+        row = self.store.execute(
+            'SELECT value FROM state WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)',
+            (namespace, key, time.time())
+        ).fetchone()
+        self.cache_stats.add(namespace, 'hits' if row else 'misses')
+        return json.loads(row[0]) if row else None
+
+    def set(self, namespace, key, value, ttl=None):
+        now = time.time()
+        self.store.execute(
+            'INSERT OR REPLACE INTO state (namespace, key, value, updated_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+            (namespace, key, json.dumps(value), now, now + ttl if ttl is not None else None)
+        )
+        self.writes += 1
+        if self.writes % SWEEP_EVERY == 0:
+            self._sweep(now)
+
+    def _sweep(self, now):
+        """Delete expired rows, then the oldest rows of any namespace over its entry or byte limit"""
+        evicted = []
+        with self.store.transaction() as conn:
+            expired = conn.execute('SELECT namespace, COUNT(*) FROM state WHERE expires_at <= ? GROUP BY namespace', (now,)).fetchall()
+            conn.execute('DELETE FROM state WHERE expires_at <= ?', (now,))
+            for namespace, entries, size in conn.execute('SELECT namespace, COUNT(*), SUM(length(value)) FROM state GROUP BY namespace').fetchall():
+                if entries <= self.max_entries and size <= self.max_bytes:
+                    continue
+                rows = conn.execute('SELECT key, length(value) FROM state WHERE namespace = ? ORDER BY updated_at', (namespace,)).fetchall()
+                keys = keys_to_evict(rows, entries, size, self.max_entries, self.max_bytes)
+                conn.executemany('DELETE FROM state WHERE namespace = ? AND key = ?', [(namespace, key) for key in keys])
+                evicted.append((namespace, len(keys)))
+        for namespace, count in expired:
+            self.cache_stats.add(namespace, 'expirations', count)
+        for namespace, count in evicted:
+            self.cache_stats.add(namespace, 'evictions', count)
+
+    def delete(self, namespace, key):
+        cursor = self.store.execute('DELETE FROM state WHERE namespace = ? AND key = ?', (namespace, key))
+        return cursor.rowcount > 0
+
+    def stats(self):
+        rows = self.store.execute(
+            'SELECT namespace, COUNT(*), SUM(length(value)) FROM state WHERE expires_at IS NULL OR expires_at > ? GROUP BY namespace',
+            (time.time(),)
+        ).fetchall()
+        return self.cache_stats.snapshot({namespace: (entries, size) for namespace, entries, size in rows})
+
+    def allocate_ids(self, name, count):
+        with self.store.transaction() as conn:
+            conn.execute('INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)', (name,))
+            conn.execute('UPDATE counters SET value = value + ? WHERE name = ?', (count, name))
+            value = conn.execute('SELECT value FROM counters WHERE name = ?', (name,)).fetchone()[0]
+        return value - count
+
+
+class PostgresBackend:
+    """State shared across hosts through Postgres (DATABASE_URL)"""
+
+    SCHEMA = '''CREATE TABLE IF NOT EXISTS bot_state (
+        namespace TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value JSONB NOT NULL,
+        updated_at DOUBLE PRECISION NOT NULL,
+        expires_at DOUBLE PRECISION,
+        PRIMARY KEY (namespace, key)
+    );
+    CREATE TABLE IF NOT EXISTS bot_counters (name TEXT PRIMARY KEY, value BIGINT NOT NULL)'''
+
+    def __init__(self, dsn=DATABASE_URL, pool_size=STATE_PG_POOL_SIZE, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.dsn = dsn
+        self.pool_size = pool_size
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.pool = None
+        self.writes = 0
+        self.cache_stats = CacheCounters()
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        # Created on first use so gunicorn workers never share a forked connection
+        with self._lock:
+            if self.pool is None:
+                from psycopg2.pool import ThreadedConnectionPool
+                self.pool = ThreadedConnectionPool(1, self.pool_size, self.dsn)
+                self._run(self.SCHEMA)
+            return self.pool
+
+    def _run(self, sql, params=(), fetch=False):
+        pool = self.pool
+        conn = pool.getconn()
+        try:
+            with conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(sql, params)
+                    if fetch == 'all':
+                        return cursor.fetchall()
+                    if fetch:
+                        return cursor.fetchone()
+                    return cursor.rowcount
+        finally:
+            pool.putconn(conn)
+
+    def get(self, namespace, key):
+        self._get_pool()
+        row = self._run(
+            'SELECT value FROM bot_state WHERE namespace = %s AND key = %s AND (expires_at IS NULL OR expires_at > %s)',
+            (namespace, key, time.time()), fetch=True
+        )
+        self.cache_stats.add(namespace, 'hits' if row else 'misses')
+        return row[0] if row else None
+
+    def set(self, namespace, key, value, ttl=None):
+        self._get_pool()
+        now = time.time()
+        self._run(
+            '''INSERT INTO bot_state (namespace, key, value, updated_at, expires_at) VALUES (%s, %s, %s, %s, %s)
+               ON CONFLICT (namespace, key) DO UPDATE
+               SET value = EXCLUDED.value, updated_at = EXCLUDED.updated_at, expires_at = EXCLUDED.expires_at''',
+            (namespace, key, json.dumps(value), now, now + ttl if ttl is not None else None)
+        )
+        self.writes += 1
+        if self.writes % SWEEP_EVERY == 0:
+            self._sweep(now)
+
+    def _sweep(self, now):
+        """Delete expired rows, then the oldest rows of any namespace over its entry or byte limit"""
+        for (namespace,) in self._run('DELETE FROM bot_state WHERE expires_at <= %s RETURNING namespace', (now,), fetch='all'):
+            self.cache_stats.add(namespace, 'expirations')
+        for namespace, entries, size in self._run(
+            'SELECT namespace, COUNT(*), SUM(octet_length(value::text)) FROM bot_state GROUP BY namespace', fetch='all'
+        ):
+            if entries <= self.max_entries and size <= self.max_bytes:
+                continue
+            rows = self._run(
+                'SELECT key, octet_length(value::text) FROM bot_state WHERE namespace = %s ORDER BY updated_at', (namespace,), fetch='all'
+            )
+            keys = keys_to_evict(rows, entries, size, self.max_entries, self.max_bytes)
+            self.cache_stats.add(namespace, 'evictions', self._run(
+                'DELETE FROM bot_state WHERE namespace = %s AND key = ANY(%s)', (namespace, keys)
+            ))
+
+    def delete(self, namespace, key):
+        self._get_pool()
+        return self._run('DELETE FROM bot_state WHERE namespace = %s AND key = %s', (namespace, key)) > 0
+
+    def stats(self):
+        self._get_pool()
+        rows = self._run(
+            'SELECT namespace, COUNT(*), SUM(octet_length(value::text)) FROM bot_state WHERE expires_at IS NULL OR expires_at > %s GROUP BY namespace',
+            (time.time(),), fetch='all'
+        )
+        return self.cache_stats.snapshot({namespace: (entries, int(size)) for namespace, entries, size in rows})
+
+    def allocate_ids(self, name, count):
+        self._get_pool()
+        row = self._run(
+            '''INSERT INTO bot_counters (name, value) VALUES (%s, %s)
+               ON CONFLICT (name) DO UPDATE SET value = bot_counters.value + EXCLUDED.value
+               RETURNING value''',
+            (name, count), fetch=True
+        )
+        return row[0] - count
+
+
+class StateNamespace:
+    """Dict-like view of one namespace in a state backend.
+
+    Values must be JSON-serializable and expire after the namespace's ttl
+    (CACHE_TTLS). Deleting a missing key is a no-op, since another worker may
+    already have consumed the entry.
+    """
+
+    def __init__(self, backend, namespace):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = CACHE_TTLS.get(namespace, CACHE_DEFAULT_TTL)
+
+    def get(self, key, default=None):
+        value = self.backend.get(self.namespace, key)
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        value = self.backend.get(self.namespace, key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.backend.set(self.namespace, key, value, self.ttl)
+
+    def __delitem__(self, key):
+        self.backend.delete(self.namespace, key)
+
+    def __contains__(self, key):
+        return self.backend.get(self.namespace, key) is not None
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        self.backend.delete(self.namespace, key)
+        return value
+
+
+def create_backend(kind=STATE_BACKEND):
+    if kind == 'memory':
+        return MemoryBackend()
+    if kind == 'sqlite':
+        return SQLiteBackend()
+    if kind == 'postgres':
+        if not DATABASE_URL:
+            raise Exception("STATE_BACKEND=postgres requires DATABASE_URL")
+        return PostgresBackend()
+    raise Exception(f"Unknown STATE_BACKEND: {kind}")
+
+
+backend = create_backend()
+
+
+def namespace(name):
+    return StateNamespace(backend, name)
@@ -1,27 +1,83 @@
 import os
 import time
-import requests
+import sqlite3
+import threading
 import tempfile
-from config import TELEGRAM_API, MAX_FILE_SIZE_BYTES
+from config import (
+    TELEGRAM_API_URL, MAX_FILE_SIZE_BYTES, TELEGRAM_POOL_SIZE, TELEGRAM_WARM_CONNECTIONS, RATE_LIMIT_MAX_RETRIES,
+    PROGRESS_STATES, PROGRESS_STEP_SECONDS, TELEGRAM_LOCAL_MODE, TELEGRAM_LOCAL_PATHS
+)
+from edit_coalescer import EditCoalescer
+from chat_actions import ChatActionKeeper
+from helpers import strip_html_tags
+from http_pool import PooledSession
+from multipart import MultipartEncoder
+from metrics import telegram_api_latency
+from rate_limiter import rate_limiter
+from user_registry import user_registry
+from broadcast import Broadcaster
+from media_group import MediaGroupSender
 
 
 class TelegramHandlers:
     def __init__(self, bot_token, owner_id):
         self.bot_token = bot_token
         self.owner_id = owner_id
-        self.api_base = f"https://api.telegram.org/bot{bot_token}"
+        self.api_base = f"{TELEGRAM_API_URL}/bot{bot_token}"
+        self.http = PooledSession(TELEGRAM_POOL_SIZE)
+        self.edits = EditCoalescer(self._make_request)
+        self.actions = ChatActionKeeper(self._send_chat_action)
     
-    def _make_request(self, method, data=None, files=None, timeout=120):
+    def _make_request(self, method, data=None, files=None, timeout=120, progress=None, cancel=None):
+        chat_id = data.get('chat_id') if data else None
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            try:
+                rate_limiter.acquire(method, chat_id)
+            except sqlite3.Error as e:
+                # A locked or broken limiter database must not stop the bot from answering
+                print(f"[TelegramHandlers] Rate limiter error, sending unthrottled: {e}")
+            result = self._send_request(method, data, files, timeout, progress, cancel)
+            
+            retry_after = (result.get('parameters') or {}).get('retry_after')
+            if result.get('error_code') != 429 or not retry_after or attempt == RATE_LIMIT_MAX_RETRIES:
+                return result
+            
+            print(f"[TelegramHandlers] {method} throttled for chat {chat_id}, retrying in {retry_after}s")
+            try:
+                rate_limiter.block(chat_id, retry_after)
+            except sqlite3.Error as e:
+                print(f"[TelegramHandlers] Rate limiter error, waiting out retry_after here: {e}")
+                time.sleep(retry_after)
+        return result
+    
+    def _send_request(self, method, data, files, timeout, progress=None, cancel=None):
+        started = time.perf_counter()
         try:
             url = f"{self.api_base}/{method}"
             if files:
-                response = requests.post(url, data=data, files=files, timeout=timeout)
+                # A fresh encoder per attempt rewinds the files for a retry
+                body = MultipartEncoder(data, files, progress=progress, cancel=cancel)
+                response = self.http.post(url, data=body, headers={'Content-Type': body.content_type}, timeout=timeout)
             else:
-                response = requests.post(url, json=data, timeout=timeout)
+                response = self.http.post(url, json=data, timeout=timeout)
             return response.json()
         except Exception as e:
+            if cancel is not None and cancel.is_set():
+                print(f"[TelegramHandlers] {method} upload cancelled")
+                return {'ok': False, 'error': 'cancelled', 'description': 'Upload cancelled'}
             print(f"[TelegramHandlers] Request error: {e}")
             return {'ok': False, 'error': str(e)}
+        finally:
+            telegram_api_latency.observe(time.perf_counter() - started)
+    
+    def warm_up(self, connections=TELEGRAM_WARM_CONNECTIONS):
+        """Open keep-alive connections ahead of the first update with parallel getMe calls"""
+        threads = [threading.Thread(target=self._make_request, args=('getMe',), kwargs={'timeout': 10}) for _ in range(connections)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        print(f"[TelegramHandlers] Warmed up {connections} connections: {self.http.stats()}")
     
     def send_message(self, chat_id, text, reply_to_message_id=None, reply_markup=None):
         data = {
@@ -39,7 +95,7 @@ class TelegramHandlers:
             return result.get('result', {}).get('message_id')
         return None
     
-    def edit_message(self, chat_id, message_id, text, reply_markup=None):
+    def _edit_data(self, chat_id, message_id, text, reply_markup):
         data = {
             'chat_id': chat_id,
             'message_id': message_id,
@@ -48,16 +104,44 @@ class TelegramHandlers:
         }
         if reply_markup:
             data['reply_markup'] = {'inline_keyboard': reply_markup}
-        return self._make_request('editMessageText', data)
+        return data
+    
+    def edit_message(self, chat_id, message_id, text, reply_markup=None):
+        """Final edit: sent right away, replacing any status edit still pending for the message"""
+        data = self._edit_data(chat_id, message_id, text, reply_markup)
+        return self.edits.finalize(chat_id, message_id, 'editMessageText', data)
+    
+    def edit_status(self, chat_id, message_id, text, reply_markup=None):
+        """Intermediate status edit: coalesced so only the latest text is sent, at most once per EDIT_MIN_INTERVAL"""
+        data = self._edit_data(chat_id, message_id, text, reply_markup)
+        return self.edits.submit(chat_id, message_id, 'editMessageText', data)
     
     def delete_message(self, chat_id, message_id):
+        self.edits.close(chat_id, message_id)
         data = {
             'chat_id': chat_id,
             'message_id': message_id
         }
         return self._make_request('deleteMessage', data)
     
+    def simulate_progress(self, chat_id, message_id, reply_to_message_id=None):
+        """Schedule the progress button steps; any left once the message gets its final edit or is deleted are dropped"""
+        for step, state in enumerate(PROGRESS_STATES[1:-1], 1):
+            data = {
+                'chat_id': chat_id,
+                'message_id': message_id,
+                'reply_markup': {'inline_keyboard': [[{"text": strip_html_tags(state['text']), "callback_data": "ignore_progress"}]]}
+            }
+            self.edits.submit_later(step * PROGRESS_STEP_SECONDS, chat_id, message_id, 'editMessageReplyMarkup', data)
+    
     def send_action(self, chat_id, action):
+        """Show the action until the current job finishes (see ChatActionKeeper)"""
+        self.actions.hold(chat_id, action)
+    
+    def stop_action(self, chat_id=None):
+        self.actions.release(chat_id)
+    
+    def _send_chat_action(self, chat_id, action):
         data = {
             'chat_id': chat_id,
             'action': action
@@ -81,7 +165,19 @@ class TelegramHandlers:
     def send_photo_with_caption(self, chat_id, photo_url, caption, reply_to_message_id=None, reply_markup=None):
         return self.send_photo(chat_id, photo_url, caption, reply_to_message_id, reply_markup)
     
-    def send_photo_file(self, chat_id, file_path, caption=None, reply_to_message_id=None, reply_markup=None):
+    def _send_file(self, method, field, data, file_path, timeout=120, progress=None, cancel=None):
+        if TELEGRAM_LOCAL_PATHS:
+            # The local Bot API server reads the file itself: nothing passes through this process
+            data[field] = 'file://' + os.path.abspath(file_path)
+            result = self._make_request(method, data, timeout=timeout)
+            if progress and result.get('ok'):
+                size = os.path.getsize(file_path)
+                progress(size, size)
+            return result
+        with open(file_path, 'rb') as f:
+            return self._make_request(method, data, {field: f}, timeout, progress=progress, cancel=cancel)
+    
+    def send_photo_file(self, chat_id, file_path, caption=None, reply_to_message_id=None, reply_markup=None, progress=None, cancel=None):
         data = {
             'chat_id': chat_id,
             'parse_mode': 'HTML'
@@ -91,35 +187,15 @@ class TelegramHandlers:
         if reply_to_message_id:
             data['reply_to_message_id'] = reply_to_message_id
         if reply_markup:
-            data['reply_markup'] = str({'inline_keyboard': reply_markup})
+            data['reply_markup'] = {'inline_keyboard': reply_markup}
         
-        with open(file_path, 'rb') as photo:
-            files = {'photo': photo}
-            return self._make_request('sendPhoto', data, files)
+        return self._send_file('sendPhoto', 'photo', data, file_path, progress=progress, cancel=cancel)
     
     def send_photos(self, chat_id, photo_urls, caption, reply_to_message_id=None, reply_markup=None):
+        """Send any number of photos as ordered media groups (see MediaGroupSender)"""
         if not photo_urls:
             return None
-        
-        if len(photo_urls) == 1:
-            return self.send_photo(chat_id, photo_urls[0], caption, reply_to_message_id, reply_markup)
-        
-        media = []
-        for i, url in enumerate(photo_urls[:10]):
-            item = {'type': 'photo', 'media': url}
-            if i == 0 and caption:
-                item['caption'] = caption
-                item['parse_mode'] = 'HTML'
-            media.append(item)
-        
-        data = {
-            'chat_id': chat_id,
-            'media': media
-        }
-        if reply_to_message_id:
-            data['reply_to_message_id'] = reply_to_message_id
-        
-        return self._make_request('sendMediaGroup', data)
+        return MediaGroupSender(self).send(chat_id, photo_urls, caption, reply_to_message_id, reply_markup)
     
     def send_video(self, chat_id, video_url, caption=None, reply_to_message_id=None, thumbnail=None, reply_markup=None):
         data = {
@@ -143,7 +219,7 @@ class TelegramHandlers:
             result = self.send_video(chat_id, sd_url, caption, reply_to_message_id, thumbnail, reply_markup)
         return result
     
-    def send_video_file(self, chat_id, file_path, caption=None, reply_to_message_id=None, thumbnail=None, reply_markup=None):
+    def send_video_file(self, chat_id, file_path, caption=None, reply_to_message_id=None, thumbnail=None, reply_markup=None, progress=None, cancel=None):
         data = {
             'chat_id': chat_id,
             'parse_mode': 'HTML'
@@ -153,11 +229,9 @@ class TelegramHandlers:
         if reply_to_message_id:
             data['reply_to_message_id'] = reply_to_message_id
         if reply_markup:
-            data['reply_markup'] = str({'inline_keyboard': reply_markup})
+            data['reply_markup'] = {'inline_keyboard': reply_markup}
         
-        with open(file_path, 'rb') as video:
-            files = {'video': video}
-            return self._make_request('sendVideo', data, files, timeout=300)
+        return self._send_file('sendVideo', 'video', data, file_path, timeout=300, progress=progress, cancel=cancel)
     
     def send_audio(self, chat_id, audio_url, title=None, reply_to_message_id=None, reply_markup=None):
         data = {
@@ -173,7 +247,7 @@ class TelegramHandlers:
             data['reply_markup'] = {'inline_keyboard': reply_markup}
         return self._make_request('sendAudio', data)
     
-    def send_audio_file(self, chat_id, file_path, title=None, reply_to_message_id=None, reply_markup=None):
+    def send_audio_file(self, chat_id, file_path, title=None, reply_to_message_id=None, reply_markup=None, progress=None, cancel=None):
         data = {
             'chat_id': chat_id,
             'parse_mode': 'HTML'
@@ -183,11 +257,9 @@ class TelegramHandlers:
         if reply_to_message_id:
             data['reply_to_message_id'] = reply_to_message_id
         if reply_markup:
-            data['reply_markup'] = str({'inline_keyboard': reply_markup})
+            data['reply_markup'] = {'inline_keyboard': reply_markup}
         
-        with open(file_path, 'rb') as audio:
-            files = {'audio': audio}
-            return self._make_request('sendAudio', data, files, timeout=300)
+        return self._send_file('sendAudio', 'audio', data, file_path, timeout=300, progress=progress, cancel=cancel)
     
     def send_document(self, chat_id, document, caption=None, reply_to_message_id=None, reply_markup=None):
         data = {
@@ -203,7 +275,7 @@ class TelegramHandlers:
             data['reply_markup'] = {'inline_keyboard': reply_markup}
         return self._make_request('sendDocument', data)
     
-    def send_document_file(self, chat_id, file_path, caption=None, reply_to_message_id=None, reply_markup=None):
+    def send_document_file(self, chat_id, file_path, caption=None, reply_to_message_id=None, reply_markup=None, progress=None, cancel=None):
         data = {
             'chat_id': chat_id,
             'parse_mode': 'HTML'
@@ -213,11 +285,9 @@ class TelegramHandlers:
         if reply_to_message_id:
             data['reply_to_message_id'] = reply_to_message_id
         if reply_markup:
-            data['reply_markup'] = str({'inline_keyboard': reply_markup})
+            data['reply_markup'] = {'inline_keyboard': reply_markup}
         
-        with open(file_path, 'rb') as doc:
-            files = {'document': doc}
-            return self._make_request('sendDocument', data, files)
+        return self._send_file('sendDocument', 'document', data, file_path, progress=progress, cancel=cancel)
     
     def answer_callback_query(self, callback_query_id, text=None, show_alert=False):
         data = {
@@ -233,11 +303,25 @@ class TelegramHandlers:
         return self._make_request('getFile', data)
     
     def download_file(self, file_path):
-        url = f"https://api.telegram.org/file/bot{self.bot_token}/{file_path}"
+        if TELEGRAM_LOCAL_MODE and os.path.isabs(file_path) and os.path.exists(file_path):
+            # A --local server answers getFile with a path on its own disk
+            with open(file_path, 'rb') as f:
+                return f.read()
+        url = f"{TELEGRAM_API_URL}/file/bot{self.bot_token}/{file_path}"
         try:
-            response = requests.get(url, timeout=60)
+            response = self.http.get(url, timeout=60)
             if response.status_code == 200:
                 return response.content
         except Exception as e:
             print(f"[TelegramHandlers] Download file error: {e}")
         return None
+    
+    def save_user_id(self, chat_id):
+        user_registry.add(chat_id)
+    
+    def get_all_users_count(self):
+        return user_registry.count()
+    
+    def broadcast_message(self, from_chat_id, message_id, job=None, status_message_id=None):
+        """Copy a message to every active user; see Broadcaster"""
+        return Broadcaster(self).run(from_chat_id, message_id, job, status_message_id)
@@ -0,0 +1,133 @@
+import heapq
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def approx_size(value):
+    """Rough deep size in bytes of JSON-like data, used for the cache byte budget"""
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(approx_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry expiry, an entry limit and an approximate byte budget.
+
+    Expiry is driven by a heap of deadlines, so expired entries are dropped on
+    every access without scanning the whole cache. A ttl of None never expires.
+    """
+
+    def __init__(self, ttl=300, max_entries=10000, max_bytes=32 * 1024 * 1024, name='cache'):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.name = name
+        # key -> (value, expires_at, size), least recently used first
+        self.entries = OrderedDict()
+        self._deadlines = []
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            self._expire(time.time())
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        size = approx_size(value)
+        with self._lock:
+            self._remove(key)
+            self.entries[key] = (value, expires_at, size)
+            self.bytes += size
+            if expires_at is not None:
+                heapq.heappush(self._deadlines, (expires_at, key))
+            self._expire(now)
+            self._evict()
+
+    def delete(self, key):
+        with self._lock:
+            return self._remove(key)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            self._expire(time.time())
+            entry = self.entries.get(key)
+            self._remove(key)
+        return default if entry is None else entry[0]
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        self.bytes -= entry[2]
+        return True
+
+    def _expire(self, now):
+        deadlines = self._deadlines
+        while deadlines and deadlines[0][0] <= now:
+            expires_at, key = heapq.heappop(deadlines)
+            entry = self.entries.get(key)
+            # Deadlines of overwritten or deleted entries are stale and skipped
+            if entry is not None and entry[1] == expires_at:
+                self._remove(key)
+                self.expirations += 1
+        if len(deadlines) > 2 * len(self.entries) + 64:
+            self._deadlines = [(entry[1], key) for key, entry in self.entries.items() if entry[1] is not None]
+            heapq.heapify(self._deadlines)
+
+    def _evict(self):
+        while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+            key, entry = self.entries.popitem(last=False)
+            self.bytes -= entry[2]
+            self.evictions += 1
+
+    def __getitem__(self, key):
+        marker = object()
+        value = self.get(key, marker)
+        if value is marker:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        self.delete(key)
+
+    def __contains__(self, key):
+        with self._lock:
+            self._expire(time.time())
+            return key in self.entries
+
+    def __len__(self):
+        with self._lock:
+            self._expire(time.time())
+            return len(self.entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
@@ -4,10 +4,16 @@ import os
 import json
 import re
 import time
+import zlib
 import requests
 from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from functools import lru_cache
+from urllib.parse import urlparse, parse_qsl, urlencode
 from locoloader_scraper import scrape_locoloader, try_direct_scrape
+import ytdlp_pool
+from youtube import is_youtube_url, extract_video_id
+from ttl_cache import TTLCache
+from config import MEDIA_INFO_TTL, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES
 
 SUPPORTED_PLATFORMS = [
     'youtube', 'instagram', 'twitter', 'tiktok', 'facebook', 
@@ -26,8 +32,10 @@ SESSION_POOL.headers.update({
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
 })
 
-MEDIA_INFO_CACHE = {}
-CACHE_TTL = 300
+MEDIA_INFO_CACHE = TTLCache(MEDIA_INFO_TTL, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, name='media_info')
+# Raw `yt-dlp -j` output (zlib) for the same URLs, so the download reuses the preview's extraction.
+# Kept apart from MEDIA_INFO_CACHE because info dicts end up in state_backend and must stay small
+PROBE_CACHE = TTLCache(MEDIA_INFO_TTL, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, name='probe_json')
 
 EXECUTOR = ThreadPoolExecutor(max_workers=4)
 
@@ -87,17 +95,47 @@ def detect_platform(url):
 
 def get_cached_info(url):
     """Get cached media info if available and not expired"""
-    if url in MEDIA_INFO_CACHE:
-        cached = MEDIA_INFO_CACHE[url]
-        if time.time() - cached['timestamp'] < CACHE_TTL:
-            return cached['data']
-    return None
+    return MEDIA_INFO_CACHE.get(url)
 
 def cache_info(url, data):
-    """Cache media info with timestamp"""
-    MEDIA_INFO_CACHE[url] = {'data': data, 'timestamp': time.time()}
+    """Cache media info for MEDIA_INFO_TTL seconds"""
+    MEDIA_INFO_CACHE[url] = data
 
-def get_media_info(url):
+def write_probe(url, output_template):
+    """Write the cached probe for url next to the download, for --load-info-json; None when there is none"""
+    probe = PROBE_CACHE.get(url)
+    if probe is None:
+        return None
+    path = f"{output_template}_probe.json"
+    with open(path, 'wb') as f:
+        f.write(zlib.decompress(probe))
+    return path
+
+def remove_probe(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+def canonical_media_id(url):
+    """Stable id of the media behind a URL, shared by all its link forms (file_id cache key)"""
+    cached = get_cached_info(url)
+    if cached and cached.get('media_key'):
+        return cached['media_key']
+    if is_youtube_url(url):
+        video_id = extract_video_id(url)
+        if video_id:
+            # Same form as yt-dlp's extractor_key:id
+            return f"Youtube:{video_id}"
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or '').lower()
+    if host.startswith('www.') or host.startswith('m.'):
+        host = host.split('.', 1)[1]
+    query = [(k, v) for k, v in parse_qsl(parsed.query) if not k.startswith('utm_') and k not in ('si', 'igsh', 'feature')]
+    canonical = f"{host}{parsed.path.rstrip('/')}"
+    if query:
+        canonical += '?' + urlencode(sorted(query))
+    return f"url:{canonical}"
+
+def get_media_info(url, timeout=30):
     """Get media information using yt-dlp with caching"""
     cached = get_cached_info(url)
     if cached:
@@ -106,12 +144,13 @@ def get_media_info(url):
     
     try:
         cmd = ['yt-dlp', '-j', '--no-playlist', '--socket-timeout', '15', url]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        result = ytdlp_pool.run(cmd, timeout=timeout)
         
         if result.returncode != 0:
             return {'success': False, 'error': result.stderr or 'Failed to fetch info'}
         
         info = json.loads(result.stdout)
+        probe = zlib.compress(result.stdout.encode('utf-8'))
         
         formats = info.get('formats', [])
         available_formats = []
@@ -161,11 +200,13 @@ def get_media_info(url):
             'uploader': info.get('uploader', 'Unknown'),
             'view_count': info.get('view_count'),
             'platform': detect_platform(url),
+            'media_key': f"{info['extractor_key']}:{info['id']}" if info.get('extractor_key') and info.get('id') else None,
             'video_formats': dict(sorted_videos[:5]),
             'audio_formats': dict(sorted_audios[:3]),
             'url': url
         }
         cache_info(url, result)
+        PROBE_CACHE[url] = probe
         return result
         
     except subprocess.TimeoutExpired:
@@ -176,15 +217,13 @@ def get_media_info(url):
         return {'success': False, 'error': str(e)}
 
 def get_youtube_quality_options(url):
-    """Get simplified quality options for YouTube (user mode)"""
+    """Get simplified quality options for YouTube (user mode), from the same probe get_media_info caches"""
     try:
-        cmd = ['yt-dlp', '-j', '--no-playlist', url]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-        
-        if result.returncode != 0:
-            return {'success': False, 'error': result.stderr or 'Failed to fetch info'}
+        # YouTube format lists are slow to fetch; keep the 60s budget this probe always had
+        info = get_media_info(url, timeout=60)
         
-        info = json.loads(result.stdout)
+        if not info.get('success'):
+            return info
         
         options = []
         
@@ -222,10 +261,10 @@ def get_youtube_quality_options(url):
     except Exception as e:
         return {'success': False, 'error': str(e)}
 
-def download_with_ytdlp(url, format_type, quality, output_template):
-    """Download using yt-dlp (for ThreadPoolExecutor)"""
-    import glob as glob_module
-    
+def build_ytdlp_command(url, format_type, quality, output_template, format_id=None, info_json=None):
+    """Build the yt-dlp download command line (shared by the thread and asyncio paths)"""
+    # With a saved probe yt-dlp skips extraction; if its stream URLs fail it re-extracts from the page itself
+    source = ['--load-info-json', info_json] if info_json else [url]
     common_opts = [
         '--user-agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
         '--referer', url,
@@ -244,29 +283,34 @@ def download_with_ytdlp(url, format_type, quality, output_template):
     ]
     
     if format_type == 'audio':
-        cmd = [
-            'yt-dlp', '-x', '--audio-format', 'mp3',
+        # An exact format id from the preview skips yt-dlp's own format selection
+        selector = ['-f', f'{format_id}/bestaudio/best'] if format_id else []
+        return ['yt-dlp'] + selector + [
+            '-x', '--audio-format', 'mp3',
             '--audio-quality', '0',
             '-o', f"{output_template}.%(ext)s",
-        ] + common_opts + [url]
+        ] + common_opts + source
+    
+    if format_id:
+        format_str = f'{format_id}+bestaudio/{format_id}/best'
+    elif quality == '720':
+        format_str = 'bestvideo[height<=720]+bestaudio/best[height<=720]/best'
+    elif quality == '480':
+        format_str = 'bestvideo[height<=480]+bestaudio/best[height<=480]/best'
+    elif quality == '360':
+        format_str = 'bestvideo[height<=360]+bestaudio/best[height<=360]/best'
     else:
-        if quality == '720':
-            format_str = 'bestvideo[height<=720]+bestaudio/best[height<=720]/best'
-        elif quality == '480':
-            format_str = 'bestvideo[height<=480]+bestaudio/best[height<=480]/best'
-        elif quality == '360':
-            format_str = 'bestvideo[height<=360]+bestaudio/best[height<=360]/best'
-        else:
-            format_str = 'bestvideo+bestaudio/best'
-        
-        cmd = [
-            'yt-dlp', '-f', format_str,
-            '--merge-output-format', 'mp4',
-            '-o', f"{output_template}.%(ext)s",
-        ] + common_opts + [url]
+        format_str = 'bestvideo+bestaudio/best'
     
-    print(f"[yt-dlp] Running: {' '.join(cmd[:10])}...")
-    result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+    return [
+        'yt-dlp', '-f', format_str,
+        '--merge-output-format', 'mp4',
+        '-o', f"{output_template}.%(ext)s",
+    ] + common_opts + source
+
+def find_downloaded_file(output_template, format_type, stderr=None):
+    """Locate the file yt-dlp wrote for output_template"""
+    import glob as glob_module
     
     possible_files = glob_module.glob(f"{output_template}.*")
     
@@ -282,20 +326,52 @@ def download_with_ytdlp(url, format_type, quality, output_template):
     if possible_files:
         return {'success': True, 'path': possible_files[0], 'type': format_type}
     
-    return {'success': False, 'error': result.stderr or 'yt-dlp download failed'}
+    return {'success': False, 'error': stderr or 'yt-dlp download failed'}
+
+def download_with_ytdlp(url, format_type, quality, output_template, format_id=None):
+    """Download using yt-dlp (for ThreadPoolExecutor)"""
+    info_json = write_probe(url, output_template)
+    cmd = build_ytdlp_command(url, format_type, quality, output_template, format_id, info_json)
+    
+    print(f"[yt-dlp] Running{' from cached probe' if info_json else ''}: {' '.join(cmd[:10])}...")
+    try:
+        result = ytdlp_pool.run(cmd, timeout=300, pool='download')
+    finally:
+        remove_probe(info_json)
+    
+    return find_downloaded_file(output_template, format_type, result.stderr)
 
-def download_media(url, format_type='video', quality='best'):
+def download_fallbacks(url, format_type):
+    """DirectScrape and locoloader fallbacks for when yt-dlp fails"""
+    platform = detect_platform(url)
+    if platform not in ['youtube']:
+        print(f"[Downloader] Trying DirectScrape fallback for {platform}...")
+        direct_result = try_direct_scrape(url, format_type)
+        if direct_result.get('success'):
+            print(f"[Downloader] DirectScrape success: {direct_result.get('path')}")
+            return direct_result
+        
+        print(f"[Downloader] Trying locoloader scraper fallback...")
+        scraper_result = scrape_locoloader(url, format_type)
+        if scraper_result.get('success'):
+            print(f"[Downloader] Scraper success: {scraper_result.get('path')}")
+            return scraper_result
+    
+    return {'success': False, 'error': 'Download failed - please try again later'}
+
+def new_output_template():
+    return os.path.join(tempfile.gettempdir(), f"download_{int(time.time() * 1000)}")
+
+def download_media(url, format_type='video', quality='best', format_id=None):
     """Download media using yt-dlp with DirectScrape fallback"""
     try:
-        temp_dir = tempfile.gettempdir()
-        timestamp = int(time.time() * 1000)
-        output_template = os.path.join(temp_dir, f"download_{timestamp}")
+        output_template = new_output_template()
         
         print(f"[Downloader] Starting download for: {url}")
         print(f"[Downloader] Format: {format_type}, Quality: {quality}")
         
         try:
-            future = EXECUTOR.submit(download_with_ytdlp, url, format_type, quality, output_template)
+            future = EXECUTOR.submit(download_with_ytdlp, url, format_type, quality, output_template, format_id)
             result = future.result(timeout=300)
             
             if result.get('success'):
@@ -308,21 +384,7 @@ def download_media(url, format_type='video', quality='best'):
         except Exception as e:
             print(f"[Downloader] yt-dlp exception: {type(e).__name__}: {e}")
         
-        platform = detect_platform(url)
-        if platform not in ['youtube']:
-            print(f"[Downloader] Trying DirectScrape fallback for {platform}...")
-            direct_result = try_direct_scrape(url, format_type)
-            if direct_result.get('success'):
-                print(f"[Downloader] DirectScrape success: {direct_result.get('path')}")
-                return direct_result
-            
-            print(f"[Downloader] Trying locoloader scraper fallback...")
-            scraper_result = scrape_locoloader(url, format_type)
-            if scraper_result.get('success'):
-                print(f"[Downloader] Scraper success: {scraper_result.get('path')}")
-                return scraper_result
-        
-        return {'success': False, 'error': 'Download failed - please try again later'}
+        return download_fallbacks(url, format_type)
         
     except Exception as e:
         print(f"[Downloader] Error: {e}")
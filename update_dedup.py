@@ -0,0 +1,76 @@
+import sqlite3
+import threading
+from collections import deque
+from config import UPDATE_DEDUP_SIZE, UPDATE_DEDUP_DB
+from sqlite_store import SQLiteStore
+
+
+class UpdateDeduplicator:
+    """Remembers the most recent update_ids so Telegram retries are dropped before any work starts.
+
+    Each process keeps a fixed-size ring buffer plus a set for O(1) lookups. When a
+    database path is configured, a fixed-size slot table (slot = update_id % capacity)
+    is shared by all gunicorn workers on the host, so memory and disk stay constant.
+    """
+
+    def __init__(self, capacity=UPDATE_DEDUP_SIZE, shared_path=UPDATE_DEDUP_DB):
+        self.capacity = capacity
+        self._ring = deque(maxlen=capacity)
+        self._seen = set()
+        self._lock = threading.Lock()
+        self.duplicates = 0
+        self.store = None
+        if shared_path:
+            self.store = SQLiteStore(shared_path, [
+                'CREATE TABLE IF NOT EXISTS seen_updates (slot INTEGER PRIMARY KEY, update_id INTEGER NOT NULL)'
+            ])
+
+    def is_duplicate(self, update_id):
+        """Record update_id and return True if it was already seen"""
+        if update_id is None:
+            return False
+
+        with self._lock:
+            if update_id in self._seen:
+                self.duplicates += 1
+                return True
+            if len(self._ring) == self.capacity:
+                self._seen.discard(self._ring[0])
+            self._ring.append(update_id)
+            self._seen.add(update_id)
+
+        if self.store and self._seen_by_other_worker(update_id):
+            with self._lock:
+                self.duplicates += 1
+            return True
+        return False
+
+    def forget(self, update_id):
+        """Undo the record of an update that was turned away, so Telegram's redelivery is accepted"""
+        with self._lock:
+            if update_id in self._seen:
+                self._seen.discard(update_id)
+                self._ring.remove(update_id)
+
+        if self.store:
+            try:
+                with self.store.transaction() as conn:
+                    conn.execute('DELETE FROM seen_updates WHERE slot = ? AND update_id = ?', (update_id % self.capacity, update_id))
+            except sqlite3.Error as e:
+                print(f"[Dedup] Shared store error: {e}")
+
+    def _seen_by_other_worker(self, update_id):
+        slot = update_id % self.capacity
+        try:
+            with self.store.transaction() as conn:
+                row = conn.execute('SELECT update_id FROM seen_updates WHERE slot = ?', (slot,)).fetchone()
+                if row and row[0] == update_id:
+                    return True
+                conn.execute('INSERT OR REPLACE INTO seen_updates (slot, update_id) VALUES (?, ?)', (slot, update_id))
+            return False
+        except sqlite3.Error as e:
+            print(f"[Dedup] Shared store error: {e}")
+            return False
+
+
+update_deduplicator = UpdateDeduplicator()
@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from config import MAX_FILE_SIZE_BYTES, MTPROTO_MAX_FILE_SIZE_BYTES
+
+
+class Uploader:
+    """One entry point for sending local files, routed by size.
+
+    Files up to MAX_FILE_SIZE_BYTES go through the Bot API (send_*_file);
+    larger ones, or ones the Bot API rejects with 413, go through the MTProto
+    client up to MTPROTO_MAX_FILE_SIZE_BYTES. The same progress(sent, total)
+    callback works on both routes. Results carry the 'route' that was used.
+    """
+
+    def __init__(self, handlers, bot_api_limit=MAX_FILE_SIZE_BYTES, mtproto_limit=MTPROTO_MAX_FILE_SIZE_BYTES):
+        self.handlers = handlers
+        self.bot_api_limit = bot_api_limit
+        self.mtproto_limit = mtproto_limit
+        self.routes = {}
+        self._lock = threading.Lock()
+
+    def _mtproto(self):
+        # Imported on first large file: the module connects to Telegram as soon as it is loaded
+        from mtproto_client import mtproto_client
+        return mtproto_client if mtproto_client.is_available() else None
+
+    def route_for(self, size):
+        if size <= self.bot_api_limit:
+            return 'bot_api'
+        if size <= self.mtproto_limit:
+            return 'mtproto'
+        return None
+
+    def too_large(self, size):
+        return {'ok': False, 'description': f'File is {size // 1024 // 1024}MB, above the {self.mtproto_limit // 1024 // 1024}MB limit'}
+
+    def send_video(self, chat_id, file_path, caption=None, reply_to_message_id=None, reply_markup=None, progress=None):
+        return self._send(
+            file_path,
+            lambda: self.handlers.send_video_file(chat_id, file_path, caption, reply_to_message_id, reply_markup=reply_markup, progress=progress),
+            self._mtproto_sender('video', chat_id, file_path, caption, reply_to_message_id, progress)
+        )
+
+    def send_audio(self, chat_id, file_path, title=None, reply_to_message_id=None, reply_markup=None, progress=None):
+        return self._send(
+            file_path,
+            lambda: self.handlers.send_audio_file(chat_id, file_path, title, reply_to_message_id, reply_markup, progress=progress),
+            self._mtproto_sender('audio', chat_id, file_path, title, reply_to_message_id, progress)
+        )
+
+    def send_document(self, chat_id, file_path, caption=None, reply_to_message_id=None, reply_markup=None, progress=None):
+        return self._send(
+            file_path,
+            lambda: self.handlers.send_document_file(chat_id, file_path, caption, reply_to_message_id, reply_markup, progress=progress),
+            self._mtproto_sender('document', chat_id, file_path, caption, reply_to_message_id, progress)
+        )
+
+    def send_over_mtproto(self, kind, chat_id, file_path, text=None, reply_to_message_id=None, progress=None):
+        """The MTProto route alone, for callers that tried the Bot API themselves (the asyncio runtime)"""
+        size = os.path.getsize(file_path)
+        return self._over_mtproto(size, self._mtproto_sender(kind, chat_id, file_path, text, reply_to_message_id, progress))
+
+    def _mtproto_sender(self, kind, chat_id, file_path, text, reply_to_message_id, progress):
+        if kind == 'audio':
+            return lambda client: client.send_audio(chat_id, file_path, text, None, reply_to_message_id, progress)
+        if kind == 'document':
+            return lambda client: client.send_document(chat_id, file_path, text, reply_to_message_id, progress)
+        return lambda client: client.send_video(chat_id, file_path, text, reply_to_message_id, progress)
+
+    def _send(self, file_path, via_bot_api, via_mtproto):
+        size = os.path.getsize(file_path)
+        route = self.route_for(size)
+        if route is None:
+            return self.too_large(size)
+        
+        if route == 'bot_api':
+            result = self._timed('bot_api', size, via_bot_api)
+            if result.get('error_code') != 413:
+                return result
+            print(f"[Uploader] Bot API rejected {size} bytes as too large, retrying over MTProto")
+        
+        return self._over_mtproto(size, via_mtproto)
+
+    def _over_mtproto(self, size, via_mtproto):
+        client = self._mtproto()
+        if client is None:
+            return {'ok': False, 'description': 'File too large for the Bot API and MTProto is not configured (TELEGRAM_API_ID/TELEGRAM_API_HASH)'}
+        return self._timed('mtproto', size, lambda: via_mtproto(client))
+
+    def _timed(self, route, size, send):
+        started = time.time()
+        result = send() or {'ok': False, 'description': 'No response'}
+        return self.record(route, size, result, time.time() - started)
+
+    def record(self, route, size, result, elapsed):
+        """Count one finished upload in the per-route stats"""
+        elapsed = max(elapsed, 0.001)
+        ok = bool(result.get('ok'))
+        with self._lock:
+            stats = self.routes.setdefault(route, {'uploads': 0, 'failed': 0, 'bytes': 0, 'seconds': 0.0})
+            stats['uploads'] += 1
+            if ok:
+                stats['bytes'] += size
+                stats['seconds'] += elapsed
+            else:
+                stats['failed'] += 1
+        print(f"[Uploader] {size // 1024 // 1024}MB via {route} in {elapsed:.1f}s ({size / elapsed / 1024 / 1024:.2f} MB/s){'' if ok else ' - failed'}")
+        result['route'] = route
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                route: dict(stats, mb_per_sec=round(stats['bytes'] / stats['seconds'] / 1024 / 1024, 2) if stats['seconds'] else 0.0)
+                for route, stats in self.routes.items()
+            }
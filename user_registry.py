@@ -0,0 +1,241 @@
+import atexit
+import bisect
+import threading
+import time
+from array import array
+from sqlite_store import SQLiteStore
+from config import USERS_DB, USERS_FLUSH_SECONDS, STATE_BACKEND, DATABASE_URL
+
+# Changes are re-read with this much overlap so clock skew between hosts cannot hide one
+SYNC_OVERLAP_SECONDS = 60
+# More new ids than this in one sync rebuild the array in one sort instead of inserting one by one
+BULK_MERGE_THRESHOLD = 64
+
+
+class SQLiteUserStore:
+    SCHEMA = [
+        '''CREATE TABLE IF NOT EXISTS users (
+            chat_id INTEGER PRIMARY KEY,
+            active INTEGER NOT NULL DEFAULT 1,
+            updated_at REAL NOT NULL
+        )''',
+        'CREATE INDEX IF NOT EXISTS users_updated ON users (updated_at)'
+    ]
+
+    UPSERT = '''INSERT INTO users (chat_id, active, updated_at) VALUES (?, 1, ?)
+                ON CONFLICT(chat_id) DO UPDATE SET active = 1, updated_at = excluded.updated_at WHERE users.active = 0'''
+
+    def __init__(self, path=USERS_DB):
+        self.store = SQLiteStore(path, self.SCHEMA)
+
+    def add_many(self, chat_ids, now):
+        with self.store.transaction() as conn:
+            conn.executemany(self.UPSERT, [(chat_id, now) for chat_id in chat_ids])
+
+    def deactivate(self, chat_ids, now):
+        placeholders = ','.join('?' * len(chat_ids))
+        self.store.execute(f'UPDATE users SET active = 0, updated_at = ? WHERE chat_id IN ({placeholders})', [now] + list(chat_ids))
+
+    def changes_since(self, since):
+        return self.store.execute('SELECT chat_id, active FROM users WHERE updated_at >= ?', (since,)).fetchall()
+
+
+class PostgresUserStore:
+    """Same table in Postgres, for deployments where STATE_BACKEND=postgres spans several hosts"""
+
+    SCHEMA = '''CREATE TABLE IF NOT EXISTS bot_users (
+        chat_id BIGINT PRIMARY KEY,
+        active BOOLEAN NOT NULL DEFAULT TRUE,
+        updated_at DOUBLE PRECISION NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS bot_users_updated ON bot_users (updated_at)'''
+
+    UPSERT = '''INSERT INTO bot_users (chat_id, active, updated_at) VALUES %s
+                ON CONFLICT (chat_id) DO UPDATE SET active = TRUE, updated_at = EXCLUDED.updated_at WHERE bot_users.active = FALSE'''
+
+    def __init__(self, dsn=DATABASE_URL):
+        self.dsn = dsn
+        self.conn = None
+        self._lock = threading.Lock()
+
+    def _run(self, sql, params=(), fetch=False, values=None):
+        # One connection, only ever used by the flush thread and rare prunes
+        with self._lock:
+            if self.conn is None:
+                import psycopg2
+                self.conn = psycopg2.connect(self.dsn)
+                with self.conn, self.conn.cursor() as cursor:
+                    cursor.execute(self.SCHEMA)
+            with self.conn, self.conn.cursor() as cursor:
+                if values is not None:
+                    from psycopg2.extras import execute_values
+                    execute_values(cursor, sql, values)
+                else:
+                    cursor.execute(sql, params)
+                if fetch:
+                    return cursor.fetchall()
+
+    def add_many(self, chat_ids, now):
+        self._run(self.UPSERT, values=[(chat_id, True, now) for chat_id in chat_ids])
+
+    def deactivate(self, chat_ids, now):
+        self._run('UPDATE bot_users SET active = FALSE, updated_at = %s WHERE chat_id = ANY(%s)', (now, list(chat_ids)))
+
+    def changes_since(self, since):
+        return self._run('SELECT chat_id, active FROM bot_users WHERE updated_at >= %s', (since,), fetch=True)
+
+
+class UserRegistry:
+    """Chats that have talked to the bot, with writes batched behind an in-memory copy.
+
+    Chat ids live only in a sorted array('q'), 8 bytes each, searched with
+    bisect, so add() for a known chat is a binary search. New chats are
+    queued and written in one bulk upsert every USERS_FLUSH_SECONDS by a
+    background thread, which also pulls chats added by other workers. Chats
+    that blocked the bot stay in the array and are skipped through the
+    (small) `blocked` set.
+    """
+
+    def __init__(self, store, flush_seconds=USERS_FLUSH_SECONDS):
+        self.store = store
+        self.flush_seconds = flush_seconds
+        self.ids = array('q')
+        self.blocked = set()
+        self.pending = set()
+        self.last_sync = 0
+        self.flushed = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_started(self):
+        # Load and start the flusher on first use so gunicorn forks before any thread exists
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._apply(self.store.changes_since(0), time.time())
+            self._loaded = True
+            self._thread = threading.Thread(target=self._flush_loop, name='user-registry-flush', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _contains(self, chat_id):
+        ids = self.ids
+        index = bisect.bisect_left(ids, chat_id)
+        return index < len(ids) and ids[index] == chat_id
+
+    def _insert(self, chat_id):
+        # Called with self._lock held
+        index = bisect.bisect_left(self.ids, chat_id)
+        if index == len(self.ids) or self.ids[index] != chat_id:
+            self.ids.insert(index, chat_id)
+
+    def _apply(self, rows, synced_at):
+        # Called with self._lock held
+        new_ids = []
+        for chat_id, active in rows:
+            if not self._contains(chat_id):
+                new_ids.append(chat_id)
+            if active:
+                self.blocked.discard(chat_id)
+            else:
+                self.blocked.add(chat_id)
+        if len(new_ids) > BULK_MERGE_THRESHOLD:
+            new_ids.extend(self.ids)
+            self.ids = array('q', sorted(set(new_ids)))
+        else:
+            for chat_id in new_ids:
+                self._insert(chat_id)
+        self.last_sync = synced_at
+
+    def add(self, chat_id):
+        """Record a chat; a chat that blocked the bot and wrote again is active again"""
+        chat_id = int(chat_id)
+        self._ensure_started()
+        if self._contains(chat_id) and chat_id not in self.blocked:
+            return
+        with self._lock:
+            self._insert(chat_id)
+            self.blocked.discard(chat_id)
+            self.pending.add(chat_id)
+
+    def flush(self):
+        """Write queued chats in one bulk upsert and pick up other workers' changes"""
+        with self._lock:
+            batch, self.pending = self.pending, set()
+            since = self.last_sync - SYNC_OVERLAP_SECONDS
+        now = time.time()
+        if batch:
+            try:
+                self.store.add_many(batch, now)
+                self.flushed += len(batch)
+            except Exception as e:
+                print(f"[UserRegistry] Flush of {len(batch)} users failed, will retry: {e}")
+                with self._lock:
+                    self.pending |= batch
+                return
+        rows = self.store.changes_since(since)
+        with self._lock:
+            # A chat queued again since the batch was taken keeps its newer state
+            self._apply([row for row in rows if row[0] not in self.pending], now)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[UserRegistry] Sync error: {e}")
+
+    def count(self, after=None):
+        """Active chats, O(1); with `after`, only those with a larger chat_id"""
+        self._ensure_started()
+        with self._lock:
+            if after is None:
+                return len(self.ids) - len(self.blocked)
+            start = bisect.bisect_right(self.ids, after)
+            return len(self.ids) - start - sum(1 for chat_id in self.blocked if chat_id > after)
+
+    def active_ids(self, after=None, limit=500):
+        """Active chat ids in ascending order, starting after the `after` cursor"""
+        self._ensure_started()
+        with self._lock:
+            index = 0 if after is None else bisect.bisect_right(self.ids, after)
+            result = []
+            while index < len(self.ids) and len(result) < limit:
+                chat_id = self.ids[index]
+                if chat_id not in self.blocked:
+                    result.append(chat_id)
+                index += 1
+            return result
+
+    def deactivate(self, chat_ids):
+        """Drop chats that blocked the bot or no longer exist from the active set"""
+        if not chat_ids:
+            return
+        self._ensure_started()
+        with self._lock:
+            self.blocked.update(chat_ids)
+            self.pending.difference_update(chat_ids)
+        self.store.deactivate(chat_ids, time.time())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'known': len(self.ids),
+                'active': len(self.ids) - len(self.blocked),
+                'pending_writes': len(self.pending),
+                'flushed': self.flushed,
+                'ids_bytes': self.ids.itemsize * len(self.ids)
+            }
+
+
+def create_user_registry(kind=STATE_BACKEND):
+    if kind == 'postgres':
+        return UserRegistry(PostgresUserStore())
+    return UserRegistry(SQLiteUserStore())
+
+
+user_registry = create_user_registry()
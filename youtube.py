@@ -3,6 +3,7 @@ import os
 import tempfile
 import re
 import requests
+import ytdlp_pool
 
 def search_youtube(query, limit=50):
     print(f"[YouTube] Searching for: {query} (limit: {limit})")
@@ -15,7 +16,7 @@ def search_youtube(query, limit=50):
             f'ytsearch{limit}:{query}'
         ]
         
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        result = ytdlp_pool.run(cmd, timeout=60)
         
         results = []
         for line in result.stdout.strip().split('\n'):
@@ -52,7 +53,7 @@ def get_video_metadata(video_url):
             video_url
         ]
         
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        result = ytdlp_pool.run(cmd, timeout=60)
         
         output = result.stdout.strip()
         print(f"[YouTube] Metadata output length: {len(output)}")
@@ -121,7 +122,7 @@ def download_audio(video_url, output_path):
         ]
         
         print(f"[YouTube] Running command: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+        result = ytdlp_pool.run(cmd, timeout=300, pool='download')
         
         if result.returncode != 0:
             print(f"[YouTube] yt-dlp stderr: {result.stderr}")
@@ -199,7 +200,7 @@ def extract_video_id(url_string):
     except:
         return None
 
-def download_and_send_songs(query, limit, handlers, chat_id, status_message_id, history_functions=None):
+def download_and_send_songs(query, limit, handlers, chat_id, status_message_id, history_functions=None, job=None):
     if is_youtube_url(query):
         video_id = extract_video_id(query)
         
@@ -207,7 +208,7 @@ def download_and_send_songs(query, limit, handlers, chat_id, status_message_id,
             handlers.edit_message(chat_id, status_message_id, "<b>⏭️ This song was already downloaded!</b>")
             return {'success': 0, 'failed': 0, 'skipped': 1}
         
-        handlers.edit_message(chat_id, status_message_id, "<b>🎵 Fetching song info...</b>\n\n🔄 Processing...")
+        handlers.edit_status(chat_id, status_message_id, "<b>🎵 Fetching song info...</b>\n\n🔄 Processing...")
         
         metadata = get_video_metadata(query)
         
@@ -223,7 +224,7 @@ def download_and_send_songs(query, limit, handlers, chat_id, status_message_id,
             )
             handlers.send_photo_with_caption(chat_id, metadata['thumbnail'], info_caption, None)
         
-        handlers.edit_message(chat_id, status_message_id, "<b>🎵 Downloading audio...</b>\n\n🔄 Please wait...")
+        handlers.edit_status(chat_id, status_message_id, "<b>🎵 Downloading audio...</b>\n\n🔄 Please wait...")
         handlers.send_action(chat_id, 'upload_audio')
         
         temp_dir = tempfile.gettempdir()
@@ -262,7 +263,12 @@ def download_and_send_songs(query, limit, handlers, chat_id, status_message_id,
         handlers.edit_message(chat_id, status_message_id, "<b>❌ Failed to download from URL</b>")
         return {'success': 0, 'failed': 1, 'skipped': 0}
     
-    results = search_youtube(query, limit)
+    if job and job.done('probe'):
+        results = job.state['results']
+    else:
+        results = search_youtube(query, limit)
+        if job:
+            job.complete('probe', results=results, sent=[])
     
     if not results:
         handlers.edit_message(chat_id, status_message_id, f"<b>❌ No songs found for:</b> {query}")
@@ -273,13 +279,20 @@ def download_and_send_songs(query, limit, handlers, chat_id, status_message_id,
     skipped_count = 0
     temp_dir = tempfile.gettempdir()
     
+    sent = set(job.state.get('sent', [])) if job else set()
+    
     for i, song in enumerate(results):
+        if song['id'] in sent:
+            # Already delivered before a restart
+            success_count += 1
+            continue
+        
         if history_functions and history_functions['is_already_downloaded'](song['id']):
             print(f"[YouTube] Skipping duplicate: {song['title']}")
             skipped_count += 1
             continue
         
-        handlers.edit_message(
+        handlers.edit_status(
             chat_id, status_message_id,
             f"<b>🎵 Downloading songs...</b>\n\n"
             f"📥 Progress: {success_count + failed_count + skipped_count}/{len(results)}\n"
@@ -304,6 +317,10 @@ def download_and_send_songs(query, limit, handlers, chat_id, status_message_id,
                         'video_id': song['id']
                     })
                 
+                if job:
+                    sent.add(song['id'])
+                    job.update(sent=list(sent))
+                
                 try:
                     os.unlink(downloaded_path)
                 except:
@@ -0,0 +1,232 @@
+"""Long-lived yt-dlp worker processes.
+
+Each worker is this file run as a script: it imports yt_dlp once and then
+runs yt-dlp command lines in-process, one JSON line per job on stdin and one
+JSON result line on stdout. run() is a drop-in for
+subprocess.run(cmd, capture_output=True, text=True, timeout=...): it returns
+a CompletedProcess and raises subprocess.TimeoutExpired. When every worker
+is busy, or workers cannot start, the command runs as a normal subprocess.
+"""
+import io
+import json
+import os
+import select
+import subprocess
+import sys
+import threading
+import time
+
+
+def _run_cli(yt_dlp, argv):
+    """Run one yt-dlp command line in this process, capturing what the CLI would print"""
+    stdout, stderr = io.StringIO(), io.StringIO()
+    real_stdout, real_stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = stdout, stderr
+    returncode = 0
+    try:
+        yt_dlp.main(argv)
+    except SystemExit as e:
+        if isinstance(e.code, str):
+            stderr.write(e.code + '\n')
+            returncode = 1
+        else:
+            returncode = e.code or 0
+    except BaseException as e:
+        stderr.write(f"ERROR: {type(e).__name__}: {e}\n")
+        returncode = 1
+    finally:
+        sys.stdout, sys.stderr = real_stdout, real_stderr
+    return {'returncode': returncode, 'stdout': stdout.getvalue(), 'stderr': stderr.getvalue()}
+
+
+def worker_main(max_jobs):
+    # Keep the real pipes for the protocol; ffmpeg and other children get /dev/null on fd 0 and 1
+    requests = os.fdopen(os.dup(0), 'r', encoding='utf-8')
+    protocol = os.fdopen(os.dup(1), 'w', encoding='utf-8')
+    os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+    os.dup2(os.open(os.devnull, os.O_WRONLY), 1)
+
+    def reply(message):
+        protocol.write(json.dumps(message) + '\n')
+        protocol.flush()
+
+    try:
+        import yt_dlp
+    except Exception as e:
+        reply({'ready': False, 'error': str(e)})
+        return
+    reply({'ready': True})
+    for _ in range(max_jobs):
+        line = requests.readline()
+        if not line:
+            return
+        reply(_run_cli(yt_dlp, json.loads(line)['argv']))
+
+
+class WorkerUnavailable(Exception):
+    pass
+
+
+class _Worker:
+    def __init__(self, max_jobs):
+        self.max_jobs = max_jobs
+        self.jobs = 0
+        self.ready = False
+        self.proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), str(max_jobs)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, encoding='utf-8'
+        )
+
+    def _read(self, deadline, cmd, timeout):
+        remaining = None if deadline is None else max(0, deadline - time.time())
+        readable, _, _ = select.select([self.proc.stdout], [], [], remaining)
+        if not readable:
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        line = self.proc.stdout.readline()
+        if not line:
+            raise WorkerUnavailable(f"worker exited with {self.proc.poll()}")
+        return json.loads(line)
+
+    def call(self, cmd, timeout):
+        deadline = time.time() + timeout if timeout else None
+        if not self.ready:
+            hello = self._read(deadline, cmd, timeout)
+            if not hello.get('ready'):
+                raise WorkerUnavailable(hello.get('error', 'yt_dlp import failed'))
+            self.ready = True
+        try:
+            self.proc.stdin.write(json.dumps({'argv': list(cmd[1:])}) + '\n')
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise WorkerUnavailable(str(e))
+        result = self._read(deadline, cmd, timeout)
+        self.jobs += 1
+        return subprocess.CompletedProcess(cmd, result['returncode'], result['stdout'], result['stderr'])
+
+    @property
+    def exhausted(self):
+        return self.jobs >= self.max_jobs
+
+    def close(self, kill=False):
+        if kill:
+            self.proc.kill()
+        else:
+            self.proc.stdin.close()
+        try:
+            self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+class YtdlpPool:
+    """Up to `size` warm workers, each replaced after `max_jobs` jobs to cap leaks inside yt-dlp"""
+
+    def __init__(self, name, size, max_jobs):
+        self.name = name
+        self.size = size
+        self.max_jobs = max_jobs
+        self.idle = []
+        self.live = 0
+        self.disabled = size <= 0
+        self._lock = threading.Lock()
+        self.warm_runs = 0
+        self.cold_runs = 0
+        self.recycled = 0
+        self.timeouts = 0
+
+    def start(self):
+        """Spawn the workers ahead of the first job so none pays the yt_dlp import"""
+        with self._lock:
+            while not self.disabled and self.live < self.size:
+                self.idle.append(_Worker(self.max_jobs))
+                self.live += 1
+
+    def _checkout(self):
+        with self._lock:
+            if self.disabled:
+                return None
+            if self.idle:
+                return self.idle.pop()
+            if self.live < self.size:
+                self.live += 1
+            else:
+                return None
+        return _Worker(self.max_jobs)
+
+    def _retire(self, worker, kill=False, replace=True):
+        worker.close(kill)
+        with self._lock:
+            self.live -= 1
+            if replace and not self.disabled:
+                # The replacement imports yt_dlp while no one is waiting for it
+                self.idle.append(_Worker(self.max_jobs))
+                self.live += 1
+
+    def _count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def run(self, cmd, timeout=None):
+        worker = self._checkout()
+        if worker is None:
+            self._count('cold_runs')
+            return subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        try:
+            result = worker.call(cmd, timeout)
+        except subprocess.TimeoutExpired:
+            self._count('timeouts')
+            self._retire(worker, kill=True)
+            raise
+        except WorkerUnavailable as e:
+            print(f"[YtdlpPool] {self.name} worker unavailable ({e}), running yt-dlp as a subprocess")
+            if not worker.ready:
+                # Workers cannot start here at all: stop trying
+                with self._lock:
+                    self.disabled = True
+            self._retire(worker, kill=True, replace=False)
+            self._count('cold_runs')
+            return subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        with self._lock:
+            self.warm_runs += 1
+            exhausted = worker.exhausted
+            if exhausted:
+                self.recycled += 1
+            else:
+                self.idle.append(worker)
+        if exhausted:
+            self._retire(worker)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.live,
+                'idle': len(self.idle),
+                'warm_runs': self.warm_runs,
+                'cold_runs': self.cold_runs,
+                'recycled': self.recycled,
+                'timeouts': self.timeouts,
+                'disabled': self.disabled
+            }
+
+
+if __name__ == '__main__':
+    worker_main(int(sys.argv[1]))
+else:
+    from config import YTDLP_PROBE_WORKERS, YTDLP_DOWNLOAD_WORKERS, YTDLP_WORKER_MAX_JOBS
+
+    # Probes and searches never queue behind long downloads
+    pools = {
+        'probe': YtdlpPool('probe', YTDLP_PROBE_WORKERS, YTDLP_WORKER_MAX_JOBS),
+        'download': YtdlpPool('download', YTDLP_DOWNLOAD_WORKERS, YTDLP_WORKER_MAX_JOBS)
+    }
+
+    def run(cmd, timeout=None, pool='probe'):
+        return pools[pool].run(cmd, timeout)
+
+    def start():
+        for ytdlp_pool in pools.values():
+            ytdlp_pool.start()
+
+    def stats():
+        return {name: ytdlp_pool.stats() for name, ytdlp_pool in pools.items()}